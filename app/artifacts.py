@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+from config import PATHS, ARTIFACTS
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w', **kwargs) -> Iterator[IO]:
+    """
+    Open a temporary file next to path and move it into place when the block succeeds.
+
+    Readers never see a partially written file, and a failed write leaves the
+    previous file untouched.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RunArtifacts:
+    """Output directory of a single analysis run, so concurrent runs never share files."""
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.run_dir = os.path.join(PATHS['RUNS_DIR'], self.run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    def path(self, key: str, extension: str = "") -> str:
+        """Path of an artifact, key is one of the file names in ARTIFACTS, e.g. 'GEO_TABLE'."""
+        return os.path.join(self.run_dir, ARTIFACTS[key] + extension)
+
+    @contextmanager
+    def running(self) -> Iterator[None]:
+        """Mark the run as in progress, so cleanup_runs in other processes leaves it alone."""
+        lock_file = self.path('LOCK_FILE')
+        with open(lock_file, "w", encoding="utf-8") as f:
+            f.write(str(os.getpid()))
+        try:
+            yield
+        finally:
+            try:
+                os.remove(lock_file)
+            except FileNotFoundError:
+                pass
+
+
+def cleanup_runs(keep: Optional[str] = None) -> None:
+    """
+    Remove run directories older than ARTIFACTS['RETENTION_SECONDS'], then the oldest
+    ones above ARTIFACTS['MAX_RUNS'].
+
+    Runs in progress (see RunArtifacts.running) and run_batch.py runs that can still be
+    resumed are never removed and do not count towards the limit. A lock file older than
+    the retention period is left over from a crashed process and no longer protects its run.
+
+    Args:
+        keep (str, optional): Run ID that is never removed, e.g. the current run
+    """
+    runs_dir = PATHS['RUNS_DIR']
+    if not os.path.isdir(runs_dir):
+        return
+    runs = sorted(
+        (entry.stat().st_mtime, entry.path) for entry in os.scandir(runs_dir)
+        if entry.is_dir() and entry.name != keep and not _in_use(entry.path)
+    )
+    now = time.time()
+    max_runs = ARTIFACTS['MAX_RUNS']
+    if max_runs is not None and keep is not None:
+        # The kept run counts towards the limit
+        max_runs -= 1
+    for i, (mtime, path) in enumerate(runs):
+        expired = now - mtime > ARTIFACTS['RETENTION_SECONDS']
+        excess = max_runs is not None and len(runs) - i > max_runs
+        if expired or excess:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Removed run artifacts {os.path.basename(path)}")
+
+
+def _in_use(run_dir: str) -> bool:
+    """Whether a run is in progress or is an unfinished run_batch.py run."""
+    try:
+        lock_age = time.time() - os.stat(os.path.join(run_dir, ARTIFACTS['LOCK_FILE'])).st_mtime
+        if lock_age < ARTIFACTS['RETENTION_SECONDS']:
+            return True
+    except FileNotFoundError:
+        pass
+    try:
+        with open(os.path.join(run_dir, ARTIFACTS['CHECKPOINT_FILE']), "r", encoding="utf-8") as f:
+            return not json.load(f).get("finished", False)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        # Possibly being written, better kept than lost
+        logger.warning(f"Cannot read the checkpoint of run {os.path.basename(run_dir)}: {str(e)}")
+        return True
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+from config import CACHE
+
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound variables per statement
+_MAX_VARIABLES = 900
+
+
+class CacheStore:
+    """
+    Persistent key-value cache backed by SQLite in WAL mode.
+
+    Entries are grouped by namespace and looked up through the primary key index,
+    so a point lookup does not depend on the cache size. Writes are batched into
+    one transaction. WAL mode lets readers and a writer from several Flask worker
+    processes use the same file at once. Every entry can carry its own TTL, and
+    the oldest entries are evicted once a namespace exceeds CACHE['MAX_ENTRIES'].
+    Counting a namespace takes time in proportion to its size, so the limit is only
+    checked after every CACHE['EVICT_EVERY'] written entries; expired entries are
+    never returned in between.
+    """
+
+    def __init__(self, db_file: Optional[str] = None):
+        self.db_file = db_file or CACHE['DB_FILE']
+        self.max_entries = CACHE['MAX_ENTRIES']
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        # Entries written per namespace since its last eviction
+        self._unchecked: Dict[str, int] = {}
+        self._unchecked_lock = threading.Lock()
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=CACHE['BUSY_TIMEOUT'], isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self) -> None:
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (namespace, created_at)")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the cached value for a key, or None if missing or expired."""
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the cached values for all keys that are present and not expired."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        conn = self._connection()
+        for start in range(0, len(keys), _MAX_VARIABLES):
+            batch = keys[start:start + _MAX_VARIABLES]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, value FROM entries WHERE namespace = ? AND key IN ({placeholders}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, *batch, now)
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a single value, see put_many."""
+        self.put_many(namespace, {key: value}, ttl)
+
+    def put_many(self, namespace: str, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """
+        Store many values in one transaction.
+
+        Args:
+            namespace (str): Cache namespace, e.g. "geo"
+            items (Dict[str, Any]): JSON-serializable values by key
+            ttl (float, optional): Seconds until the entries expire, None keeps them forever
+        """
+        if not items:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = [(namespace, key, json.dumps(value), now, expires_at) for key, value in items.items()]
+        conn = self._connection()
+        with _transaction(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        with self._unchecked_lock:
+            unchecked = self._unchecked.get(namespace, 0) + len(rows)
+            due = unchecked >= CACHE['EVICT_EVERY']
+            self._unchecked[namespace] = 0 if due else unchecked
+        if due:
+            self.evict(namespace)
+
+    def delete_many(self, namespace: str, keys: Iterable[str]) -> None:
+        """Remove the given keys from a namespace."""
+        keys = list(keys)
+        conn = self._connection()
+        with _transaction(conn):
+            conn.executemany(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                [(namespace, key) for key in keys]
+            )
+
+    def evict(self, namespace: str) -> None:
+        """Drop expired entries, then the oldest entries above the size limit."""
+        conn = self._connection()
+        with _transaction(conn):
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            if self.max_entries:
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)
+                ).fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                        "SELECT key FROM entries WHERE namespace = ? ORDER BY created_at LIMIT ?)",
+                        (namespace, namespace, count - self.max_entries)
+                    )
+                    logger.info(f"Evicted {count - self.max_entries} entries from cache namespace {namespace}")
+
+    def count(self, namespace: str) -> int:
+        """Number of entries stored in a namespace, including expired ones not yet evicted."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)
+        ).fetchone()[0]
+
+    def keys(self, namespace: str) -> List[str]:
+        """All non-expired keys of a namespace."""
+        rows = self._connection().execute(
+            "SELECT key FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time())
+        )
+        return [row[0] for row in rows]
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Remove all entries, or only those of one namespace."""
+        conn = self._connection()
+        with _transaction(conn):
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def migrate_json(self, json_file: str, namespace: str) -> int:
+        """
+        One-time import of a legacy JSON cache file.
+
+        The file is renamed to '<name>.migrated' afterwards, so the import only runs once.
+
+        Returns:
+            int: Number of imported entries
+        """
+        if not os.path.exists(json_file):
+            return 0
+        try:
+            with open(json_file, 'r') as f:
+                data = json.load(f)
+            self.put_many(namespace, data)
+            os.replace(json_file, json_file + ".migrated")
+            logger.info(f"Migrated {len(data)} entries from {json_file} to {self.db_file}")
+            return len(data)
+        except Exception as e:
+            logger.error(f"Error migrating cache file {json_file}: {str(e)}")
+            return 0
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """Run statements in an IMMEDIATE transaction, so concurrent writers queue up."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.sparse import vstack
+from app.artifacts import atomic_open
+from config import COHORTS
+
+# fcntl is not available on Windows, cohort updates are then only serialized within a process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# Per-row parts of a model, see DataProcessor.fit_model
+_ROW_FIELDS = ("tfidf", "projection", "labels")
+# Counters of the changes since the fit, see DataProcessor.model_drift
+_DRIFT_FIELDS = ("added", "added_distance", "removed")
+
+
+class CohortModelStore:
+    """
+    Fitted models of named cohorts on disk.
+
+    A model holds the fitted vectorizer, projection and cluster centroids together
+    with the processed rows of the cohort, see DataProcessor.fit_model. It is written
+    once per fit to <cohort>.joblib. Later updates only write the rows added since the
+    fit, plus the positions of the fitted rows still in the cohort, to
+    <cohort>.delta.joblib, so an update writes in proportion to the changed rows.
+    Reading a model still loads the whole cohort. Files are not compressed, compression
+    cost more time than the disk space was worth.
+
+    Cohort names are shared by all users of the server. Updates of one cohort are
+    serialized across threads and processes with lock().
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or COHORTS['DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _path(self, cohort: str, suffix: str = ".joblib") -> str:
+        # Cohort names are user input, never use them as file names directly
+        return os.path.join(self.directory, hashlib.sha256(cohort.encode("utf-8")).hexdigest() + suffix)
+
+    @contextmanager
+    def lock(self, cohort: str) -> Iterator[None]:
+        """Hold the lock of a cohort while its model is read, updated and stored."""
+        with self._locks_lock:
+            lock = self._locks.setdefault(cohort, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            # Other processes wait on the lock file of the cohort
+            with open(self._path(cohort, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get(self, cohort: str) -> Optional[Dict[str, Any]]:
+        """Stored model of a cohort with its updates applied, None if there is none or it cannot be read."""
+        try:
+            model = joblib.load(self._path(cohort))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading model of cohort {cohort}: {str(e)}")
+            return None
+
+        try:
+            delta = joblib.load(self._path(cohort, ".delta.joblib"))
+        except FileNotFoundError:
+            return model
+        except Exception as e:
+            logger.error(f"Error reading updates of cohort {cohort}, using its last fit: {str(e)}")
+            return model
+        if delta["fit_id"] != model["fit_id"]:
+            # Left over from an earlier fit
+            return model
+
+        kept = delta["fit_index"]
+        model["rows"] = pd.concat([model["rows"].iloc[kept], delta["rows"]], ignore_index=True)
+        model["tfidf"] = vstack([model["tfidf"][kept], delta["tfidf"]], format="csr")
+        model["projection"] = np.vstack([model["projection"][kept], delta["projection"]])
+        model["labels"] = np.concatenate([model["labels"][kept], delta["labels"]])
+        model["fit_index"] = np.concatenate([kept, np.full(len(delta["rows"]), -1)])
+        model.update({field: delta[field] for field in _DRIFT_FIELDS})
+        return model
+
+    def put(self, cohort: str, model: Dict[str, Any]) -> None:
+        """Store a new fit, or the changes of a stored fit, atomically."""
+        if not (model["added"] or model["removed"]):
+            with atomic_open(self._path(cohort), "wb") as f:
+                joblib.dump(model, f)
+            self._remove(self._path(cohort, ".delta.joblib"))
+            return
+
+        # Fitted rows come first and keep their order, rows added later follow
+        added = model["fit_index"] < 0
+        delta = {
+            "fit_id": model["fit_id"],
+            "fit_index": model["fit_index"][~added],
+            "rows": model["rows"][added].reset_index(drop=True),
+            **{field: model[field][added] for field in _ROW_FIELDS},
+            **{field: model[field] for field in _DRIFT_FIELDS}
+        }
+        with atomic_open(self._path(cohort, ".delta.joblib"), "wb") as f:
+            joblib.dump(delta, f)
+
+    def delete(self, cohort: str) -> None:
+        for suffix in (".joblib", ".delta.joblib"):
+            self._remove(self._path(cohort, suffix))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
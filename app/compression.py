@@ -0,0 +1,74 @@
+import gzip
+import logging
+from functools import lru_cache
+from typing import Optional
+from flask import Request, Response
+from plotly import __version__ as plotly_version
+from plotly.offline import get_plotlyjs
+from config import VISUALIZATION
+
+# brotli is optional, responses fall back to gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = {"text/html", "text/plain", "text/css", "application/json", "application/javascript"}
+
+PLOTLY_VERSION = plotly_version
+
+
+def choose_encoding(request: Request) -> Optional[str]:
+    """Best content encoding the client accepts: 'br', 'gzip' or None."""
+    if brotli is not None and request.accept_encodings['br']:
+        return "br"
+    if request.accept_encodings['gzip']:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Compress data with 'br' or 'gzip'; fast settings unless a level is given."""
+    if encoding == "br":
+        return brotli.compress(data, quality=level if level is not None else 5)
+    return gzip.compress(data, compresslevel=level if level is not None else 6)
+
+
+def compress_response(response: Response, request: Request) -> Response:
+    """
+    Compress a response body in place if the client accepts it.
+
+    Small, streamed, already encoded and non-text responses are left alone. A strong
+    ETag is turned into a weak one, because the encoded bytes differ from the original.
+    """
+    if (response.direct_passthrough
+            or not 200 <= response.status_code < 300
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request)
+    data = response.get_data()
+    if encoding is None or len(data) < VISUALIZATION['COMPRESS_MIN_BYTES']:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+@lru_cache(maxsize=None)
+def plotly_js(encoding: Optional[str] = None) -> bytes:
+    """The plotly.js bundle of the installed plotly version, compressed once per encoding."""
+    data = get_plotlyjs().encode("utf-8")
+    if encoding is None:
+        return data
+    compressed = compress(data, encoding, level=11 if encoding == "br" else 9)
+    logger.info(f"Compressed plotly.js from {len(data)} to {len(compressed)} bytes ({encoding})")
+    return compressed
@@ -1,12 +1,16 @@
 import requests
 import logging
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator
 import xml.etree.ElementTree as ET
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 import pandas as pd 
-import json
-import os
-from config import PATHS
+from config import EUTILS, CACHE, STREAMING, SIMILARITY
+from app.cache_store import CacheStore
+from app.eutils_client import EUtilsClient, iter_elements
+from app.metrics import metrics
+from app.similarity_index import SimilarityIndex
+from app.singleflight import SingleFlight
 
 
 # Configure logging 
@@ -18,46 +22,51 @@ logger = logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Placeholders stored instead of GEO IDs when a PMID could not be resolved
+NO_GEO_IDS = "No GEO IDs connected"
+REQUEST_ERROR = "Request error"
+PARSING_ERROR = "Parsing error"
+UNEXPECTED_ERROR = "Unexpected error"
+LINK_SENTINELS = (NO_GEO_IDS, REQUEST_ERROR, PARSING_ERROR, UNEXPECTED_ERROR)
+
+# Cache namespaces for GEO metadata tuples and PMID to GEO links
+GEO_NAMESPACE = "geo"
+LINK_NAMESPACE = "pmid_links"
+
 
 class DataHandler():
+    """
+    Resolves PMIDs to GEO datasets and fetches their metadata.
+    
+    Safe to share between threads. Concurrent lookups of the same PMID, GEO ID or
+    BioProject ID are coalesced into one upstream request and one cache write.
+    """
     
     def __init__(self):
         self.file_path = None
-        self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
-        self.link_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi"
-        # Initialize cache file path
-        self.cache_file = os.path.join(PATHS['CACHE_DIR'], 'geo_cache.json')
-        # Load cache from file
-        self.geo_cache = self._load_cache()
-        
-    def _load_cache(self) -> Dict:
-        """Load cache from file if it exists."""
-        try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except Exception as e:
-            logger.error(f"Error loading cache: {str(e)}")
-            return {}
-            
-    def _save_cache(self) -> None:
-        """Save cache to file."""
-        try:
-            # Ensure cache directory exists
-            os.makedirs(PATHS['CACHE_DIR'], exist_ok=True)
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.geo_cache, f)
-        except Exception as e:
-            logger.error(f"Error saving cache: {str(e)}")
+        self.base_url = EUTILS['BASE_URL']
+        self.link_url = self.base_url + "elink.fcgi"
+        # Rate-limited, pooled client shared by all E-utilities calls
+        self.client = EUtilsClient(self.base_url)
+        # Indexed on-disk cache, shared by all workers
+        self.cache = CacheStore()
+        self.cache.migrate_json(CACHE['LEGACY_JSON_FILE'], GEO_NAMESPACE)
+        # In-flight lookups, shared by all threads using this handler
+        self.link_flight = SingleFlight("pmid_links")
+        self.geo_flight = SingleFlight("geo")
+        self.bioproject_flight = SingleFlight("bioproject")
+        # Text index of every cached dataset, updated in the background as metadata is fetched
+        self.similarity_index = SimilarityIndex() if SIMILARITY['ENABLED'] else None
+        self.index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similarity-index")
             
     def clear_cache(self) -> None:
-        """Clear the cache file."""
+        """Clear the cached GEO metadata, PMID to GEO links and the similarity index."""
         try:
-            if os.path.exists(self.cache_file):
-                os.remove(self.cache_file)
-                self.geo_cache = {}
-                logger.info("Cache cleared successfully")
+            self.cache.clear(GEO_NAMESPACE)
+            self.cache.clear(LINK_NAMESPACE)
+            if self.similarity_index is not None:
+                self.similarity_index.clear()
+            logger.info("Cache cleared successfully")
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
         
@@ -90,43 +99,120 @@ class DataHandler():
             logger.error(error_msg)
             raise
             
-    def get_geo_ids_from_pmids(self, pmids: List[str]) -> Dict[str, List[str]]:
+    @metrics.timed("link_resolution")
+    def get_geo_ids_from_pmids(self, pmids: List[str], batch_size: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        Get GEO IDs linked to each PMID.
         
-        geo_ids = {}
+        Cached links are used first. The remaining PMIDs are sent to elink in batches
+        using repeated id= parameters, so NCBI returns one LinkSet per PMID instead of
+        merging the links together. Found links and PMIDs without GEO IDs are cached
+        with separate TTLs, request and parsing errors are never cached. PMIDs that
+        another thread is already resolving are not requested again.
         
-        for pmid in pmids:
-            
-            params = {
-                "dbfrom" : "pubmed",
-                "db" : "gds", 
-                "linkname" : "pubmed_gds",
-                "id" : pmid, 
-                "retmode": "xml"           
-            }
+        Args:
+            pmids (List[str]): PMIDs to query
+            batch_size (int, optional): PMIDs per elink request, defaults to EUTILS['ELINK_BATCH_SIZE']
             
-            try:
-                response = requests.get(self.link_url, params = params)
-                response.raise_for_status()
-                
-                root = ET.fromstring(response.content)
-                gse_ids = [id_elem.text for id_elem in root.findall(".//Link/Id") ]
-                geo_ids[pmid] = gse_ids if gse_ids else ["No GEO IDs connected"]
-                logger.info(f"{len(gse_ids)} GEO IDs retrieved for PMID: {pmid}")
-                
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request error for PMID {pmid}: {str(e)}")
-                geo_ids[pmid]=["Request error"]
-                
-            except ET.ParseError as e:
-                logger.error(f"XML parsing error for PMID {pmid}: {str(e)}")
-                geo_ids[pmid]=["Parsing error"]
-                
-            except Exception as e:
-                logger.error(f"Unexpected error for PMID {pmid}: {str(e)}")
-                geo_ids[pmid]=["Unexpected error"]
+        Returns:
+            Dict[str, List[str]]: GEO IDs for each PMID, or a single error message
+        """
+        batch_size = batch_size or EUTILS['ELINK_BATCH_SIZE']
+        # Remove duplicates while keeping input order
+        pmids = list(dict.fromkeys(pmids))
+        geo_ids = self.cache.get_many(LINK_NAMESPACE, pmids)
+        uncached = [pmid for pmid in pmids if pmid not in geo_ids]
+        metrics.cache_lookup(LINK_NAMESPACE, len(geo_ids), len(uncached))
+        logger.info(f"Using cached GEO links for {len(geo_ids)} of {len(pmids)} PMIDs")
+        
+        geo_ids.update(self.link_flight.do_many(uncached, lambda owned: self._resolve_links(owned, batch_size)))
                 
+        # Keep the input order
+        return {pmid: geo_ids[pmid] for pmid in pmids}
+    
+    def _resolve_links(self, pmids: List[str], batch_size: int) -> Dict[str, List[str]]:
+        """Resolve PMIDs with batched elink requests and cache the results."""
+        # Another thread may have finished resolving some of them since the cache lookup
+        geo_ids = self.cache.get_many(LINK_NAMESPACE, pmids)
+        uncached = [pmid for pmid in pmids if pmid not in geo_ids]
+        
+        batches = [uncached[start:start + batch_size] for start in range(0, len(uncached), batch_size)]
+        for batch_result in self.client.map(self._get_geo_ids_batch, batches):
+            geo_ids.update(batch_result)
+            
+        self.cache_links({pmid: geo_ids[pmid] for pmid in uncached})
         return geo_ids
     
+    def cache_links(self, links: Dict[str, List[str]]) -> None:
+        """Cache resolved PMID links; PMIDs without GEO IDs get the shorter TTL, errors are skipped."""
+        self.cache.put_many(
+            LINK_NAMESPACE,
+            {pmid: ids for pmid, ids in links.items() if ids[0] not in LINK_SENTINELS},
+            CACHE['LINK_TTL']
+        )
+        self.cache.put_many(
+            LINK_NAMESPACE,
+            {pmid: ids for pmid, ids in links.items() if ids == [NO_GEO_IDS]},
+            CACHE['EMPTY_LINK_TTL']
+        )
+    
+    def _get_geo_ids_batch(self, pmids: List[str]) -> Dict[str, List[str]]:
+        """Resolve one batch of PMIDs with a single elink request."""
+        params = {
+            "dbfrom" : "pubmed",
+            "db" : "gds", 
+            "linkname" : "pubmed_gds",
+            "id" : pmids, 
+            "retmode": "xml"           
+        }
+        
+        try:
+            # POST keeps long id lists out of the URL
+            response = self.client.post("elink.fcgi", params, stream=True)
+            
+            # LinkSets are parsed as they arrive instead of after the whole body
+            linked = {}
+            failed = set()
+            errors = []
+            for element in iter_elements(response, "LinkSet", "ERROR"):
+                if element.tag == "ERROR":
+                    errors.append((element.text or "").strip())
+                    continue
+                pmid = element.findtext("IdList/Id")
+                if element.find("ERROR") is not None:
+                    failed.add(pmid)
+                    continue
+                gse_ids = [id_elem.text for id_elem in element.findall(".//Link/Id")]
+                linked.setdefault(pmid, []).extend(gse_ids)
+                
+            # NCBI answers transient failures with HTTP 200 and an <ERROR> body. Only a
+            # PMID whose own LinkSet came back without links has no GEO IDs; all others
+            # are errors, which are not cached
+            geo_ids = {}
+            for pmid in pmids:
+                if pmid in linked and pmid not in failed:
+                    geo_ids[pmid] = linked[pmid] or [NO_GEO_IDS]
+                    logger.debug(f"{len(linked[pmid])} GEO IDs retrieved for PMID: {pmid}")
+                else:
+                    geo_ids[pmid] = [REQUEST_ERROR]
+            unresolved = sum(ids == [REQUEST_ERROR] for ids in geo_ids.values())
+            if unresolved:
+                logger.error(f"elink returned no result for {unresolved} of {len(pmids)} PMIDs"
+                             + (f": {errors[0]}" if errors else ""))
+            return geo_ids
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Request error for PMIDs {', '.join(pmids)}: {str(e)}")
+            return {pmid: [REQUEST_ERROR] for pmid in pmids}
+            
+        except ET.ParseError as e:
+            logger.error(f"XML parsing error for PMIDs {', '.join(pmids)}: {str(e)}")
+            return {pmid: [PARSING_ERROR] for pmid in pmids}
+            
+        except Exception as e:
+            logger.error(f"Unexpected error for PMIDs {', '.join(pmids)}: {str(e)}")
+            return {pmid: [UNEXPECTED_ERROR] for pmid in pmids}
+    
     
     
     def get_overall_design(self, bioproject_id: str) -> str:
@@ -139,41 +225,162 @@ class DataHandler():
         Returns:
             str: Overall design description or "N/A if not found"
         """
-        if bioproject_id == "N/A":
-            return "N/A"
+        return self.get_overall_designs([bioproject_id]).get(bioproject_id, "N/A")
         
-        try:
-            params = {
-                "db" : "bioproject",
-                "id": bioproject_id,
-                "retmode" : "xml"
-            }
-            logger.info(f"API call is made for bioproject id: {bioproject_id}")
-            response = requests.get(
-                "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi",
-                params = params
-            )
-
-            response.raise_for_status()
-            
-            response_text = response.text
-            start_tag = "<Description>"
-            end_tag = "</Description>"
+    def get_overall_designs(self, bioproject_ids: List[str]) -> Dict[str, str]:
+        """
+        Get overall design information for many BioProject IDs at once.
+        
+        Args:
+            bioproject_ids (List[str]): BioProject accessions to query
             
-            description_start = response_text.find(start_tag)
-            description_end = response_text.find(end_tag)
+        Returns:
+            Dict[str, str]: Overall design for each BioProject ID, "N/A" if not found.
+            BioProjects whose request failed are left out, so callers do not cache them
+        """
+        bioproject_ids = [bp_id for bp_id in dict.fromkeys(bioproject_ids) if bp_id != "N/A"]
+        return self.bioproject_flight.do_many(bioproject_ids, self._fetch_overall_designs)
+    
+    def _fetch_overall_designs(self, bioproject_ids: List[str]) -> Dict[str, str]:
+        """Fetch BioProjects with batched efetch requests; BioProjects of failed batches are left out."""
+        designs = {}
+        batch_size = EUTILS['EFETCH_BATCH_SIZE']
+        batches = [bioproject_ids[start:start + batch_size] for start in range(0, len(bioproject_ids), batch_size)]
+        
+        for batch, batch_designs in zip(batches, self.client.map(self._get_overall_designs_batch, batches)):
+            if batch_designs is None:
+                continue
+            # esummary may reference the project by accession or numeric id
+            for bp_id in batch:
+                designs[bp_id] = batch_designs.get(bp_id, "N/A")
+                
+        return designs
+    
+    def _get_overall_designs_batch(self, bioproject_ids: List[str]) -> Optional[Dict[str, str]]:
+        """Fetch one batch of BioProjects and map accessions and ids to overall designs, None on failure."""
+        params = {
+            "db" : "bioproject",
+            "id": ",".join(bioproject_ids),
+            "retmode" : "xml"
+        }
+        designs = {}
+        try:
+            logger.debug(f"API call is made for {len(bioproject_ids)} bioproject ids")
+            response = self.client.post("efetch.fcgi", params, stream=True)
             
-            if description_start != -1 and description_end != -1:
-                description = response_text[description_start + len(start_tag): description_end].strip()
-                match = re.search(r"Overall design:(.*)", description)
-                return match.group(1).strip() if match else "N/A"
+            for record in iter_elements(response, "DocumentSummary"):
+                designs.update(self.record_designs(record))
+                        
+        except Exception as e:
+            logger.error(f"Error getting overall design for {len(bioproject_ids)} BioProjects: {str(e)}")
+            return None
             
-            logger.warning(f"No description found for BioProject {bioproject_id}")
+        return designs
+    
+    @staticmethod
+    def record_designs(record: ET.Element) -> Dict[str, str]:
+        """Overall design of a BioProject DocumentSummary, under its accession and its numeric id."""
+        archive = record.find(".//ArchiveID")
+        if archive is None:
+            return {}
+        design = DataHandler._parse_overall_design(record.findtext(".//ProjectDescr/Description"))
+        return {archive.get("accession"): design, archive.get("id"): design}
+    
+    @staticmethod
+    def _parse_overall_design(description: Optional[str]) -> str:
+        """Extract the 'Overall design:' part of a BioProject description."""
+        if not description:
             return "N/A"
+        match = re.search(r"Overall design:(.*)", description.strip())
+        return match.group(1).strip() if match else "N/A"
+        
+    def fetch_geo_data(self, geo_ids: List[str]) -> None:
+        """
+        Fill the cache for all uncached GEO IDs using bulk requests.
+        
+        Summaries are fetched in comma-separated esummary batches, then all referenced
+        BioProjects are fetched with batched efetch requests. All results are stored
+        in one cache transaction. GEO IDs that another thread is already fetching are
+        not requested again.
+        GEO IDs that fail here stay uncached and are retried by get_geo_data.
+        
+        Args:
+            geo_ids (List[str]): GEO dataset IDs
+        """
+        geo_ids = [geo_id for geo_id in dict.fromkeys(geo_ids) if geo_id not in LINK_SENTINELS]
+        cached = self.cache.get_many(GEO_NAMESPACE, geo_ids)
+        uncached = [geo_id for geo_id in geo_ids if geo_id not in cached]
+        metrics.cache_lookup(GEO_NAMESPACE, len(cached), len(uncached))
+        if uncached:
+            self.geo_flight.do_many(uncached, self._fetch_geo_batch)
+        
+    def _fetch_geo_batch(self, geo_ids: List[str]) -> Dict[str, List[str]]:
+        """Fetch summaries and overall designs of GEO IDs, cache and return them."""
+        # Another thread may have finished fetching some of them since the cache lookup
+        cached = self.cache.get_many(GEO_NAMESPACE, geo_ids)
+        uncached = [geo_id for geo_id in geo_ids if geo_id not in cached]
+        
+        datasets = {}
+        batch_size = EUTILS['ESUMMARY_BATCH_SIZE']
+        batches = [uncached[start:start + batch_size] for start in range(0, len(uncached), batch_size)]
+        for batch_datasets in self.client.map(self._get_summaries_batch, batches):
+            datasets.update(batch_datasets)
+                
+        bioproject_ids = [dataset.get("bioproject") or "N/A" for dataset in datasets.values()]
+        designs = self.get_overall_designs(bioproject_ids)
+        
+        results = {geo_id: self.geo_record(dataset, designs) for geo_id, dataset in datasets.items()}
+        # Datasets whose BioProject request failed are returned with "N/A" but not cached,
+        # so they are fetched again instead of keeping the placeholder forever
+        failed = {bp_id for bp_id in bioproject_ids if bp_id != "N/A" and bp_id not in designs}
+        complete = {geo_id: result for geo_id, result in results.items()
+                    if (datasets[geo_id].get("bioproject") or "N/A") not in failed}
+        self.cache.put_many(GEO_NAMESPACE, complete, CACHE['GEO_TTL'])
+        self._index(complete)
+        if len(complete) < len(results):
+            logger.warning(f"Not caching {len(results) - len(complete)} GEO datasets whose BioProject could not be fetched")
+        logger.info(f"Retrieved and cached data for {len(complete)} of {len(uncached)} GEO IDs")
+        return {**cached, **results}
+        
+    @staticmethod
+    def geo_record(dataset: Dict, designs: Dict[str, str]) -> List[str]:
+        """Cached form of an esummary record: title, experiment type, summary, organism, overall design."""
+        return [
+            dataset.get("title", "N/A"),
+            dataset.get("gdstype", "N/A"),
+            dataset.get("summary", "N/A"),
+            dataset.get("taxon", "N/A"),
+            designs.get(dataset.get("bioproject") or "N/A", "N/A")
+        ]
         
+    def _get_summaries_batch(self, geo_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch esummary records for one batch of GEO IDs."""
+        params = {
+            "db":"gds",
+            "id": ",".join(geo_ids), 
+            "retmode":"json"
+        }
+        datasets = {}
+        try:
+            logger.debug(f"API call is made for {len(geo_ids)} GEO IDs")
+            response = self.client.post("esummary.fcgi", params)
+            
+            result = response.json().get("result", {})
+            missing = []
+            for geo_id in geo_ids:
+                if geo_id in result:
+                    datasets[geo_id] = result[geo_id]
+                else:
+                    missing.append(geo_id)
+            # One message per batch instead of one per dataset
+            if missing:
+                logger.error(f"No result found for {len(missing)} of {len(geo_ids)} GEO IDs")
+                logger.debug(f"GEO IDs without result: {', '.join(missing)}")
+                    
         except Exception as e:
-            logger.error(f"Error getting overall design for BioProject {bioproject_id}: {str(e)}")
-            return "N/A"
+            logger.error(f"Error fetching summaries for {len(geo_ids)} GEO IDs: {str(e)}")
+            
+        return datasets
         
     def get_geo_data(self, geo_id:str)-> tuple:
         
@@ -187,13 +394,18 @@ class DataHandler():
             tuple: (tittle, experiment_type, summary, organism, overall_design)
         """
         # Check cache first
-        if geo_id in self.geo_cache:
-            logger.info(f"Using cached data for GEO ID: {geo_id}")
-            cached_data = self.geo_cache[geo_id]
+        cached_data = self.cache.get(GEO_NAMESPACE, geo_id)
+        metrics.cache_lookup(GEO_NAMESPACE, int(cached_data is not None), int(cached_data is None))
+        if cached_data is not None:
+            logger.debug(f"Using cached data for GEO ID: {geo_id}")
             return tuple(cached_data)
-            
-        url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
         
+        result = self.geo_flight.do_many([geo_id], self._fetch_geo_single).get(geo_id)
+        return tuple(result) if result is not None else ("N/A", "N/A", "N/A", "N/A", "N/A")
+    
+    def _fetch_geo_single(self, geo_ids: List[str]) -> Dict[str, List[str]]:
+        """Fetch and cache one GEO dataset with its own esummary request; empty on failure."""
+        geo_id = geo_ids[0]
         params = {
             "db":"gds",
             "id": geo_id, 
@@ -201,72 +413,156 @@ class DataHandler():
         }
         
         try:
-            logger.info(f"API call is made for GEO ID: {geo_id}")
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            logger.debug(f"API call is made for GEO ID: {geo_id}")
+            response = self.client.get("esummary.fcgi", params)
             
             data=response.json() 
             if "result" not in data:
                 logger.error(f"No result found for GEO ID {geo_id}")
-                return "N/A", "N/A", "N/A", "N/A", "N/A"
+                return {}
  
             dataset = data["result"][geo_id]
-            title = dataset.get("title", "N/A")
-            exp_type = dataset.get("gdstype", "N/A")
-            summary = dataset.get("summary", "N/A")
-            organism = dataset.get("taxon", "N/A") 
-            bioproject_id = dataset.get("bioproject", "N/A")  
-            overall_design = self.get_overall_design(bioproject_id)
+            bioproject_id = dataset.get("bioproject") or "N/A"
+            designs = self.get_overall_designs([bioproject_id])
+            result = self.geo_record(dataset, designs)
+            if bioproject_id != "N/A" and bioproject_id not in designs:
+                # Returned with "N/A", but fetched again next time instead of cached
+                logger.warning(f"Not caching GEO ID {geo_id}, its BioProject could not be fetched")
+                return {geo_id: result}
             
             # Cache the result
-            result = [title, exp_type, summary, organism, overall_design]
-            self.geo_cache[geo_id] = result
-            self._save_cache()  # Save cache to file
+            self.cache.put(GEO_NAMESPACE, geo_id, result, CACHE['GEO_TTL'])
+            self._index({geo_id: result})
             
-            logger.info(f"Successfully retrieved and cached data for GEO ID {geo_id}")
-            return tuple(result)
+            logger.debug(f"Successfully retrieved and cached data for GEO ID {geo_id}")
+            return {geo_id: result}
         
         except Exception as e:
             logger.error(f"Error processing GEO ID {geo_id}: {str(e)}")
-            return "N/A", "N/A", "N/A", "N/A", "N/A"
+            return {}
+           
+    def _index(self, datasets: Dict[str, List[str]]) -> Optional[Future]:
+        """Queue newly cached datasets for the similarity index, off the request path."""
+        if self.similarity_index is None or not datasets:
+            return None
+        return self.index_executor.submit(self._add_to_index, datasets)
+        
+    def _add_to_index(self, datasets: Dict[str, List[str]]) -> None:
+        # Failures never break a fetch, the datasets are indexed by the next sync_similarity_index
+        try:
+            self.similarity_index.add_many(datasets, CACHE['GEO_TTL'])
+        except Exception as e:
+            logger.error(f"Error indexing {len(datasets)} GEO datasets: {str(e)}")
+            
+    def sync_similarity_index(self, batch_size: int = 1000) -> int:
+        """
+        Bring the similarity index in line with the cached GEO datasets.
+        
+        Indexes datasets cached before the index existed, filled by other means or
+        whose indexing failed, and removes datasets evicted from the cache.
+        
+        Returns:
+            int: Number of indexed datasets
+        """
+        if self.similarity_index is None:
+            return 0
+        indexed = self.similarity_index.indexed_ids()
+        cached = self.cache.keys(GEO_NAMESPACE)
+        self.similarity_index.remove_many(indexed.difference(cached))
+        missing = [geo_id for geo_id in cached if geo_id not in indexed]
+        for start in range(0, len(missing), batch_size):
+            # The remaining lifetime of the cache entries is not known, an entry expiring
+            # earlier is removed from the index by the next sync
+            self.similarity_index.add_many(
+                self.cache.get_many(GEO_NAMESPACE, missing[start:start + batch_size]), CACHE['GEO_TTL']
+            )
+        logger.info(f"Indexed {len(missing)} cached GEO datasets, {len(cached)} in total")
+        return len(missing)
            
+    @metrics.timed("metadata_fetch")
     def process_pmid_geo_data(self, geo_ids: Dict[str, List[str]]) -> pd.DataFrame:
         """
         Process PMID to GEO mapping and create a DataFrame with all information.
         
+        The DataFrame has one row per unique GEO dataset, so a dataset cited by
+        several papers is processed and weighted only once. Its citing PMIDs are
+        kept as a list in the 'PMIDs' column, in input order.
+        
         Args:
             geo_ids (Dict[str, List[str]]): Dictionary mapping PMIDs to their associated GEO IDs
             
         Returns:
             pd.DataFrame: DataFrame containing all GEO dataset information
         """
-        records = []
+        pmids_by_geo = self.group_pmids_by_geo(geo_ids)
+        df = self._geo_frame(pmids_by_geo)
+        metrics.set("pipeline_rows", "Rows of the latest run per stage", len(df), stage="metadata_fetch")
+        n_links = sum(len(pmids) for pmids in pmids_by_geo.values())
+        logger.info(f"Created DataFrame with {len(df)} GEO datasets for {n_links} PMID links")
+        return df
+    
+    def iter_pmid_geo_data(self, geo_ids: Dict[str, List[str]],
+                           chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Same rows as process_pmid_geo_data, yielded in chunks.
         
+        Metadata is fetched chunk by chunk when the generator is consumed, so only
+        one chunk is held in memory. Running it again reads the metadata from the cache.
+        
+        Args:
+            geo_ids (Dict[str, List[str]]): Dictionary mapping PMIDs to their associated GEO IDs
+            chunk_size (int, optional): GEO datasets per chunk, defaults to STREAMING['CHUNK_SIZE']
+            
+        Yields:
+            pd.DataFrame: Up to chunk_size GEO datasets
+        """
+        chunk_size = chunk_size or STREAMING['CHUNK_SIZE']
+        pmids_by_geo = list(self.group_pmids_by_geo(geo_ids).items())
+        for start in range(0, len(pmids_by_geo), chunk_size):
+            yield self._geo_frame(dict(pmids_by_geo[start:start + chunk_size]))
+    
+    @staticmethod
+    def group_pmids_by_geo(geo_ids: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Invert PMID to GEO links into the PMIDs of every GEO dataset, skipping error messages and invalid IDs."""
+        pmids_by_geo: Dict[str, List[str]] = {}
         for pmid, gse_ids in geo_ids.items():
             for geo_id in gse_ids:
-                # Skip error messages and invalid IDs
-                if geo_id in ["No GEO IDs connected", "Request error", "Parse error", "Unexpected error"]:
+                if geo_id in LINK_SENTINELS:
                     continue
-                    
-                # Get detailed GEO data
+                pmids = pmids_by_geo.setdefault(geo_id, [])
+                # PMIDs arrive one after another, so a repeated link is always the last entry
+                if not pmids or pmids[-1] != pmid:
+                    pmids.append(pmid)
+        return pmids_by_geo
+    
+    def _geo_frame(self, pmids_by_geo: Dict[str, List[str]]) -> pd.DataFrame:
+        """Fetch the metadata of GEO datasets and build one row per dataset."""
+        # Fetch all uncached GEO IDs in bulk, then read them back with one lookup
+        self.fetch_geo_data(list(pmids_by_geo))
+        cached = self.cache.get_many(GEO_NAMESPACE, pmids_by_geo)
+        
+        records = []
+        for geo_id, pmids in pmids_by_geo.items():
+            # Get detailed GEO data, falling back to a single request if the bulk fetch missed it
+            if geo_id in cached:
+                title, exp_type, summary, organism, overall_design = cached[geo_id]
+            else:
                 title, exp_type, summary, organism, overall_design = self.get_geo_data(geo_id)
-                
-                # Create record
-                record = {
-                    "PMID": pmid,
-                    "GEO ID": geo_id,
-                    "Title": title,
-                    "Experiment type": exp_type,
-                    "Summary": summary,
-                    "Organism": organism,
-                    "Overall design": overall_design
-                }
-                records.append(record)
+            
+            # Create record
+            record = {
+                "GEO ID": geo_id,
+                "PMIDs": pmids,
+                "Title": title,
+                "Experiment type": exp_type,
+                "Summary": summary,
+                "Organism": organism,
+                "Overall design": overall_design
+            }
+            records.append(record)
                 
         # Create DataFrame
-        df = pd.DataFrame(records)
-        logger.info(f"Created DataFrame with {len(df)} records")
-        return df
+        return pd.DataFrame(records)
     
     
         
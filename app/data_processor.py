@@ -1,16 +1,25 @@
 import logging
-from typing import Optional, Tuple
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
 import pandas as pd 
 import numpy as np 
-import re 
-import nltk 
-from nltk.corpus import stopwords
 from nltk import PorterStemmer
 from nltk.stem import WordNetLemmatizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-from scipy.sparse import csr_matrix
+from sklearn.base import clone
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import normalize
+from joblib import Parallel, delayed
+from sklearn.decomposition import PCA, IncrementalPCA
+from scipy.sparse import csr_matrix, diags, load_npz, save_npz, vstack
+from app.metrics import metrics
+from app.text_preprocessor import TextPreprocessor
+from config import REDUCTION, CLUSTERING, STREAMING, COHORTS
 
 
 
@@ -21,91 +30,407 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-#Download required NLTK data
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('wordnet')  
-
 
 class DataProcessor:
-    """Processes and transforms text data using NLP techniques."""
+    """
+    Processes and transforms text data using NLP techniques.
+    
+    One instance can serve concurrent analyses: self.vectorizer only holds the
+    parameters, every run fits its own copy. The fitted vectorizer and the cluster
+    report of a run are kept per thread.
+    """
     
     def __init__(self):
         self.data=None
         self.stemmer = PorterStemmer()
         self.lemmatizer = WordNetLemmatizer()
+        self.preprocessor = TextPreprocessor()
         self.vectorizer = TfidfVectorizer(
             max_features=50,
             stop_words='english',
             ngram_range=(1, 2)
         )
+        self._local = threading.local()
+        
+    @property
+    def fitted_vectorizer(self) -> Optional[TfidfVectorizer]:
+        """Vectorizer fitted by the last tf_idf_vectorizer call on this thread."""
+        return getattr(self._local, "vectorizer", None)
+    
+    @property
+    def fitted_pca(self) -> Optional[PCA]:
+        """PCA fitted by the last compute_pca call on this thread, None for a single row."""
+        return getattr(self._local, "pca", None)
+    
+    @property
+    def cluster_report(self) -> Optional[Dict]:
+        """Report of the last compute_clusters call on this thread."""
+        return getattr(self._local, "cluster_report", None)
         
    
     def preprocess_text(self, text: Optional[str]) -> str:
         """Preprocess text by cleaning, removing stopwords, and lemmatizing."""
-        if text is None:
-            return ""
-        # Remove special characters, keep letters and numbers
-        text = re.sub(r'[^a-zA-Z0-9]', ' ', text)
-        # Remove standalone numbers
-        text = re.sub(r'(?<!\w)\d+(?!\w)', ' ', text)
-        # Convert to lowercase
-        text = text.lower()
-        # Remove stopwords
-        text = [word for word in text.split(' ') if word not in stopwords.words('english')]
-        # Lemmatize words
-        text = [self.lemmatizer.lemmatize(word) for word in text]
-        # Remove empty strings
-        text = [word for word in text if len(word) != 0]
-    
-        return " ".join(text)  
+        return self.preprocessor.preprocess(text)
     
     
+    @metrics.timed("preprocess")
     def preprocess_dataFrame(self, df: pd.DataFrame) -> pd.DataFrame:
         """Preprocess text columns in the DataFrame"""
         text_columns = ['Title', 'Experiment type', 'Summary', 'Organism', 'Overall design']   
+        # Preprocess all columns in one pass, so repeated values are handled only once
+        texts = [text for col in text_columns for text in df[col].tolist()]
+        processed = self.preprocessor.preprocess_many(texts)
+        n_rows = len(df)
         processed_df = pd.DataFrame({
-            'PMID': df['PMID'],
             'GEO ID': df['GEO ID'],
-            **{col: df[col].apply(self.preprocess_text) for col in text_columns}
+            'PMIDs': df['PMIDs'],
+            **{col: processed[i * n_rows:(i + 1) * n_rows] for i, col in enumerate(text_columns)}
     
-        })
+        }, index=df.index)
         logger.info(f"Preprocessed DataFrame with {len(processed_df)} rows")
         return processed_df
     
     
-    def tf_idf_vectorizer(self, df: pd.DataFrame) -> Tuple[csr_matrix, pd.DataFrame]:
+    @metrics.timed("vectorize")
+    def tf_idf_vectorizer(self, df: pd.DataFrame) -> csr_matrix:
         """
         Create TF-IDF vectors from text columns.
         
         Returns:
-            Tuple containing:
-            - Sparse matrix (csr_matrix): For PCA and other matrix operations
-            - DataFrame: For easy viewing and manipulation of the TF-IDF features
+            csr_matrix: Sparse TF-IDF matrix
+        """
+        vectorizer = clone(self.vectorizer)
+        X_tfidf = vectorizer.fit_transform(self._corpus(df))
+        self._local.vectorizer = vectorizer
+        metrics.set("pipeline_rows", "Rows of the latest run per stage", X_tfidf.shape[0], stage="vectorize")
+        metrics.set("tfidf_features", "TF-IDF features of the latest run", X_tfidf.shape[1])
+        logger.info(f"Created TF-IDF matrix with {X_tfidf.shape[1]} features")
+
+        return X_tfidf
+    
+    
+    @metrics.timed("pca")
+    def compute_pca(self, tfidf_matrix: csr_matrix) -> np.ndarray:
+        """
+        Perform PCA on the sparse TF-IDF matrix without densifying it.
+        
+        Centering is done implicitly by the solver. The covariance solver is used for
+        small vocabularies and tiny inputs, ARPACK for large vocabularies.
+        
+        Inputs with fewer rows or features than REDUCTION['N_COMPONENTS'] get fewer
+        components, zero-padded, so the projection always has N_COMPONENTS columns.
+        A single row has no variance to project and is placed at the origin.
+        """
+        n_samples, n_features = tfidf_matrix.shape
+        if n_samples < 2:
+            self._local.pca = None
+            return np.zeros((n_samples, REDUCTION['N_COMPONENTS']))
+        
+        n_components = min(REDUCTION['N_COMPONENTS'], n_samples, n_features)
+        # ARPACK needs n_components < min(n_samples, n_features), the covariance solver allows equality
+        if n_features <= REDUCTION['COVARIANCE_MAX_FEATURES'] or n_components == min(n_samples, n_features):
+            svd_solver = 'covariance_eigh'
+        else:
+            svd_solver = 'arpack'
+        pca = PCA(n_components=n_components, svd_solver=svd_solver, random_state=42)
+        projection = pca.fit_transform(tfidf_matrix)
+        self._local.pca = pca
+        return self._pad_components(projection)
+    
+    @staticmethod
+    def _pad_components(projection: np.ndarray) -> np.ndarray:
+        """Append zero columns up to REDUCTION['N_COMPONENTS'] components."""
+        missing = REDUCTION['N_COMPONENTS'] - projection.shape[1]
+        return np.pad(projection, ((0, 0), (0, missing))) if missing > 0 else projection
+    
+    
+    @metrics.timed("cluster")
+    def compute_clusters(self, tfidf_matrix: csr_matrix, n_clusters: Optional[int] = None):
+        """
+        Compute clusters using KMeans. Return both the model and labels.
+        
+        Without n_clusters (CLUSTERING['N_CLUSTERS'] = None), k is selected automatically: every k between CLUSTERING['K_MIN']
+        and CLUSTERING['K_MAX'] is fitted in parallel and scored with a sampled silhouette.
+        The chosen k, the scores and the fit time per k are kept in self.cluster_report.
+        MiniBatchKMeans is used from CLUSTERING['MINIBATCH_MIN_ROWS'] rows on.
+        """
+        n_samples = tfidf_matrix.shape[0]
+        k_values = self._candidate_ks(n_samples) if n_clusters is None else [min(n_clusters, n_samples)]
+        
+        start = time.perf_counter()
+        if len(k_values) == 1:
+            fits = [_fit_kmeans(tfidf_matrix, k_values[0], score=False)]
+        else:
+            fits = Parallel(n_jobs=CLUSTERING['N_JOBS'])(
+                delayed(_fit_kmeans)(tfidf_matrix, k) for k in k_values
+            )
+        
+        # Highest silhouette wins, ties go to the smaller k
+        best = max(fits, key=lambda fit: (fit['score'] if fit['score'] is not None else -1, -fit['k']))
+        self._local.cluster_report = {
+            "k": best['k'],
+            "scores": {fit['k']: fit['score'] for fit in fits},
+            "fit_seconds": {fit['k']: fit['seconds'] for fit in fits},
+            "total_seconds": time.perf_counter() - start
+        }
+        metrics.set("clusters", "Clusters selected in the latest run", best['k'])
+        logger.info(
+            f"Selected {best['k']} clusters for {n_samples} rows in {self.cluster_report['total_seconds']:.2f}s, "
+            f"scores: {self.cluster_report['scores']}"
+        )
+        return best['model'], best['model'].labels_
+    
+    
+    @metrics.timed("streaming")
+    def compute_streaming(self, chunks: Iterable[pd.DataFrame], n_clusters: Optional[int] = None) -> pd.DataFrame:
+        """
+        Vectorize, project and cluster preprocessed chunks without holding the corpus in memory.
+        
+        Texts are hashed into STREAMING['N_FEATURES'] columns, so no vocabulary has to be
+        fitted. The chunks are consumed once: their hashed counts are spilled to a temporary
+        directory while the document frequencies are counted. A second pass over the spilled
+        chunks fits IncrementalPCA and MiniBatchKMeans with partial_fit, a third one projects
+        and assigns every row. IncrementalPCA needs dense input, so it is fed
+        STREAMING['PCA_BATCH_ROWS'] rows at a time; the projection itself stays sparse.
+        Memory is bounded by one chunk plus the coordinates, label and IDs of every row.
+        
+        Args:
+            chunks (Iterable[pd.DataFrame]): Preprocessed chunks, as returned by preprocess_dataFrame
+            n_clusters (int, optional): Number of clusters, defaults to STREAMING['N_CLUSTERS']
+            
+        Returns:
+            pd.DataFrame: PC1 to PC3, Cluster, GEO ID and PMIDs of every row
         """
         text_columns = ['Title', 'Experiment type', 'Summary', 'Organism', 'Overall design']
-        corpus = df[text_columns].agg(' '.join, axis=1) 
-        X_tfidf = self.vectorizer.fit_transform(corpus)
-        tfidf_df = pd.DataFrame(
-            X_tfidf.toarray(),
-            columns = self.vectorizer.get_feature_names_out()
+        hasher = HashingVectorizer(
+            n_features=STREAMING['N_FEATURES'],
+            stop_words='english',
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None
         )
-        logger.info(f"Created TF-IDF matrix with {tfidf_df.shape[1]} features")
-
-        return X_tfidf, tfidf_df
+        n_components = REDUCTION['N_COMPONENTS']
+        start = time.perf_counter()
+        
+        with tempfile.TemporaryDirectory(prefix="geo_stream_") as spill_dir:
+            # Pass 1: hash every chunk once and count document frequencies
+            paths, ids = [], []
+            document_frequency = np.zeros(hasher.n_features)
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                counts = hasher.transform(chunk[text_columns].agg(' '.join, axis=1))
+                document_frequency += np.bincount(counts.indices, minlength=hasher.n_features)
+                path = os.path.join(spill_dir, f"{len(paths)}.npz")
+                save_npz(path, counts)
+                paths.append(path)
+                ids.append(chunk[['GEO ID', 'PMIDs']])
+            n_rows = sum(len(chunk_ids) for chunk_ids in ids)
+            if n_rows < n_components:
+                raise ValueError(f"Streaming mode needs at least {n_components} rows, got {n_rows}")
+            
+            # Same smoothed IDF and l2 normalization as TfidfVectorizer
+            idf = diags(np.log((1 + n_rows) / (1 + document_frequency)) + 1)
+            
+            def load_tfidf(path: str) -> csr_matrix:
+                return normalize(load_npz(path) @ idf)
+            
+            def fit_pca(batch: csr_matrix) -> None:
+                # Densify a few rows at a time; a short last slice joins the one before,
+                # since every partial_fit needs n_components rows
+                step = max(STREAMING['PCA_BATCH_ROWS'], n_components)
+                starts = list(range(0, batch.shape[0], step))
+                if len(starts) > 1 and batch.shape[0] - starts[-1] < n_components:
+                    starts.pop()
+                for lo, hi in zip(starts, starts[1:] + [batch.shape[0]]):
+                    pca.partial_fit(batch[lo:hi].toarray())
+            
+            # Pass 2: fit the projection and the clusters batch by batch
+            k = min(n_clusters or STREAMING['N_CLUSTERS'], n_rows)
+            pca = IncrementalPCA(n_components=n_components)
+            kmeans = MiniBatchKMeans(n_clusters=k, random_state=CLUSTERING['RANDOM_STATE'])
+            # Every PCA batch needs n_components rows and the first KMeans batch k rows
+            min_rows = max(n_components, k)
+            pending = []
+            for path in paths:
+                pending.append(load_tfidf(path))
+                if sum(matrix.shape[0] for matrix in pending) >= min_rows:
+                    batch = vstack(pending)
+                    pending = []
+                    fit_pca(batch)
+                    kmeans.partial_fit(batch)
+            if pending:
+                batch = vstack(pending)
+                if batch.shape[0] >= n_components:
+                    fit_pca(batch)
+                kmeans.partial_fit(batch)
+            fit_seconds = time.perf_counter() - start
+            
+            # Pass 3: project and assign every chunk; (X - mean) @ components.T without densifying X
+            components = pca.components_.T
+            offset = pca.mean_ @ components
+            frames = []
+            for path, chunk_ids in zip(paths, ids):
+                X_tfidf = load_tfidf(path)
+                frame = pd.DataFrame(X_tfidf @ components - offset, columns=["PC1", "PC2", "PC3"])
+                frame["Cluster"] = kmeans.predict(X_tfidf)
+                frame["GEO ID"] = chunk_ids["GEO ID"].values
+                frame["PMIDs"] = chunk_ids["PMIDs"].values
+                frames.append(frame)
+        
+        self._local.cluster_report = {
+            "k": k,
+            "scores": {k: None},
+            "fit_seconds": {k: fit_seconds},
+            "total_seconds": time.perf_counter() - start,
+            "streaming": True
+        }
+        metrics.set("pipeline_rows", "Rows of the latest run per stage", n_rows, stage="streaming")
+        metrics.set("clusters", "Clusters selected in the latest run", k)
+        logger.info(
+            f"Streamed {n_rows} rows in {len(paths)} chunks into {k} clusters "
+            f"in {self._local.cluster_report['total_seconds']:.2f}s"
+        )
+        return pd.concat(frames, ignore_index=True)
     
-
-    def compute_pca(self, tfidf_matrix) -> np.ndarray:
-        """Perform PCA on the TF-IDF matrix."""
-        pca = PCA(n_components=3)
-        return pca.fit_transform(tfidf_matrix.toarray())   
     
+    def fit_model(self, p_df: pd.DataFrame, n_clusters: Optional[int] = None,
+                  progress: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Fit vectorizer, projection and clusters on preprocessed rows and keep them for later updates.
+        
+        Args:
+            p_df (pd.DataFrame): Output of preprocess_dataFrame
+            n_clusters (int, optional): Fixed number of clusters, selected automatically by default
+            progress (Callable, optional): Called with "vectorize" and "cluster" as they start
+            
+        Returns:
+            Dict: The fitted estimators, the rows with their TF-IDF vectors, projection and
+            labels, the position of every row in the fit ('fit_index', -1 for rows added
+            later), and the statistics model_drift compares updates against
+        """
+        report = progress or (lambda stage: None)
+        report("vectorize")
+        X_tfidf = self.tf_idf_vectorizer(p_df)
+        report("cluster")
+        projection = self.compute_pca(X_tfidf)
+        kmeans, labels = self.compute_clusters(X_tfidf, n_clusters)
+        n_rows = X_tfidf.shape[0]
+        return {
+            "fit_id": uuid.uuid4().hex,
+            "vectorizer": self.fitted_vectorizer,
+            "pca": self.fitted_pca,
+            "kmeans": kmeans,
+            "rows": p_df.drop(columns=['PMIDs']).reset_index(drop=True),
+            "tfidf": X_tfidf,
+            "projection": projection,
+            "labels": np.asarray(labels),
+            "fit_index": np.arange(n_rows),
+            "fit_rows": n_rows,
+            # Mean squared distance of the fitted rows to their centroid
+            "fit_distance": float(kmeans.inertia_) / n_rows,
+            "added": 0,
+            "added_distance": 0.0,
+            "removed": 0
+        }
     
-    def compute_clusters(self, tfidf_matrix: np.ndarray, n_clusters: int):
-        """Compute clusters using KMeans. Return both the model and lables."""
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        kmeans.fit_predict(tfidf_matrix)
-        return kmeans, kmeans.labels_
-
+    @metrics.timed("incremental")
+    def extend_model(self, model: Dict, p_new: pd.DataFrame) -> None:
+        """
+        Add preprocessed rows to a fitted model without refitting it.
         
-  
\ No newline at end of file
+        The rows are vectorized with the fitted vocabulary, projected with the fitted
+        components and assigned to the nearest existing centroid, so existing points
+        keep their position and cluster.
+        """
+        X_new = model["vectorizer"].transform(self._corpus(p_new))
+        distances = model["kmeans"].transform(X_new)
+        labels = distances.argmin(axis=1)
+        model["rows"] = pd.concat([model["rows"], p_new.drop(columns=['PMIDs'])], ignore_index=True)
+        model["tfidf"] = vstack([model["tfidf"], X_new], format="csr")
+        if model["pca"] is not None:
+            projection = self._pad_components(model["pca"].transform(X_new))
+        else:
+            # Fitted on a single row, see compute_pca
+            projection = np.zeros((X_new.shape[0], model["projection"].shape[1]))
+        model["projection"] = np.vstack([model["projection"], projection])
+        model["labels"] = np.concatenate([model["labels"], labels])
+        model["fit_index"] = np.concatenate([model["fit_index"], np.full(X_new.shape[0], -1)])
+        model["added"] += X_new.shape[0]
+        model["added_distance"] += float((distances[np.arange(len(labels)), labels] ** 2).sum())
+        logger.info(f"Added {X_new.shape[0]} rows to a model fitted on {model['fit_rows']} rows")
+    
+    @staticmethod
+    def select_model_rows(model: Dict, geo_ids: Iterable[str]) -> None:
+        """Drop the rows of a model whose GEO ID is not in geo_ids."""
+        keep = model["rows"]["GEO ID"].isin(set(geo_ids)).to_numpy()
+        if keep.all():
+            return
+        model["rows"] = model["rows"][keep].reset_index(drop=True)
+        model["tfidf"] = model["tfidf"][np.flatnonzero(keep)]
+        model["projection"] = model["projection"][keep]
+        model["labels"] = model["labels"][keep]
+        model["fit_index"] = model["fit_index"][keep]
+        model["removed"] += int((~keep).sum())
+    
+    @staticmethod
+    def model_drift(model: Dict) -> Dict[str, float]:
+        """
+        How far a model has moved away from the data it was fitted on.
+        
+        Returns:
+            Dict[str, float]: 'changed_ratio', the rows added or removed since the fit per
+            fitted row, and 'distance_ratio', the mean squared centroid distance of the added
+            rows relative to that of the fitted rows
+        """
+        changed_ratio = (model["added"] + model["removed"]) / model["fit_rows"]
+        distance_ratio = 0.0
+        if model["added"]:
+            added_distance = model["added_distance"] / model["added"]
+            if model["fit_distance"] > 0:
+                distance_ratio = added_distance / model["fit_distance"]
+            elif added_distance > 0:
+                # Every fitted row is a centroid, any distance is drift
+                distance_ratio = float("inf")
+        return {"changed_ratio": changed_ratio, "distance_ratio": distance_ratio}
+    
+    @staticmethod
+    def needs_refit(drift: Dict[str, float]) -> bool:
+        """Whether the drift of a model exceeds the limits in COHORTS."""
+        return (drift["changed_ratio"] > COHORTS['MAX_CHANGED_RATIO']
+                or drift["distance_ratio"] > COHORTS['MAX_DISTANCE_RATIO'])
+    
+    @staticmethod
+    def _corpus(df: pd.DataFrame) -> pd.Series:
+        """One document per row, joined from the text columns."""
+        text_columns = ['Title', 'Experiment type', 'Summary', 'Organism', 'Overall design']
+        return df[text_columns].agg(' '.join, axis=1)
+    
+    @staticmethod
+    def _candidate_ks(n_samples: int) -> List[int]:
+        """Values of k worth trying; silhouette needs 2 <= k < n_samples."""
+        k_max = min(CLUSTERING['K_MAX'], n_samples - 1)
+        k_values = list(range(CLUSTERING['K_MIN'], k_max + 1))
+        # Too few rows to compare clusterings, keep them in a single cluster
+        return k_values or [1]
+
+
+def _fit_kmeans(tfidf_matrix: csr_matrix, k: int, score: bool = True) -> Dict:
+    """Fit one KMeans model and score it with a sampled silhouette; runs in a worker."""
+    start = time.perf_counter()
+    n_samples = tfidf_matrix.shape[0]
+    if n_samples >= CLUSTERING['MINIBATCH_MIN_ROWS']:
+        model = MiniBatchKMeans(n_clusters=k, random_state=CLUSTERING['RANDOM_STATE'], n_init=3)
+    else:
+        model = KMeans(n_clusters=k, random_state=CLUSTERING['RANDOM_STATE'])
+    labels = model.fit_predict(tfidf_matrix)
+    
+    silhouette = None
+    if score and 1 < len(set(labels)) < n_samples:
+        silhouette = float(silhouette_score(
+            tfidf_matrix,
+            labels,
+            sample_size=min(CLUSTERING['SILHOUETTE_SAMPLE_SIZE'], n_samples),
+            random_state=CLUSTERING['RANDOM_STATE']
+        ))
+    return {"k": k, "model": model, "score": silhouette, "seconds": time.perf_counter() - start}
@@ -1,7 +1,11 @@
 import logging
 from typing import Dict, List 
-from config import PATHS 
+import numpy as np
 import pandas as pd
+from scipy.sparse import csr_matrix
+from app.artifacts import RunArtifacts, atomic_open
+from app.metrics import metrics
+from config import EXPORT
 
 # Configure logging
 logger = logging.basicConfig(
@@ -14,13 +18,15 @@ logger = logging.getLogger(__name__)
 
 class DataStoreHandler:
     
-    def __init__(self):
-        self.pmid_to_geo = PATHS['PMID_TO_GEO_FILE']
+    def __init__(self, artifacts: RunArtifacts):
+        self.artifacts = artifacts
+        self.pmid_to_geo = artifacts.path('PMID_TO_GEO_FILE')
         
+    @metrics.timed("export")
     def save_pmid_to_geo_file(self, results: Dict[str, List[str]]) -> None:
      
         try:
-            with open(self.pmid_to_geo, "w") as file:
+            with atomic_open(self.pmid_to_geo, "w") as file:
                 for pmid, gse_ids in results.items():
                     file.write(f"PMID: {pmid} -> GEO IDs: {', '.join(gse_ids)}\n")
             logger.info(f"Results saved to {self.pmid_to_geo}")
@@ -29,36 +35,147 @@ class DataStoreHandler:
             logger.error(f"Error saving results to file: {str(e)}")
             raise 
             
+    @metrics.timed("export")
     def save_geo_data(self, df: pd.DataFrame, output_file: str) -> None:
         """
         Save detailed GEO data from DataFrame to a text file.
         
+        Rows are streamed through a buffered writer with one write call per dataset.
+        The report is grouped by PMID, so a dataset is listed under every PMID in its
+        'PMIDs' column.
+        
         Args:
-            df (pd.DataFrame): DataFrame containing the GEO data
+            df (pd.DataFrame): DataFrame containing the GEO data, one row per dataset
             output_file (str): Path to save detailed GEO information
         """
         try:
             if df.empty:
                 logger.warning("No data to save - DataFrame is empty")
                 return
-                
-            with open(output_file, 'w', encoding='utf-8') as outfile:
-                # Group by PMID to organize the output
-                for pmid, group in df.groupby('PMID'):
-                    outfile.write(f"PMID: {pmid}\n")
-                    
-                    for _, row in group.iterrows():
-                        outfile.write(f"\tGEO ID: {row['GEO ID']}\n")
-                        outfile.write(f"\t\tTitle: {row['Title']}\n")
-                        outfile.write(f"\t\tExperiment type: {row['Experiment type']}\n")
-                        outfile.write(f"\t\tSummary: {row['Summary']}\n")
-                        outfile.write(f"\t\tOrganism: {row['Organism']}\n")
-                        outfile.write(f"\t\tOverall design: {row['Overall design']}\n")
-                    outfile.write("\n")  # Add empty line between different PMIDs
+            
+            columns = ['PMID', 'GEO ID', 'Title', 'Experiment type', 'Summary', 'Organism', 'Overall design']
+            # One row per (PMID, GEO ID) pair, in the same order as grouping by PMID
+            pairs = df.explode('PMIDs').rename(columns={'PMIDs': 'PMID'})
+            rows = pairs.sort_values('PMID', kind='stable')[columns].itertuples(index=False, name=None)
+            
+            with atomic_open(output_file, 'w', encoding='utf-8', buffering=EXPORT['WRITE_BUFFER_SIZE']) as outfile:
+                current_pmid = None
+                for pmid, geo_id, title, exp_type, summary, organism, overall_design in rows:
+                    if pmid != current_pmid:
+                        if current_pmid is not None:
+                            outfile.write("\n")  # Add empty line between different PMIDs
+                        outfile.write(f"PMID: {pmid}\n")
+                        current_pmid = pmid
+                    outfile.write(
+                        f"\tGEO ID: {geo_id}\n"
+                        f"\t\tTitle: {title}\n"
+                        f"\t\tExperiment type: {exp_type}\n"
+                        f"\t\tSummary: {summary}\n"
+                        f"\t\tOrganism: {organism}\n"
+                        f"\t\tOverall design: {overall_design}\n"
+                    )
+                outfile.write("\n")
                     
             logger.info(f"Detailed GEO data stored in {output_file}")
         except Exception as e:
             logger.error(f"Error saving GEO data to file: {str(e)}")
             raise
-    
+        
+    @metrics.timed("export")
+    def save_table(self, df: pd.DataFrame, key: str) -> List[str]:
+        """
+        Save a GEO metadata table in every format of EXPORT['TABLE_FORMATS'].
+        
+        Parquet and Feather store the columns of EXPORT['CATEGORICAL_COLUMNS'] as
+        categories. Without pyarrow the table falls back to CSV.
+        
+        Args:
+            df (pd.DataFrame): Table to save
+            key (str): Artifact name, e.g. 'GEO_TABLE'
+            
+        Returns:
+            List[str]: Paths of the written files
+        """
+        formats = list(EXPORT['TABLE_FORMATS'])
+        columnar = df.astype({col: 'category' for col in EXPORT['CATEGORICAL_COLUMNS'] if col in df})
+        written = []
+        try:
+            for fmt in formats:
+                path = self.artifacts.path(key, f".{fmt}")
+                if fmt == 'csv':
+                    with atomic_open(path, 'w', encoding='utf-8', newline='') as outfile:
+                        _join_lists(df).to_csv(outfile, index=False)
+                elif fmt in ('parquet', 'feather'):
+                    try:
+                        with atomic_open(path, 'wb') as outfile:
+                            if fmt == 'parquet':
+                                columnar.to_parquet(outfile, index=False, compression='zstd')
+                            else:
+                                columnar.reset_index(drop=True).to_feather(outfile, compression='zstd')
+                    except ImportError as e:
+                        logger.warning(f"Cannot write {fmt} ({str(e)}), saving {key} as csv instead")
+                        if 'csv' not in formats:
+                            formats.append('csv')
+                        continue
+                else:
+                    raise ValueError(f"Unknown table format: {fmt}")
+                written.append(path)
+                logger.info(f"Saved {key} to {path}")
+            return written
+        except Exception as e:
+            logger.error(f"Error saving {key}: {str(e)}")
+            raise
+        
+    @metrics.timed("export")
+    def save_tfidf_matrix(self, tfidf_matrix: csr_matrix, feature_names: List[str]) -> List[str]:
+        """
+        Save the TF-IDF matrix in every format of EXPORT['TFIDF_FORMATS'].
+        
+        'npz' keeps the matrix sparse and can be read with scipy.sparse.load_npz, the
+        vocabulary is stored in the same file under 'vocabulary'. 'csv' writes the
+        dense matrix chunk by chunk.
+        
+        Args:
+            tfidf_matrix (csr_matrix): Sparse TF-IDF matrix
+            feature_names (List[str]): Vocabulary, one name per column
             
+        Returns:
+            List[str]: Paths of the written files
+        """
+        written = []
+        try:
+            for fmt in EXPORT['TFIDF_FORMATS']:
+                path = self.artifacts.path('TFIDF_MATRIX', f".{fmt}")
+                if fmt == 'npz':
+                    matrix = tfidf_matrix.tocsr()
+                    with atomic_open(path, 'wb') as outfile:
+                        # Same layout as scipy.sparse.save_npz, plus the vocabulary
+                        np.savez_compressed(
+                            outfile,
+                            format=np.array(b'csr'),
+                            shape=np.array(matrix.shape),
+                            data=matrix.data,
+                            indices=matrix.indices,
+                            indptr=matrix.indptr,
+                            vocabulary=np.array(feature_names, dtype=str)
+                        )
+                elif fmt == 'csv':
+                    chunk_size = EXPORT['CSV_CHUNK_SIZE']
+                    with atomic_open(path, 'w', newline='') as outfile:
+                        for start in range(0, tfidf_matrix.shape[0], chunk_size):
+                            chunk = pd.DataFrame(tfidf_matrix[start:start + chunk_size].toarray(), columns=feature_names)
+                            chunk.to_csv(outfile, index=False, header=(start == 0))
+                else:
+                    raise ValueError(f"Unknown TF-IDF format: {fmt}")
+                written.append(path)
+                logger.info(f"Saved TF-IDF matrix to {path}")
+            return written
+        except Exception as e:
+            logger.error(f"Error saving TF-IDF matrix: {str(e)}")
+            raise
+
+
+def _join_lists(df: pd.DataFrame, separator: str = ";") -> pd.DataFrame:
+    """Write list columns such as 'PMIDs' to CSV as separated values instead of Python reprs."""
+    list_columns = [col for col in df.columns if len(df) and isinstance(df[col].iloc[0], list)]
+    return df.assign(**{col: df[col].str.join(separator) for col in list_columns})
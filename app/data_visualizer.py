@@ -1,74 +1,137 @@
 import logging
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
 import pandas as pd
 import plotly.express as px
+from app.cohort_models import CohortModelStore
+from app.compression import PLOTLY_VERSION
 from app.data_processor import DataProcessor
-from config import PATHS
+from app.result_cache import ResultCache
+from app.artifacts import RunArtifacts
+from app.data_store_handler import DataStoreHandler
+from app.metrics import metrics
+from config import CLUSTERING, REDUCTION, STREAMING, VISUALIZATION
 
 
 logger = logging.getLogger(__name__)
 
+# Version of the figure written by render, part of the cache key. Increase it whenever
+# render changes its output, so figures and ETags of the old format are not reused
+RENDER_VERSION = 1
+
 class DataVisualizer:
     """Handles the visualization of GEO dataset clusters."""
     
     def __init__(self):
         self.data_processor = DataProcessor()
+        self.result_cache = ResultCache()
+        self.cohort_models = CohortModelStore()
+        # Fit of the model last used for every cohort, part of the cache key in cohort mode
+        self.cohort_fits: Dict[str, str] = {}
         self.latest_graph = None
         
+    def model_params(self) -> Dict:
+        """Processing parameters that change the result."""
+        return {
+            "vectorizer": self.data_processor.vectorizer.get_params(),
+            "reduction": REDUCTION,
+            "clustering": CLUSTERING,
+            "streaming": STREAMING
+        }
+        
+    def cache_key(self, df: pd.DataFrame, pmids: Optional[List[str]] = None, cohort: Optional[str] = None) -> str:
+        """Content hash of the PMID set, the GEO metadata and the cache_params."""
+        if pmids is None:
+            pmids = [pmid for geo_pmids in df['PMIDs'] for pmid in geo_pmids] if 'PMIDs' in df else []
+        return ResultCache.make_key(pmids, df, self.cache_params(cohort))
+        
+    def cache_params(self, cohort: Optional[str] = None) -> Dict:
+        """
+        Processing parameters, figure format and cohort model, as hashed into the cache key.
+        
+        The figure settings are only part of the key, not of model_params, so changing
+        them renders cohorts again without refitting their models.
+        """
+        params = self.model_params()
+        params["visualization"] = VISUALIZATION
+        params["render_version"] = [RENDER_VERSION, PLOTLY_VERSION]
+        if cohort is not None:
+            params["cohort"] = [cohort, self.cohort_fits.get(cohort)]
+        return params
+        
 
-    def visualize(self, df):
-        """Generate a 3D visualization of GEO dataset clusters."""
+    def visualize(self, df: pd.DataFrame, pmids: Optional[List[str]] = None,
+                  progress: Optional[Callable[[str], None]] = None,
+                  artifacts: Optional[RunArtifacts] = None, cohort: Optional[str] = None) -> str:
+        """
+        Generate a 3D visualization of GEO dataset clusters.
+        
+        Results are memoized by cache_key, so a repeated analysis of the same cohort
+        returns the stored figure without recomputing anything. The intermediate files
+        are then not written again.
+        
+        With a cohort name, the fitted model of the cohort is reused instead, see
+        visualize_cohort.
+        
+        Args:
+            df (pd.DataFrame): GEO dataset information
+            pmids (List[str], optional): Submitted PMIDs, defaults to the PMIDs in df
+            progress (Callable, optional): Called with the name of each stage as it starts
+            artifacts (RunArtifacts, optional): Run directory for the intermediate files, a new one by default
+            cohort (str, optional): Name of the cohort whose model is reused and updated
+            
+        Returns:
+            str: HTML of the figure
+        """
+        if cohort is not None:
+            return self.visualize_cohort(df, cohort, progress=progress, artifacts=artifacts)
+        report = progress or (lambda stage: None)
         try:
+            key = self.cache_key(df, pmids)
+            cached = self.result_cache.get(key)
+            metrics.cache_lookup("results", int(cached is not None), int(cached is None))
+            if cached is not None:
+                logger.info(f"Using cached analysis result {key[:12]}")
+                self.latest_graph = cached['graph_html']
+                return self.latest_graph
+            
+            artifacts = artifacts or RunArtifacts()
+            
             # Preprocess data and save 
+            report("preprocess")
             p_df = self.data_processor.preprocess_dataFrame(df)
-            p_df.to_csv(PATHS["P_CSV_FILE"], index=False)
-            logger.info(f"Saved preprocessed DataFrame to {PATHS['P_CSV_FILE']}")
+            data_store_handler = DataStoreHandler(artifacts)
+            data_store_handler.save_table(p_df, 'P_GEO_TABLE')
             
             # Create TF-IDF vectors and save
-            X_tfidf, tfidf_df = self.data_processor.tf_idf_vectorizer(p_df)
-            tfidf_df.to_csv(PATHS["TFIDF_FILE"], index=False)
-            logger.info(f"Saved TF-IDF matrix to {PATHS['TFIDF_FILE']}")
+            report("vectorize")
+            X_tfidf = self.data_processor.tf_idf_vectorizer(p_df)
+            feature_names = self.data_processor.fitted_vectorizer.get_feature_names_out()
+            data_store_handler.save_tfidf_matrix(X_tfidf, feature_names)
             
             # Perform PCA
+            report("cluster")
             X_pca = self.data_processor.compute_pca(X_tfidf)
-            df_pca = pd.DataFrame(X_pca, columns=["PC1", "PC2", "PC3"])
             
             # Perform clustering
-            kmeans, cluster_labels = self.data_processor.compute_clusters(X_tfidf, 3)
+            kmeans, cluster_labels = self.data_processor.compute_clusters(X_tfidf, CLUSTERING['N_CLUSTERS'])
             p_df['Cluster'] = cluster_labels
-            df_pca["Cluster"] = p_df["Cluster"]  
-            df_pca["Cluster_Label"] = "Cluster " + df_pca["Cluster"].astype(str)
-            df_pca["GEO ID"] = p_df["GEO ID"]
-            df_pca["PMID"] = p_df["PMID"]
+            df_pca = self._plot_frame(X_pca, p_df)
         
             # Create visualization
-            fig = px.scatter_3d(
-                df_pca,
-                x="PC1", y="PC2", z="PC3",
-                color="Cluster_Label",
-                hover_data={"PC1": False, "PC2": False, "PC3":False, "GEO ID": True, "PMID": True},
-                title="GEO Dataset Clusters Based on TF-IDF Analysis",
-                labels={
-                    "PC1": "Principal Component 1",
-                    "PC2": "Principal Component 2",
-                    "PC3":"Principal Component 3"
-                }
-            )  
-            fig.update_traces(marker=dict(size=10))
-            fig.update_layout(
-                legend_title_text="Cluster", 
-                height=800,
-                margin=dict(l=0, r=0, t=30, b=0)
-            )
-        
-            # Convert to HTML
-            self.latest_graph = fig.to_html(
-                full_html=False,
-                include_plotlyjs=True,
-                default_width='100%',
-                default_height='100%'
-            ).encode('utf-8').decode('utf-8')
+            report("render")
+            self.latest_graph = self.render(df_pca)
             logger.info("Visualization generated successfully")
             
+            self.result_cache.put(key, {
+                "tfidf_matrix": X_tfidf,
+                "feature_names": feature_names,
+                "projection": X_pca,
+                "labels": cluster_labels,
+                "cluster_report": self.data_processor.cluster_report,
+                "graph_html": self.latest_graph
+            })
+            
             return self.latest_graph
 
         except Exception as e:
@@ -76,3 +139,192 @@ class DataVisualizer:
             raise
 
 
+    def visualize_cohort(self, df: pd.DataFrame, cohort: str,
+                         progress: Optional[Callable[[str], None]] = None,
+                         artifacts: Optional[RunArtifacts] = None) -> str:
+        """
+        Generate the visualization with the stored model of a named cohort.
+        
+        Datasets analyzed before keep their position and cluster. Only datasets new to
+        the cohort are preprocessed, vectorized, projected and assigned to the nearest
+        existing centroid, so an update costs time in proportion to the new datasets.
+        Once the cohort drifts too far from the data the model was fitted on (see
+        COHORTS in config.py), or the processing parameters change, the model is
+        fitted again on the whole cohort.
+        
+        Args:
+            df (pd.DataFrame): GEO dataset information
+            cohort (str): Cohort name
+            progress (Callable, optional): Called with the name of each stage as it starts
+            artifacts (RunArtifacts, optional): Run directory for the intermediate files, a new one by default
+            
+        Returns:
+            str: HTML of the figure
+        """
+        report = progress or (lambda stage: None)
+        try:
+            artifacts = artifacts or RunArtifacts()
+            params = self.model_params()
+            with self.cohort_models.lock(cohort):
+                model = self.cohort_models.get(cohort)
+                if model is not None and model["params"] != params:
+                    logger.info(f"Processing parameters changed, refitting cohort {cohort}")
+                    model = None
+                    
+                changed = True
+                if model is not None:
+                    report("preprocess")
+                    n_rows = len(model["rows"])
+                    self.data_processor.select_model_rows(model, df["GEO ID"])
+                    new = df[~df["GEO ID"].isin(set(model["rows"]["GEO ID"]))]
+                    changed = len(new) > 0 or len(model["rows"]) < n_rows
+                    if len(new):
+                        report("vectorize")
+                        self.data_processor.extend_model(model, self.data_processor.preprocess_dataFrame(new))
+                    drift = self.data_processor.model_drift(model)
+                    if self.data_processor.needs_refit(drift):
+                        logger.info(f"Refitting cohort {cohort}, drift: {drift}")
+                        model = None
+                    else:
+                        logger.info(f"Updated cohort {cohort} with {len(new)} new datasets, drift: {drift}")
+                        metrics.inc("cohort_updates_total", "Cohort analyses by kind of model update", kind="incremental")
+                        
+                if model is None:
+                    report("preprocess")
+                    p_df = self.data_processor.preprocess_dataFrame(df)
+                    model = self.data_processor.fit_model(p_df, CLUSTERING['N_CLUSTERS'], progress=report)
+                    model["params"] = params
+                    metrics.inc("cohort_updates_total", "Cohort analyses by kind of model update", kind="refit")
+                    
+                if changed:
+                    self.cohort_models.put(cohort, model)
+                self.cohort_fits[cohort] = model["fit_id"]
+            
+            # Rows of the model in the order of df
+            order = pd.Index(model["rows"]["GEO ID"]).get_indexer(df["GEO ID"])
+            p_df = model["rows"].iloc[order].reset_index(drop=True)
+            p_df.insert(1, 'PMIDs', df['PMIDs'].to_list())
+            p_df['Cluster'] = model["labels"][order]
+            data_store_handler = DataStoreHandler(artifacts)
+            data_store_handler.save_table(p_df, 'P_GEO_TABLE')
+            data_store_handler.save_tfidf_matrix(model["tfidf"][order], model["vectorizer"].get_feature_names_out())
+            
+            report("render")
+            self.latest_graph = self.render(self._plot_frame(model["projection"][order], p_df))
+            logger.info(f"Visualization of cohort {cohort} generated successfully")
+            return self.latest_graph
+        
+        except Exception as e:
+            logger.error(f"Error during visualization of cohort {cohort}: {str(e)}")
+            raise
+
+
+    @staticmethod
+    def _plot_frame(projection: np.ndarray, p_df: pd.DataFrame) -> pd.DataFrame:
+        """Points of the figure: coordinates, cluster, GEO ID and the PMIDs citing the dataset."""
+        df_pca = pd.DataFrame(projection, columns=["PC1", "PC2", "PC3"])
+        df_pca["Cluster"] = p_df["Cluster"].to_numpy()
+        df_pca["Cluster_Label"] = "Cluster " + df_pca["Cluster"].astype(str)
+        df_pca["GEO ID"] = p_df["GEO ID"].to_numpy()
+        # One point per dataset, listing all PMIDs citing it on hover
+        df_pca["PMID"] = p_df["PMIDs"].str.join(", ").to_numpy()
+        return df_pca
+
+
+    def visualize_streaming(self, chunks: Iterable[pd.DataFrame],
+                            progress: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Generate the visualization from GEO data chunks, see DataProcessor.compute_streaming.
+        
+        Chunks are preprocessed as they are consumed, so the full table is never held in
+        memory. Results are not memoized and no intermediate files are written.
+        
+        Args:
+            chunks (Iterable[pd.DataFrame]): GEO dataset information, e.g. from DataHandler.iter_pmid_geo_data
+            progress (Callable, optional): Called with the name of each stage as it starts
+            
+        Returns:
+            str: HTML of the figure
+        """
+        report = progress or (lambda stage: None)
+        try:
+            report("preprocess")
+            processed = (self.data_processor.preprocess_dataFrame(chunk) for chunk in chunks)
+            n_clusters = CLUSTERING['N_CLUSTERS'] or STREAMING['N_CLUSTERS']
+            df_pca = self.data_processor.compute_streaming(processed, n_clusters)
+            df_pca["Cluster_Label"] = "Cluster " + df_pca["Cluster"].astype(str)
+            df_pca["PMID"] = df_pca.pop("PMIDs").str.join(", ")
+            
+            report("render")
+            self.latest_graph = self.render(df_pca)
+            logger.info("Streaming visualization generated successfully")
+            return self.latest_graph
+        
+        except Exception as e:
+            logger.error(f"Error during streaming visualization: {str(e)}")
+            raise
+
+
+    @metrics.timed("render")
+    def render(self, df_pca: pd.DataFrame) -> str:
+        """
+        Render the 3D scatter plot of the projected datasets as an HTML fragment.
+        
+        The fragment only holds the figure JSON, with coordinates as binary arrays;
+        plotly.js itself is loaded separately by the page. Large projections are
+        sampled down first, see decimate.
+        """
+        n_points = len(df_pca)
+        df_pca = self.decimate(df_pca)
+        coordinates = ["PC1", "PC2", "PC3"]
+        df_pca = df_pca.astype({col: VISUALIZATION['COORDINATE_DTYPE'] for col in coordinates})
+        title = "GEO Dataset Clusters Based on TF-IDF Analysis"
+        if len(df_pca) < n_points:
+            title += f" ({len(df_pca)} of {n_points} datasets shown)"
+        
+        fig = px.scatter_3d(
+            df_pca,
+            x="PC1", y="PC2", z="PC3",
+            color="Cluster_Label",
+            hover_data={"PC1": False, "PC2": False, "PC3":False, "GEO ID": True, "PMID": True},
+            title=title,
+            labels={
+                "PC1": "Principal Component 1",
+                "PC2": "Principal Component 2",
+                "PC3":"Principal Component 3"
+            }
+        )  
+        fig.update_traces(marker=dict(size=10))
+        fig.update_layout(
+            legend_title_text="Cluster", 
+            height=800,
+            margin=dict(l=0, r=0, t=30, b=0)
+        )
+    
+        # Convert to HTML
+        return fig.to_html(
+            full_html=False,
+            include_plotlyjs=False,
+            default_width='100%',
+            default_height='100%'
+        )
+    
+    
+    @staticmethod
+    def decimate(df_pca: pd.DataFrame) -> pd.DataFrame:
+        """
+        Sample a projection down to about VISUALIZATION['MAX_POINTS'] points.
+        
+        Every cluster is sampled in proportion to its size, but keeps at least
+        VISUALIZATION['MIN_POINTS_PER_CLUSTER'] points, so small clusters stay visible.
+        """
+        max_points = VISUALIZATION['MAX_POINTS']
+        if not max_points or len(df_pca) <= max_points:
+            return df_pca
+        fraction = max_points / len(df_pca)
+        samples = []
+        for _, cluster in df_pca.groupby("Cluster", sort=False):
+            n = max(round(len(cluster) * fraction), VISUALIZATION['MIN_POINTS_PER_CLUSTER'])
+            samples.append(cluster.sample(n=min(n, len(cluster)), random_state=CLUSTERING['RANDOM_STATE']))
+        logger.info(f"Sampled {sum(len(sample) for sample in samples)} of {len(df_pca)} points for the figure")
+        return pd.concat(samples).sort_index()
@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+import requests
+from requests.adapters import HTTPAdapter
+from app.metrics import metrics
+from config import EUTILS
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket limiting how many requests are started per second."""
+    
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        
+    def try_acquire(self) -> float:
+        """Take a token if one is available and return 0, otherwise return the seconds to wait."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+        
+    def acquire(self) -> None:
+        """Block until a token is available, then take it."""
+        wait = self.try_acquire()
+        while wait:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+
+_limiters: Dict[float, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(rate: float) -> RateLimiter:
+    """Return the process-wide limiter for a rate, so all clients share the NCBI budget."""
+    with _limiters_lock:
+        if rate not in _limiters:
+            _limiters[rate] = RateLimiter(rate)
+        return _limiters[rate]
+
+
+class EUtilsClient:
+    """Concurrent, rate-limited client for the NCBI E-utilities."""
+    
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.base_url = base_url or EUTILS['BASE_URL']
+        self.api_key = api_key if api_key is not None else EUTILS['API_KEY']
+        rate = EUTILS['RATE_LIMIT'] or (10 if self.api_key else 3)
+        self.limiter = get_rate_limiter(rate)
+        self.max_workers = EUTILS['MAX_WORKERS']
+        self.max_retries = EUTILS['MAX_RETRIES']
+        self.backoff_factor = EUTILS['BACKOFF_FACTOR']
+        self.timeout = EUTILS['TIMEOUT']
+        
+        # Pooled keep-alive connections, one per worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+    def _common_params(self) -> Dict[str, str]:
+        params = {"tool": EUTILS['TOOL']}
+        if EUTILS['EMAIL']:
+            params["email"] = EUTILS['EMAIL']
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
+        
+    def request(self, method: str, endpoint: str, params: Dict, stream: bool = False) -> requests.Response:
+        """
+        Send one E-utilities request, retrying 429/5xx responses with backoff.
+        
+        Args:
+            method (str): "GET" or "POST"; POST sends params in the body
+            endpoint (str): E-utility name, e.g. "esummary.fcgi"
+            params (Dict): Query parameters, list values are sent as repeated keys
+            stream (bool): Return as soon as the headers arrive and leave the body unread,
+                e.g. for iter_elements. The latency is then recorded when the response is closed
+            
+        Returns:
+            requests.Response: Successful response
+        """
+        url = self.base_url + endpoint
+        params = {**params, **self._common_params()}
+        
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                if method == "POST":
+                    response = self.session.post(url, data=params, timeout=self.timeout, stream=stream)
+                else:
+                    response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                _count_request(endpoint, "error")
+                _observe_latency(endpoint, time.perf_counter() - start)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_factor * 2 ** attempt
+                logger.warning(f"{endpoint} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            _count_request(endpoint, str(response.status_code))
+                
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                _observe_latency(endpoint, time.perf_counter() - start)
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff_factor * 2 ** attempt
+                logger.warning(f"{endpoint} returned {response.status_code}, retrying in {delay:.1f}s")
+                response.close()
+                time.sleep(delay)
+                continue
+                
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                _observe_latency(endpoint, time.perf_counter() - start)
+                response.close()
+                raise
+            if stream:
+                # The body is read after returning, its latency is known when the stream is closed
+                _observe_on_close(response, endpoint, start)
+            else:
+                _observe_latency(endpoint, time.perf_counter() - start)
+            return response
+        
+    def get(self, endpoint: str, params: Dict, stream: bool = False) -> requests.Response:
+        return self.request("GET", endpoint, params, stream)
+    
+    def post(self, endpoint: str, params: Dict, stream: bool = False) -> requests.Response:
+        return self.request("POST", endpoint, params, stream)
+    
+    def map(self, func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Run func over items concurrently and return the results in input order.
+        
+        Requests made inside func still go through the shared rate limiter, so
+        total wall time is bounded by the rate limit rather than summed latency.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            return list(executor.map(func, items))
+
+
+def iter_elements(response: requests.Response, *tags: str) -> Iterator[ET.Element]:
+    """
+    Parse a streamed XML response incrementally and yield every complete top-level element with one of the tags.
+    
+    Only direct children of the root element are yielded, so an <ERROR> nested in a record
+    is not mistaken for an error of the whole response. Records are parsed while the rest of
+    the body is still downloading and are cleared and detached from the root once the caller
+    has processed them, so memory does not grow with the response. The response is closed when the iteration ends.
+    """
+    response.raw.decode_content = True
+    root = None
+    depth = 0
+    try:
+        for event, element in ET.iterparse(response.raw, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if element.tag in tags:
+                yield element
+                element.clear()
+            # Cleared records would otherwise stay attached to the root until the end
+            root.clear()
+    finally:
+        response.close()
+
+
+def _count_request(endpoint: str, status: str) -> None:
+    metrics.inc("eutils_requests_total", "E-utilities requests by endpoint and HTTP status",
+                endpoint=endpoint, status=status)
+
+
+def _observe_latency(endpoint: str, seconds: float) -> None:
+    metrics.observe("eutils_request_seconds", "E-utilities response latency", seconds, endpoint=endpoint)
+
+
+def _observe_on_close(response: requests.Response, endpoint: str, start: float) -> None:
+    """Record the latency of a streamed response, including reading its body, when it is first closed."""
+    close = response.close
+    observed = threading.Event()
+
+    def close_and_observe() -> None:
+        if not observed.is_set():
+            observed.set()
+            _observe_latency(endpoint, time.perf_counter() - start)
+        close()
+
+    response.close = close_and_observe
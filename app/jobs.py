@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from app.cache_store import CacheStore
+from app.pipeline import AnalysisPipeline, STAGES
+from config import JOBS
+
+
+logger = logging.getLogger(__name__)
+
+# Cache namespaces of the job states, the rendered results by ETag and the stage statistics
+JOB_NAMESPACE = "jobs"
+RESULT_NAMESPACE = "job_results"
+STATS_NAMESPACE = "job_stats"
+
+# Fields of a job kept in the cache; the PMIDs are only needed by the process running it
+_JOB_FIELDS = ("id", "cohort", "status", "stage", "stage_started", "stage_seconds",
+               "created", "heartbeat", "finished", "result", "error")
+
+
+class Job:
+    """State of one background analysis."""
+    
+    def __init__(self, pmids: List[str], cohort: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.pmids = pmids
+        self.cohort = cohort
+        self.status = "queued"
+        self.stage = None
+        self.stage_started = {}
+        self.stage_seconds = {}
+        self.created = time.time()
+        self.heartbeat = self.created
+        self.finished = None
+        self.result = None
+        self.error = None
+        
+    def start_stage(self, stage: str) -> None:
+        """Record the end of the current stage and the start of the next one."""
+        self._end_stage()
+        self.stage = stage
+        self.stage_started[stage] = time.time()
+        
+    def _end_stage(self) -> None:
+        if self.stage is not None:
+            self.stage_seconds[self.stage] = time.time() - self.stage_started[self.stage]
+        
+    def finish(self, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        self._end_stage()
+        self.finished = time.time()
+        self.result = result
+        self.error = error
+        self.status = "failed" if error else "done"
+        
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in _JOB_FIELDS}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Job":
+        job = cls.__new__(cls)
+        job.pmids = None
+        for field in _JOB_FIELDS:
+            setattr(job, field, data.get(field))
+        return job
+
+
+class JobManager:
+    """
+    Runs analyses on a worker pool, so HTTP requests return immediately.
+    
+    The state of every job is written to the SQLite cache at each stage, so any
+    worker process can report its progress. A finished job stores its rendered
+    figure under the result ETag, which identifies the analysed content: repeating
+    an analysis leads to the same result URL, and the browser revalidates its copy.
+    Jobs and results expire JOBS['RESULT_TTL'] seconds after they were last written.
+    
+    Until a job finishes, its process rewrites the state every JOBS['HEARTBEAT_INTERVAL']
+    seconds. A job without a heartbeat for JOBS['STALE_AFTER'] seconds lost its
+    process, e.g. to a restart, and is reported as failed.
+    
+    The average duration of every stage is tracked over finished jobs and used
+    to estimate the remaining time of running jobs.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None, store: Optional[CacheStore] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or JOBS['MAX_WORKERS'], thread_name_prefix="job")
+        self._store = store
+        self.lock = threading.Lock()
+        # Serializes the stage updates and the heartbeat writes of unfinished jobs
+        self.save_lock = threading.Lock()
+        # Queued and running jobs of this process, kept alive by the heartbeat thread
+        self.active: Dict[str, Job] = {}
+        self.heartbeat_thread = None
+        
+    @property
+    def store(self) -> CacheStore:
+        # Opened on first use so importing the app does not create the database
+        with self.lock:
+            if self._store is None:
+                self._store = CacheStore()
+            return self._store
+        
+    def submit(self, pmids: List[str], cohort: Optional[str] = None) -> Job:
+        """Queue an analysis of the PMIDs, optionally as an update of a named cohort, and return its job."""
+        job = Job(pmids, cohort)
+        self._save(job)
+        with self.lock:
+            self.active[job.id] = job
+            if self.heartbeat_thread is None:
+                self.heartbeat_thread = threading.Thread(target=self._keep_alive, name="job-heartbeat", daemon=True)
+                self.heartbeat_thread.start()
+        self.executor.submit(self._run, job)
+        logger.info(f"Submitted job {job.id} for {len(pmids)} PMIDs")
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """State of a job submitted by any process, None if it is unknown or expired."""
+        data = self.store.get(JOB_NAMESPACE, job_id)
+        if data is None:
+            return None
+        job = Job.from_dict(data)
+        if job.finished is None and time.time() - job.heartbeat > JOBS['STALE_AFTER']:
+            job.finish(error="The job stopped responding, its worker was probably restarted")
+        return job
+    
+    def get_result(self, etag: str) -> Optional[str]:
+        """HTML of the figure of a finished job, None if no job produced it or it expired."""
+        return self.store.get(RESULT_NAMESPACE, etag)
+        
+    def _save(self, job: Job) -> None:
+        with self.save_lock:
+            job.heartbeat = time.time()
+            self.store.put(JOB_NAMESPACE, job.id, job.to_dict(), JOBS['RESULT_TTL'])
+        
+    def _start_stage(self, job: Job, stage: str) -> None:
+        with self.save_lock:
+            job.start_stage(stage)
+        self._save(job)
+        
+    def _keep_alive(self) -> None:
+        """Write the heartbeat of every unfinished job of this process."""
+        while True:
+            time.sleep(JOBS['HEARTBEAT_INTERVAL'])
+            with self.lock:
+                jobs = list(self.active.values())
+            for job in jobs:
+                try:
+                    self._save(job)
+                except Exception as e:
+                    logger.error(f"Error writing heartbeat of job {job.id}: {str(e)}")
+        
+    def _run(self, job: Job) -> None:
+        job.status = "running"
+        self._save(job)
+        try:
+            result = AnalysisPipeline().run(job.pmids, progress=lambda stage: self._start_stage(job, stage),
+                                            run_id=job.id, cohort=job.cohort)
+            # Stored once per content; the job only keeps its ETag
+            self.store.put(RESULT_NAMESPACE, result['etag'], result.pop('graph_html'), JOBS['RESULT_TTL'])
+            with self.save_lock:
+                job.finish(result=result)
+            self._update_averages(job)
+            logger.info(f"Job {job.id} finished in {job.finished - job.created:.1f}s")
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            with self.save_lock:
+                job.finish(error=str(e))
+        self._save(job)
+        with self.lock:
+            del self.active[job.id]
+            
+    @property
+    def stage_averages(self) -> Dict[str, float]:
+        """Average seconds per stage over the finished jobs of all processes."""
+        return self.store.get(STATS_NAMESPACE, "stage_averages") or {}
+            
+    def _update_averages(self, job: Job) -> None:
+        """Exponential moving average of the stage durations."""
+        averages = self.stage_averages
+        for stage, seconds in job.stage_seconds.items():
+            previous = averages.get(stage)
+            averages[stage] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+        self.store.put(STATS_NAMESPACE, "stage_averages", averages)
+            
+    def eta(self, job: Job) -> Optional[float]:
+        """Estimated seconds until the job finishes, None while there is no history."""
+        if job.status in ("done", "failed"):
+            return 0.0
+        averages = self.stage_averages
+        remaining_stages = STAGES if job.stage is None else STAGES[STAGES.index(job.stage):]
+        if any(stage not in averages for stage in remaining_stages):
+            return None
+        eta = sum(averages[stage] for stage in remaining_stages)
+        if job.stage is not None:
+            eta -= min(time.time() - job.stage_started[job.stage], averages[job.stage])
+        return eta
+        
+    def status(self, job: Job) -> Dict:
+        """JSON-serializable progress of a job."""
+        completed = len(job.stage_seconds)
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "cohort": job.cohort,
+            "stage": job.stage,
+            "stages": list(STAGES),
+            "completed_stages": completed,
+            "progress": 1.0 if job.status == "done" else completed / len(STAGES),
+            "stage_seconds": job.stage_seconds,
+            "elapsed": (job.finished or time.time()) - job.created,
+            "eta": self.eta(job),
+            "timings": job.result['timings'] if job.result else None,
+            "error": job.error
+        }
+        
+        
+job_manager = JobManager()
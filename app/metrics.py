@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and histograms.
+
+    Values are exposed in the Prometheus text format by render(). Stage durations
+    are also collected per run while a track_run() block is active on the thread.
+    Values are kept per process and not shared between worker processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, list]] = {}
+        self._local = threading.local()
+
+    def _register(self, name: str, kind: str, description: str) -> None:
+        if name not in self.help:
+            self.help[name] = (kind, description)
+
+    def inc(self, name: str, description: str, value: float = 1, **labels: str) -> None:
+        """Increase a counter."""
+        key = _label_key(labels)
+        with self.lock:
+            self._register(name, "counter", description)
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, description: str, value: float, **labels: str) -> None:
+        """Set a gauge."""
+        key = _label_key(labels)
+        with self.lock:
+            self._register(name, "gauge", description)
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, description: str, value: float, **labels: str) -> None:
+        """Add a value to a histogram."""
+        key = _label_key(labels)
+        with self.lock:
+            self._register(name, "histogram", description)
+            series = self.histograms.setdefault(name, {})
+            # Bucket counts, then sum and count
+            values = series.setdefault(key, [0] * len(DEFAULT_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                if value <= bound:
+                    values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """Record the duration of a pipeline stage, also in the summary of the current run."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("pipeline_stage_seconds", "Duration of pipeline stages", seconds, stage=stage)
+            summary = getattr(self._local, "run", None)
+            if summary is not None:
+                summary[stage] = summary.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def track_run(self) -> Iterator[Dict[str, float]]:
+        """Collect the stage durations of one run on this thread into the yielded dict."""
+        summary: Dict[str, float] = {}
+        previous = getattr(self._local, "run", None)
+        self._local.run = summary
+        try:
+            yield summary
+        finally:
+            self._local.run = previous
+
+    def cache_lookup(self, namespace: str, hits: int, misses: int) -> None:
+        """Count cache hits and misses of a namespace."""
+        self.inc("cache_hits_total", "Cache lookups that found an entry", hits, namespace=namespace)
+        self.inc("cache_misses_total", "Cache lookups that found no entry", misses, namespace=namespace)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name in sorted(self.help):
+                kind, description = self.help[name]
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for key, values in sorted(self.histograms.get(name, {}).items()):
+                        for bound, count in zip(DEFAULT_BUCKETS, values):
+                            lines.append(f"{name}_bucket{_format_labels(key, le=repr(bound))} {count}")
+                        lines.append(f"{name}_bucket{_format_labels(key, le='+Inf')} {values[-1]}")
+                        lines.append(f"{name}_sum{_format_labels(key)} {values[-2]}")
+                        lines.append(f"{name}_count{_format_labels(key)} {values[-1]}")
+                else:
+                    series = self.counters if kind == "counter" else self.gauges
+                    for key, value in sorted(series.get(name, {}).items()):
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, le: Optional[str] = None) -> str:
+    pairs = list(key) + ([("le", le)] if le is not None else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
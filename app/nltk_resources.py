@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+import nltk
+from config import NLTK
+
+
+logger = logging.getLogger(__name__)
+
+# NLTK resource names and their locations inside the NLTK data path
+RESOURCES = {
+    "stopwords": "corpora/stopwords",
+    "punkt": "tokenizers/punkt",
+    "wordnet": "corpora/wordnet"
+}
+
+if NLTK['DATA_DIR'] and NLTK['DATA_DIR'] not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK['DATA_DIR'])
+
+_available = set()
+_lock = threading.Lock()
+
+
+def ensure_resource(name: str) -> None:
+    """
+    Make sure an NLTK resource is available locally.
+
+    The local NLTK data path is checked first, so nothing is downloaded when the
+    resource is already present. Missing resources are downloaded only if
+    NLTK['AUTO_DOWNLOAD'] is enabled.
+
+    Args:
+        name (str): Resource name, one of RESOURCES
+    """
+    if name in _available:
+        return
+    with _lock:
+        if name in _available:
+            return
+        start = time.perf_counter()
+        try:
+            nltk.data.find(RESOURCES[name])
+        except LookupError:
+            if not NLTK['AUTO_DOWNLOAD']:
+                raise
+            logger.info(f"NLTK resource '{name}' not found locally, downloading")
+            if not nltk.download(name, download_dir=NLTK['DATA_DIR'], quiet=True):
+                raise LookupError(f"Could not download NLTK resource '{name}'")
+        _available.add(name)
+        logger.debug(f"NLTK resource '{name}' ready in {time.perf_counter() - start:.3f}s")
+
+
+def prefetch(names: Optional[Iterable[str]] = None) -> None:
+    """Download all required NLTK resources up front, e.g. while building an image."""
+    start = time.perf_counter()
+    for name in names or RESOURCES:
+        ensure_resource(name)
+    logger.info(f"NLTK resources ready in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(message)s')
+    prefetch()
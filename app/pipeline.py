@@ -0,0 +1,126 @@
+import hashlib
+import logging
+from typing import Callable, Dict, Iterator, List, Optional
+import pandas as pd
+from app.artifacts import RunArtifacts, cleanup_runs
+from app.data_handler import DataHandler
+from app.data_store_handler import DataStoreHandler
+from app.data_visualizer import DataVisualizer
+from app.metrics import metrics
+from app.result_cache import ResultCache
+from app.services import get_data_handler, get_visualizer
+from config import STREAMING
+
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in execution order, reported through the progress callback
+STAGES = ("fetch", "preprocess", "vectorize", "cluster", "render")
+
+
+class AnalysisPipeline:
+    """
+    Runs the full PMID to visualization analysis.
+    
+    Uses the process-wide services by default, so pipelines are cheap to create
+    and concurrent runs share one HTTP session, cache and set of in-flight lookups.
+    """
+    
+    def __init__(self, data_handler: Optional[DataHandler] = None,
+                 visualizer: Optional[DataVisualizer] = None):
+        self.data_handler = data_handler or get_data_handler()
+        self.visualizer = visualizer or get_visualizer()
+        
+    def run(self, pmids: List[str], progress: Optional[Callable[[str], None]] = None,
+            run_id: Optional[str] = None, cohort: Optional[str] = None,
+            links: Optional[Dict[str, List[str]]] = None) -> Dict:
+        """
+        Fetch GEO data for the PMIDs, save it and generate the cluster visualization.
+        
+        All files are written to a separate directory per run, see RunArtifacts.
+        The seconds spent in every stage are returned as the timing summary of the run.
+        From STREAMING['MIN_DATASETS'] GEO datasets on, the analysis runs out of core.
+        
+        Args:
+            pmids (List[str]): PMIDs to analyze
+            progress (Callable, optional): Called with the name of each stage as it starts
+            run_id (str, optional): Name of the run directory, generated by default
+            cohort (str, optional): Name of a cohort whose fitted model is reused and
+                updated, see DataVisualizer.visualize_cohort
+            links (Dict[str, List[str]], optional): GEO IDs of the PMIDs, already resolved
+                with DataHandler.get_geo_ids_from_pmids, e.g. by run_batch.py
+            
+        Returns:
+            Dict: 'graph_html' with the figure, 'etag' identifying the result, 'run_id'
+            of the artifact directory and 'timings' with the seconds per stage
+        """
+        with metrics.track_run() as timings:
+            artifacts = RunArtifacts(run_id)
+            with artifacts.running():
+                cleanup_runs(keep=artifacts.run_id)
+                result = self._run(pmids, progress, artifacts, cohort, links)
+        result["timings"] = timings
+        metrics.inc("pipeline_runs_total", "Finished analysis runs")
+        logger.info("Run timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+        return result
+    
+    def _run(self, pmids: List[str], progress: Optional[Callable[[str], None]],
+             artifacts: RunArtifacts, cohort: Optional[str], links: Optional[Dict[str, List[str]]]) -> Dict:
+        report = progress or (lambda stage: None)
+        data_store_handler = DataStoreHandler(artifacts)
+        report("fetch")
+            
+        # Process PMIDs and get GEO data
+        pmid_geo_dict = links if links is not None else self.data_handler.get_geo_ids_from_pmids(pmids)
+        logger.info(f"Retrieved GEO IDs for {len(pmid_geo_dict)} PMIDs")
+        
+        # Save PMIDs to GEO IDs in .txt file
+        data_store_handler.save_pmid_to_geo_file(pmid_geo_dict)
+        
+        geo_ids = list(self.data_handler.group_pmids_by_geo(pmid_geo_dict))
+        if STREAMING['MIN_DATASETS'] is not None and len(geo_ids) >= STREAMING['MIN_DATASETS']:
+            if cohort is not None:
+                logger.warning(f"Cohort models are not used in streaming mode, ignoring cohort {cohort}")
+            return self._run_streaming(pmids, pmid_geo_dict, geo_ids, progress, artifacts)
+        
+        # Convert to DataFrame
+        df = self.data_handler.process_pmid_geo_data(pmid_geo_dict)
+        data_store_handler.save_table(df, 'GEO_TABLE')
+        
+        # Save detailed GEO data in .txt file
+        data_store_handler.save_geo_data(df, artifacts.path('GEO_DATA_FILE'))
+        
+        # Generate visualization
+        graph_html = self.visualizer.visualize(df, pmids, progress=progress, artifacts=artifacts, cohort=cohort)
+        logger.info("Generated visualization successfully")
+        
+        return {
+            "graph_html": graph_html,
+            "etag": self.visualizer.cache_key(df, pmids, cohort),
+            "run_id": artifacts.run_id
+        }
+        
+    def _run_streaming(self, pmids: List[str], pmid_geo_dict: Dict[str, List[str]], geo_ids: List[str],
+                       progress: Optional[Callable[[str], None]], artifacts: RunArtifacts) -> Dict:
+        """
+        Analyze a cohort too large for memory, fetching and processing the GEO data in chunks.
+        
+        Only the PMID to GEO file and the figure are produced; the full tables and the
+        detailed text report would need the whole cohort in memory.
+        """
+        logger.info(f"Analyzing {len(geo_ids)} GEO datasets in streaming mode")
+        # The metadata is hashed chunk by chunk as it streams past
+        digest = ResultCache.start_key(pmids)
+        chunks = self._hashed(self.data_handler.iter_pmid_geo_data(pmid_geo_dict), digest)
+        graph_html = self.visualizer.visualize_streaming(chunks, progress=progress)
+        return {
+            "graph_html": graph_html,
+            "etag": ResultCache.finish_key(digest, self.visualizer.cache_params()),
+            "run_id": artifacts.run_id
+        }
+        
+    @staticmethod
+    def _hashed(chunks: Iterator[pd.DataFrame], digest: "hashlib._Hash") -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            ResultCache.hash_frame(digest, chunk)
+            yield chunk
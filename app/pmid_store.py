@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Iterable, List, Optional, Union
+from app.artifacts import atomic_open
+from config import PMID_SETS
+
+
+logger = logging.getLogger(__name__)
+
+_PMID_PATTERN = re.compile(r"[0-9]{1,9}")
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def parse_pmids(entries: Iterable[Union[bytes, str]], max_pmids: Optional[int] = None) -> List[str]:
+    """
+    Validate PMIDs one entry at a time, e.g. while reading an upload line by line.
+
+    Empty entries and repeated PMIDs are skipped, the order of first occurrence is kept.
+
+    Args:
+        entries (Iterable[Union[bytes, str]]): Lines of a file or items of a form field, bytes are decoded as UTF-8
+        max_pmids (int, optional): Most PMIDs accepted, defaults to PMID_SETS['MAX_PMIDS']
+
+    Returns:
+        List[str]: Unique PMIDs
+
+    Raises:
+        ValueError: If an entry is not a PMID or there are too many PMIDs
+    """
+    max_pmids = max_pmids or PMID_SETS['MAX_PMIDS']
+    seen = set()
+    pmids = []
+    for number, entry in enumerate(entries, start=1):
+        if isinstance(entry, bytes):
+            try:
+                entry = entry.decode("utf-8")
+            except UnicodeDecodeError:
+                raise ValueError(f"Entry {number} is not valid UTF-8 text")
+        pmid = entry.strip().lstrip("\ufeff")
+        if not pmid or pmid in seen:
+            continue
+        if not _PMID_PATTERN.fullmatch(pmid):
+            raise ValueError(f"Entry {number} is not a PMID: {pmid[:40]!r}")
+        if len(pmids) == max_pmids:
+            raise ValueError(f"More than {max_pmids} PMIDs submitted")
+        seen.add(pmid)
+        pmids.append(pmid)
+    return pmids
+
+
+class PmidStore:
+    """
+    Submitted PMID sets on disk, addressed by the sha256 of their content.
+
+    Submitting the same PMIDs again reuses the stored file, so only the short key
+    has to be kept in the session cookie. Sets that were not submitted again within
+    PMID_SETS['RETENTION_SECONDS'] are removed.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or PMID_SETS['DIR']
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def put(self, pmids: List[str]) -> str:
+        """Store a PMID list if it is not stored yet and return its key."""
+        content = "".join(f"{pmid}\n" for pmid in pmids)
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        path = self._path(key)
+        if os.path.exists(path):
+            # Refresh the retention period
+            os.utime(path)
+            logger.info(f"PMID set {key[:12]} is already stored")
+            return key
+
+        with atomic_open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        logger.info(f"Stored PMID set {key[:12]} with {len(pmids)} PMIDs")
+        self._remove_expired()
+        return key
+
+    def get(self, key: Optional[str]) -> Optional[List[str]]:
+        """PMIDs stored under key, None if the key is unknown or the set expired."""
+        if not key or not _KEY_PATTERN.fullmatch(key):
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return [line.rstrip("\n") for line in f]
+        except FileNotFoundError:
+            return None
+
+    def _remove_expired(self) -> None:
+        cutoff = time.time() - PMID_SETS['RETENTION_SECONDS']
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".txt") and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+pmid_store = PmidStore()
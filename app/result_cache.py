@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+import joblib
+import pandas as pd
+from config import RESULT_CACHE
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of analysis results.
+
+    Each result is stored in one file named after its key. Reading a result
+    refreshes its modification time, and the least recently used files are
+    removed once the directory grows beyond RESULT_CACHE['MAX_BYTES'].
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or RESULT_CACHE['DIR']
+        self.max_bytes = max_bytes or RESULT_CACHE['MAX_BYTES']
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(pmids: Iterable[str], df: pd.DataFrame, params: Dict[str, Any]) -> str:
+        """
+        Hash the normalized PMID set, the resolved GEO metadata and the processing parameters.
+
+        Args:
+            pmids (Iterable[str]): Submitted PMIDs, order and duplicates are ignored
+            df (pd.DataFrame): GEO metadata the analysis runs on
+            params (Dict[str, Any]): Parameters that change the result
+
+        Returns:
+            str: Hex digest identifying the result
+        """
+        digest = ResultCache.start_key(pmids)
+        ResultCache.hash_frame(digest, df)
+        return ResultCache.finish_key(digest, params)
+
+    @staticmethod
+    def start_key(pmids: Iterable[str]) -> "hashlib._Hash":
+        """
+        First step of make_key, for metadata that arrives in chunks: hash every chunk
+        with hash_frame as it is consumed, then call finish_key.
+        """
+        digest = hashlib.sha256()
+        digest.update("\n".join(sorted({pmid.strip() for pmid in pmids})).encode('utf-8'))
+        return digest
+
+    @staticmethod
+    def hash_frame(digest: "hashlib._Hash", df: pd.DataFrame) -> None:
+        """Add the columns and content of a metadata frame to a key."""
+        digest.update(json.dumps(list(df.columns)).encode('utf-8'))
+        # List values, such as the PMIDs of a dataset, cannot be hashed directly
+        list_columns = [col for col in df.columns if len(df) and isinstance(df[col].iloc[0], list)]
+        if list_columns:
+            df = df.assign(**{col: df[col].str.join("\n") for col in list_columns})
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+
+    @staticmethod
+    def finish_key(digest: "hashlib._Hash", params: Dict[str, Any]) -> str:
+        """Add the parameters and return the key."""
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored result for a key, or None."""
+        path = self._path(key)
+        try:
+            result = joblib.load(path)
+            # Mark as recently used
+            os.utime(path)
+            return result
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading cached result {key}: {str(e)}")
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result atomically, then evict the least recently used results."""
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                joblib.dump(result, f, compress=3)
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except Exception as e:
+            logger.error(f"Error caching result {key}: {str(e)}")
+
+    def evict(self) -> None:
+        """Remove least recently used results until the cache fits into max_bytes."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".joblib"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"Evicted cached result {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
@@ -1,12 +1,16 @@
 import logging
-from flask import request, jsonify, redirect, url_for, render_template, session 
+import time
+from flask import request, jsonify, redirect, url_for, render_template, session, make_response, Response
 
 # This works because app was already created in __init__.py
 from app import app
-from app.data_handler import DataHandler 
-from app.data_store_handler import DataStoreHandler
-from app.data_visualizer import DataVisualizer
-from config import PATHS
+from app.compression import PLOTLY_VERSION, choose_encoding, compress_response, plotly_js
+from app.data_handler import GEO_NAMESPACE
+from app.jobs import job_manager
+from app.metrics import metrics
+from app.pmid_store import parse_pmids, pmid_store
+from app.services import get_data_handler
+from config import CACHE, JOBS, VISUALIZATION, SIMILARITY
 
 
 logger = logging.basicConfig(
@@ -21,6 +25,17 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+@app.after_request
+def compress_text_responses(response):
+    """Send text responses gzip or brotli compressed."""
+    return compress_response(response, request)
+
+
+@app.context_processor
+def inject_assets():
+    return {"plotly_js_url": url_for('plotly_asset', version=PLOTLY_VERSION)}
+
+
 @app.route('/', methods=['GET'])
 def home():
     """Render the home page with visualization."""
@@ -32,14 +47,17 @@ def process_manual():
     """Load PMIDs from input form."""
     try:
         pmids = request.form['pmids']  # Take PMIDs from FORM 
-        pmids_list = [pmid.strip() for pmid in pmids.split(',')]
+        pmids_list = parse_pmids(pmids.split(','))
         
-        # Store PMIDs in session to pass to visualize route
-        session['pmids'] = pmids_list
-        logger.info(f"Stored PMIDs in session: {pmids_list}")
+        # Only the key of the stored set goes into the session cookie
+        session['pmid_set'] = pmid_store.put(pmids_list)
+        session['cohort'] = request.form.get('cohort', '').strip() or None
+        logger.info(f"Stored {len(pmids_list)} PMIDs for the session")
         
         # Redirect to visualize route
         return redirect(url_for('visualize'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in process_manual: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -51,13 +69,19 @@ def process_file():
     try:
         
         uploaded_file = request.files.get('file')
-        file_content = uploaded_file.read().decode("utf-8")
-        pmids_list = [line.strip() for line in file_content.splitlines() if line.strip()]
+        if uploaded_file is None:
+            return jsonify({"error": "No file uploaded"}), 400
+        # Validate line by line instead of decoding the whole upload at once
+        pmids_list = parse_pmids(uploaded_file.stream)
         
-        # Store PMIDs in session to pass to visualize route
-        session['pmids'] = pmids_list 
+        # Only the key of the stored set goes into the session cookie
+        session['pmid_set'] = pmid_store.put(pmids_list)
+        session['cohort'] = request.form.get('cohort', '').strip() or None
+        logger.info(f"Stored {len(pmids_list)} uploaded PMIDs for the session")
         # Redirect to visualize route
         return redirect(url_for('visualize'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in process_file: {str(e)}")
         return jsonify({"error": str(e)}), 500 
@@ -65,46 +89,143 @@ def process_file():
 
 @app.route('/visualize', methods=['GET'])
 def visualize():
-    """Process PMIDs and generate cluster visualization."""
+    """Start a background analysis of the session PMIDs, or show the progress or result of a job."""
     logger.info("Received visualization request")
     
+    job_id = request.args.get('job')
+    if job_id:
+        return show_job(job_id)
+    
     # Get PMIDs from previous process routes
-    pmids = session.get('pmids', [])
-    logger.info(f"Retrieved PMIDs from session: {pmids}")
+    pmids = pmid_store.get(session.get('pmid_set')) or []
+    logger.info(f"Retrieved {len(pmids)} PMIDs for the session")
     
     if not pmids:
         logger.warning("No PMIDs provided")
         return render_template('index.html', graph_html=None)
 
+    job = job_manager.submit(pmids, session.get('cohort'))
+    return redirect(url_for('visualize', job=job.id))
+
+
+def show_job(job_id):
+    """Render the progress page of a running job, or redirect a finished one to its result."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    
+    if job.status == "failed":
+        return jsonify({"error": job.error}), 500
+    
+    if job.status != "done":
+        return render_template('index.html', graph_html=None, job_id=job.id, poll_interval=JOBS['POLL_INTERVAL'])
+    
+    # Every job analysing the same content ends on the same URL, so the browser revalidates its copy
+    return redirect(url_for('show_result', etag=job.result['etag']))
+
+
+@app.route('/results/<etag>', methods=['GET'])
+def show_result(etag):
+    """Render the visualization of a finished job, addressed by the ETag of its content."""
+    # The browser already shows this exact analysis; compressed responses carry a weak ETag
+    if request.if_none_match.contains_weak(etag):
+        logger.info("Visualization not modified")
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+    
+    graph_html = job_manager.get_result(etag)
+    if graph_html is None:
+        return jsonify({"error": f"Unknown or expired result: {etag}"}), 404
+    
+    response = make_response(render_template('index.html', graph_html=graph_html))
+    response.set_etag(etag)
+    # Let the browser revalidate with If-None-Match on every view
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Submit PMIDs for analysis and return the job ID at once."""
+    payload = request.get_json(silent=True) or {}
+    pmids = payload.get('pmids') or pmid_store.get(session.get('pmid_set')) or []
+    if isinstance(pmids, str):
+        pmids = pmids.split(',')
     try:
-        # Process PMIDs and get GEO data
-        data_handler = DataHandler()
-        data_store_handler = DataStoreHandler()
-        
-        pmid_geo_dict = data_handler.get_geo_ids_from_pmids(pmids)
-        logger.info(f"Retrieved GEO IDs for PMIDs: {pmid_geo_dict}")
-        
-        # Save PMIDs to GEO IDs in .txt file
-        data_store_handler.save_pmid_to_geo_file(pmid_geo_dict)
-        
-        # Convert to DataFrame
-        df = data_handler.process_pmid_geo_data(pmid_geo_dict)
-        df.to_csv(PATHS["CSV_FILE"], index=False, encoding = 'utf-8')
-        logger.info(f"Saved DataFrame to {PATHS['CSV_FILE']}")
-        
-        # Save detailed GEO data in .txt file
-        data_store_handler.save_geo_data(df, PATHS["GEO_DATA_FILE"])
-        
-        # Generate visualization
-        visualizer = DataVisualizer()
-        graph_html = visualizer.visualize(df)
-        logger.info("Generated visualization successfully")
-        
-        return render_template('index.html', graph_html=graph_html)
+        pmids = parse_pmids(map(str, pmids))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not pmids:
+        return jsonify({"error": "No PMIDs provided"}), 400
+    
+    cohort = payload.get('cohort')
+    if cohort is not None and not (isinstance(cohort, str) and cohort.strip()):
+        return jsonify({"error": "cohort must be a non-empty string"}), 400
+    job = job_manager.submit(pmids, cohort.strip() if cohort else None)
+    return jsonify({
+        "job_id": job.id,
+        "status_url": url_for('job_status', job_id=job.id),
+        "result_url": url_for('visualize', job=job.id)
+    }), 202
 
-    except Exception as e:
-        logger.error(f"Error during visualization: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the per-stage progress and ETA of a job as JSON."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    status = job_manager.status(job)
+    status["result_url"] = url_for('show_result', etag=job.result['etag']) if job.status == "done" else None
+    return jsonify(status)
+
+
+@app.route('/similar/<geo_id>', methods=['GET'])
+def similar(geo_id):
+    """Return the k cached GEO datasets most similar to a GEO dataset."""
+    k = request.args.get('k', SIMILARITY['DEFAULT_K'], type=int)
+    if k is None or not 1 <= k <= SIMILARITY['MAX_K']:
+        return jsonify({"error": f"k must be an integer between 1 and {SIMILARITY['MAX_K']}"}), 400
     
+    data_handler = get_data_handler()
+    index = data_handler.similarity_index
+    if index is None:
+        return jsonify({"error": "Similarity search is disabled"}), 404
     
-  
+    start = time.perf_counter()
+    neighbors = index.similar(geo_id, k)
+    if neighbors is None:
+        # Cached before the index existed
+        cached = data_handler.cache.get(GEO_NAMESPACE, geo_id)
+        if cached is None:
+            return jsonify({"error": f"GEO dataset not indexed: {geo_id}"}), 404
+        index.add_many({geo_id: cached}, CACHE['GEO_TTL'])
+        neighbors = index.similar(geo_id, k)
+    return jsonify({
+        "geo_id": geo_id,
+        "k": k,
+        "neighbors": neighbors,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2)
+    })
+
+
+@app.route('/assets/plotly-<version>.min.js', methods=['GET'])
+def plotly_asset(version):
+    """Serve plotly.js once per browser; the URL changes with the plotly version."""
+    if version != PLOTLY_VERSION:
+        return redirect(url_for('plotly_asset', version=PLOTLY_VERSION))
+    encoding = choose_encoding(request)
+    response = make_response(plotly_js(encoding))
+    response.mimetype = 'application/javascript'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f"public, max-age={VISUALIZATION['ASSET_MAX_AGE']}, immutable"
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose stage timings, E-utilities requests and cache hit counts for Prometheus."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,28 @@
+import threading
+from typing import Optional
+from app.data_handler import DataHandler
+from app.data_visualizer import DataVisualizer
+
+
+# Process-wide instances, created on first use so importing the app stays cheap
+_data_handler: Optional[DataHandler] = None
+_visualizer: Optional[DataVisualizer] = None
+_lock = threading.Lock()
+
+
+def get_data_handler() -> DataHandler:
+    """Shared DataHandler; its HTTP session, cache connections and in-flight lookups are reused."""
+    global _data_handler
+    with _lock:
+        if _data_handler is None:
+            _data_handler = DataHandler()
+        return _data_handler
+
+
+def get_visualizer() -> DataVisualizer:
+    """Shared DataVisualizer; its DataProcessor keeps the NLTK resources and lemma cache loaded."""
+    global _visualizer
+    with _lock:
+        if _visualizer is None:
+            _visualizer = DataVisualizer()
+        return _visualizer
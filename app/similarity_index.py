@@ -0,0 +1,217 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+from app.cache_store import _transaction
+from app.metrics import metrics
+from app.text_preprocessor import TextPreprocessor
+from config import CACHE, SIMILARITY
+
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarityIndex:
+    """
+    Persistent inverted index over the text of GEO datasets, backed by SQLite.
+
+    Every dataset is stored as its preprocessed terms with length-normalized log
+    term frequencies. Document frequencies are kept per term, so IDF weights are
+    computed at query time and adding datasets never requires refitting. Two
+    datasets are scored by the IDF-weighted dot product of their term weights.
+
+    Datasets expire with their cache entries: expired datasets are never returned
+    and are removed on the next write.
+    """
+
+    def __init__(self, db_file: Optional[str] = None):
+        self.db_file = db_file or SIMILARITY['DB_FILE']
+        self.preprocessor = TextPreprocessor()
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=CACHE['BUSY_TIMEOUT'], isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self) -> None:
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                geo_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                indexed_at REAL NOT NULL,
+                expires_at REAL
+            ) WITHOUT ROWID
+        """)
+        # Indexes created before datasets expired keep them until they are re-indexed
+        if "expires_at" not in {row[1] for row in conn.execute("PRAGMA table_info(documents)")}:
+            conn.execute("ALTER TABLE documents ADD COLUMN expires_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS documents_expires ON documents (expires_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                geo_id TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (term, geo_id)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_geo ON postings (geo_id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def add_many(self, datasets: Dict[str, Sequence[str]], ttl: Optional[float] = None) -> None:
+        """
+        Index or re-index GEO datasets in one transaction, and remove expired ones.
+
+        Args:
+            datasets (Dict[str, Sequence[str]]): Cached metadata per GEO ID:
+                title, experiment type, summary, organism and overall design
+            ttl (float, optional): Seconds until the datasets expire, None keeps them forever
+        """
+        if not datasets:
+            return
+        geo_ids = list(datasets)
+        texts = self.preprocessor.preprocess_many([" ".join(map(str, fields)) for fields in datasets.values()])
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        postings, documents = [], []
+        batch_df: Counter = Counter()
+        for geo_id, text, fields in zip(geo_ids, texts, datasets.values()):
+            weights = _term_weights(text.split())
+            postings.extend((term, geo_id, weight) for term, weight in weights.items())
+            batch_df.update(weights.keys())
+            documents.append((geo_id, str(fields[0]), now, expires_at))
+
+        conn = self._connection()
+        with _transaction(conn):
+            expired = [row[0] for row in conn.execute("SELECT geo_id FROM documents WHERE expires_at <= ?", (now,))]
+            self._remove(conn, geo_ids + expired)
+            conn.executemany(
+                "INSERT INTO documents (geo_id, title, indexed_at, expires_at) VALUES (?, ?, ?, ?)", documents
+            )
+            conn.executemany("INSERT INTO postings (term, geo_id, weight) VALUES (?, ?, ?)", postings)
+            conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+                batch_df.items()
+            )
+        metrics.inc("similarity_indexed_total", "GEO datasets added to the similarity index", len(geo_ids))
+        logger.debug(f"Indexed {len(geo_ids)} GEO datasets with {len(postings)} postings, removed {len(expired)} expired")
+
+    def remove_many(self, geo_ids: Iterable[str]) -> None:
+        """Remove datasets from the index."""
+        geo_ids = list(geo_ids)
+        if not geo_ids:
+            return
+        conn = self._connection()
+        with _transaction(conn):
+            self._remove(conn, geo_ids)
+
+    def clear(self) -> None:
+        """Remove all datasets from the index."""
+        conn = self._connection()
+        with _transaction(conn):
+            for table in ("documents", "postings", "terms"):
+                conn.execute(f"DELETE FROM {table}")
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, geo_ids: List[str]) -> None:
+        """Drop existing entries of the datasets and their document frequencies."""
+        old_terms: Counter = Counter()
+        for geo_id in geo_ids:
+            old_terms.update(row[0] for row in conn.execute("SELECT term FROM postings WHERE geo_id = ?", (geo_id,)))
+        if not old_terms:
+            return
+        conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(n, term) for term, n in old_terms.items()])
+        conn.execute("DELETE FROM terms WHERE df <= 0")
+        conn.executemany("DELETE FROM postings WHERE geo_id = ?", [(geo_id,) for geo_id in geo_ids])
+        conn.executemany("DELETE FROM documents WHERE geo_id = ?", [(geo_id,) for geo_id in geo_ids])
+
+    def contains(self, geo_id: str) -> bool:
+        return self._connection().execute(
+            "SELECT 1 FROM documents WHERE geo_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (geo_id, time.time())
+        ).fetchone() is not None
+
+    def indexed_ids(self) -> set:
+        """GEO IDs of all indexed datasets, including expired ones not yet removed."""
+        return {row[0] for row in self._connection().execute("SELECT geo_id FROM documents")}
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def similar(self, geo_id: str, k: int) -> Optional[List[Dict]]:
+        """
+        Find the k datasets most similar to an indexed dataset.
+
+        Only the SIMILARITY['QUERY_TERMS'] most distinctive terms of the dataset are
+        looked up, and terms found in more than SIMILARITY['MAX_DF_RATIO'] of all
+        datasets are skipped, so a query reads a small part of the index.
+
+        Args:
+            geo_id (str): GEO ID of the query dataset
+            k (int): Number of neighbors
+
+        Returns:
+            Optional[List[Dict]]: 'geo_id', 'title' and 'score' of each neighbor, best first,
+            or None if the dataset is not indexed
+        """
+        if not self.contains(geo_id):
+            return None
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT p.term, p.weight, t.df FROM postings p JOIN terms t ON t.term = p.term WHERE p.geo_id = ?",
+            (geo_id,)
+        ).fetchall()
+        if not rows:
+            return []
+
+        n_documents = self.count()
+        max_df = max(1, SIMILARITY['MAX_DF_RATIO'] * n_documents)
+        # Same smoothed IDF as TfidfVectorizer
+        query = [(term, weight, math.log((1 + n_documents) / (1 + df)) + 1) for term, weight, df in rows
+                 if df <= max_df] or [(term, weight, 1.0) for term, weight, _ in rows]
+        query.sort(key=lambda entry: entry[1] * entry[2], reverse=True)
+        query = query[:SIMILARITY['QUERY_TERMS']]
+        norm = math.sqrt(sum((weight * idf) ** 2 for _, weight, idf in query))
+
+        values = ",".join("(?, ?)" for _ in query)
+        params = [value for term, weight, idf in query for value in (term, weight * idf * idf / norm)]
+        neighbors = conn.execute(
+            f"WITH q (term, weight) AS (VALUES {values}) "
+            "SELECT p.geo_id, d.title, SUM(p.weight * q.weight) AS score "
+            "FROM q JOIN postings p ON p.term = q.term JOIN documents d ON d.geo_id = p.geo_id "
+            "WHERE p.geo_id != ? AND (d.expires_at IS NULL OR d.expires_at > ?) "
+            "GROUP BY p.geo_id ORDER BY score DESC, p.geo_id LIMIT ?",
+            (*params, geo_id, time.time(), k)
+        ).fetchall()
+        return [{"geo_id": gid, "title": title, "score": round(score, 6)} for gid, title, score in neighbors]
+
+
+def _term_weights(terms: List[str]) -> Dict[str, float]:
+    """Log term frequencies scaled to unit length."""
+    weights = {term: 1 + math.log(count) for term, count in Counter(terms).items()}
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    return {term: weight / norm for term, weight in weights.items()}
+
+
+if __name__ == '__main__':
+    from app.data_handler import DataHandler
+
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
+    DataHandler().sync_similarity_index()
@@ -0,0 +1,80 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+from app.metrics import metrics
+
+
+class _Call:
+    """One in-flight lookup of a key, completed by the thread that started it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.found = False
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent lookups of the same keys.
+
+    The first thread asking for a key runs the lookup, every other thread asking
+    for it in the meantime waits for that result instead of starting its own
+    request. Lookups are batched: of the requested keys, a thread only fetches
+    those nobody else is already fetching.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+
+    def do_many(self, keys: Iterable[Hashable],
+                fetch: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """
+        Look up keys, sharing in-flight lookups with other threads.
+
+        Args:
+            keys (Iterable[Hashable]): Keys to look up
+            fetch (Callable): Called with the keys this thread owns, returns the values found
+
+        Returns:
+            Dict[Hashable, Any]: Values of the keys that were found
+        """
+        owned, waiting = {}, {}
+        with self.lock:
+            for key in dict.fromkeys(keys):
+                call = self.calls.get(key)
+                if call is None:
+                    owned[key] = self.calls[key] = _Call()
+                else:
+                    waiting[key] = call
+        if waiting:
+            metrics.inc("coalesced_lookups_total", "Lookups served by a request already in flight",
+                        len(waiting), kind=self.name)
+
+        results = {}
+        if owned:
+            try:
+                values = fetch(list(owned))
+                for key, call in owned.items():
+                    if key in values:
+                        call.found, call.value = True, values[key]
+                        results[key] = values[key]
+            except BaseException as e:
+                for call in owned.values():
+                    call.error = e
+                raise
+            finally:
+                with self.lock:
+                    for key in owned:
+                        del self.calls[key]
+                for call in owned.values():
+                    call.done.set()
+
+        for key, call in waiting.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            if call.found:
+                results[key] = call.value
+        return results
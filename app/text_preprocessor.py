@@ -0,0 +1,103 @@
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from app.nltk_resources import ensure_resource
+from config import PREPROCESSING
+
+
+logger = logging.getLogger(__name__)
+
+# Compiled once instead of on every call
+NON_ALPHANUMERIC = re.compile(r'[^a-zA-Z0-9]')
+STANDALONE_NUMBER = re.compile(r'(?<!\w)\d+(?!\w)')
+
+
+class TextPreprocessor:
+    """
+    Cleans text, removes stopwords and lemmatizes words.
+
+    NLTK corpora are loaded on first use rather than at import. Stopwords are loaded
+    once into a frozenset and lemmas are memoized per unique word in a bounded LRU
+    cache. Large batches are split into chunks and spread over a process pool.
+    """
+
+    def __init__(self):
+        self._stop_words: Optional[frozenset] = None
+        # Preprocessors are shared by request threads, the corpora are loaded by one of them
+        self._load_lock = threading.Lock()
+        self.lemmatizer = WordNetLemmatizer()
+        self._lemmatize = lru_cache(maxsize=PREPROCESSING['LEMMA_CACHE_SIZE'])(self.lemmatizer.lemmatize)
+
+    @property
+    def stop_words(self) -> frozenset:
+        """English stopwords, loaded together with WordNet on first access."""
+        if self._stop_words is None:
+            with self._load_lock:
+                if self._stop_words is None:
+                    start = time.perf_counter()
+                    ensure_resource('stopwords')
+                    ensure_resource('wordnet')
+                    self._stop_words = frozenset(stopwords.words('english'))
+                    logger.info(f"Loaded NLTK resources in {time.perf_counter() - start:.3f}s")
+        return self._stop_words
+
+    def preprocess(self, text: Optional[str]) -> str:
+        """Preprocess text by cleaning, removing stopwords, and lemmatizing."""
+        if text is None:
+            return ""
+        # Remove special characters, keep letters and numbers
+        text = NON_ALPHANUMERIC.sub(' ', text)
+        # Remove standalone numbers
+        text = STANDALONE_NUMBER.sub(' ', text)
+        # Split on whitespace, which also drops empty strings
+        words = text.lower().split()
+        stop_words = self.stop_words
+        return " ".join(self._lemmatize(word) for word in words if word not in stop_words)
+
+    def preprocess_many(self, texts: List[Optional[str]]) -> List[str]:
+        """
+        Preprocess a list of texts, each unique text only once.
+
+        Args:
+            texts (List[Optional[str]]): Texts to preprocess
+
+        Returns:
+            List[str]: Preprocessed texts in input order
+        """
+        unique_texts = list(dict.fromkeys(texts))
+        if len(unique_texts) >= PREPROCESSING['PARALLEL_MIN_TEXTS']:
+            processed = self._preprocess_parallel(unique_texts)
+        else:
+            processed = [self.preprocess(text) for text in unique_texts]
+        lookup: Dict[Optional[str], str] = dict(zip(unique_texts, processed))
+        return [lookup[text] for text in texts]
+
+    def _preprocess_parallel(self, texts: List[Optional[str]]) -> List[str]:
+        """Preprocess texts in chunks on a process pool."""
+        chunk_size = PREPROCESSING['CHUNK_SIZE']
+        chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+        max_workers = PREPROCESSING['MAX_WORKERS'] or os.cpu_count()
+        logger.info(f"Preprocessing {len(texts)} texts in {len(chunks)} chunks on {max_workers} processes")
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            results = executor.map(_preprocess_chunk, chunks)
+            return [text for chunk in results for text in chunk]
+
+
+# Preprocessor of a pool worker process, created once by _init_worker
+_worker_preprocessor: Optional[TextPreprocessor] = None
+
+
+def _init_worker() -> None:
+    global _worker_preprocessor
+    _worker_preprocessor = TextPreprocessor()
+
+
+def _preprocess_chunk(texts: List[Optional[str]]) -> List[str]:
+    return [_worker_preprocessor.preprocess(text) for text in texts]
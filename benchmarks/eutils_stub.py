@@ -0,0 +1,146 @@
+"""Local stand-in for the NCBI E-utilities that replays fixtures."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from app.data_handler import LINK_SENTINELS
+from app.eutils_client import RateLimiter
+
+
+class EUtilsStub:
+    """
+    Serves elink, esummary and efetch responses from a fixture.
+
+    Every request waits `latency` seconds. With a `rate_limit`, requests above the
+    limit are answered with 429 like the real service. Use as a context manager;
+    `base_url` can be used as EUTILS['BASE_URL'].
+
+    Args:
+        fixture (Dict): Corpus in the format of synthetic.generate_corpus or a recorded fixture
+        latency (float): Seconds added to every response
+        rate_limit (float, optional): Requests per second before 429 responses, None for no limit
+    """
+
+    def __init__(self, fixture: Dict, latency: float = 0.0, rate_limit: Optional[float] = None):
+        self.fixture = fixture
+        self.latency = latency
+        # A little burst allowance for clock jitter between client and server
+        self.limiter = RateLimiter(rate_limit, capacity=2) if rate_limit else None
+        self.stats = {"requests": 0, "throttled": 0, "by_endpoint": {}}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def __enter__(self) -> "EUtilsStub":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats = {"requests": 0, "throttled": 0, "by_endpoint": {}}
+
+    def _allow(self) -> bool:
+        """Take a token from the rate limiter without blocking."""
+        return self.limiter is None or self.limiter.try_acquire() == 0
+
+    def elink(self, ids: List[str]) -> bytes:
+        """One LinkSet per repeated id parameter; a comma-separated id list is merged into one."""
+        linksets = []
+        for id_param in ids:
+            pmids = [pmid for pmid in id_param.split(",") if pmid]
+            links = [geo_id for pmid in pmids for geo_id in self.fixture["links"].get(pmid, [])]
+            id_list = "".join(f"<Id>{pmid}</Id>" for pmid in pmids)
+            link_db = ""
+            errors = [link for link in links if link in LINK_SENTINELS]
+            if errors:
+                # Lookups that failed while recording fail again
+                link_db = f"<ERROR>{escape(errors[0])}</ERROR>"
+            elif links:
+                link_db = ("<LinkSetDb><DbTo>gds</DbTo><LinkName>pubmed_gds</LinkName>"
+                           + "".join(f"<Link><Id>{geo_id}</Id></Link>" for geo_id in links)
+                           + "</LinkSetDb>")
+            linksets.append(f"<LinkSet><DbFrom>pubmed</DbFrom><IdList>{id_list}</IdList>{link_db}</LinkSet>")
+        return ('<?xml version="1.0" encoding="UTF-8" ?>\n<eLinkResult>'
+                + "".join(linksets) + "</eLinkResult>").encode("utf-8")
+
+    def esummary(self, ids: List[str]) -> bytes:
+        geo_ids = [geo_id for id_param in ids for geo_id in id_param.split(",") if geo_id]
+        found = [geo_id for geo_id in geo_ids if geo_id in self.fixture["summaries"]]
+        result = {"uids": found, **{geo_id: self.fixture["summaries"][geo_id] for geo_id in found}}
+        return json.dumps({"header": {"type": "esummary", "version": "0.3"}, "result": result}).encode("utf-8")
+
+    def efetch(self, ids: List[str]) -> bytes:
+        accessions = [acc for id_param in ids for acc in id_param.split(",") if acc]
+        records = []
+        for accession in accessions:
+            description = self.fixture["bioprojects"].get(accession)
+            if description is None:
+                continue
+            numeric_id = "".join(ch for ch in accession if ch.isdigit())
+            records.append(
+                f'<DocumentSummary uid="{numeric_id}"><Project><ProjectID>'
+                f'<ArchiveID accession="{accession}" archive="NCBI" id="{numeric_id}"/></ProjectID>'
+                f'<ProjectDescr><Name>{accession}</Name><Title>{accession}</Title>'
+                f'<Description>{escape(description)}</Description></ProjectDescr></Project></DocumentSummary>'
+            )
+        return ('<?xml version="1.0" encoding="UTF-8" ?>\n<RecordSet>'
+                + "".join(records) + "</RecordSet>").encode("utf-8")
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, params: Dict[str, List[str]]) -> None:
+                endpoint = urlparse(self.path).path.rsplit("/", 1)[-1]
+                with stub.lock:
+                    stub.stats["requests"] += 1
+                    stub.stats["by_endpoint"][endpoint] = stub.stats["by_endpoint"].get(endpoint, 0) + 1
+                if not stub._allow():
+                    with stub.lock:
+                        stub.stats["throttled"] += 1
+                    self._send(429, b'{"error":"API rate limit exceeded"}', "application/json", {"Retry-After": "1"})
+                    return
+                time.sleep(stub.latency)
+                ids = params.get("id", [])
+                if endpoint == "elink.fcgi":
+                    self._send(200, stub.elink(ids), "text/xml")
+                elif endpoint == "esummary.fcgi":
+                    self._send(200, stub.esummary(ids), "application/json")
+                elif endpoint == "efetch.fcgi":
+                    self._send(200, stub.efetch(ids), "text/xml")
+                else:
+                    self._send(404, b"Unknown endpoint", "text/plain")
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond(parse_qs(urlparse(self.path).query))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._respond(parse_qs(self.rfile.read(length).decode("utf-8")))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,57 @@
+"""Loading and recording of E-utilities fixtures for the stand-in server."""
+import json
+import xml.etree.ElementTree as ET
+from typing import Dict, List
+
+from app.data_handler import DataHandler, LINK_SENTINELS, NO_GEO_IDS
+
+
+def load_fixture(path: str) -> Dict:
+    """Load a fixture with 'links', 'summaries' and 'bioprojects'."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_fixture(pmids: List[str], path: str) -> Dict:
+    """
+    Record live NCBI responses for the PMIDs into a fixture file.
+
+    PMIDs without GEO IDs are recorded with an empty list. PMIDs whose lookup failed
+    keep their error sentinel, e.g. [REQUEST_ERROR], so they are not mistaken for
+    PMIDs without datasets.
+
+    Args:
+        pmids (List[str]): PMIDs to record
+        path (str): Output JSON file
+
+    Returns:
+        Dict: The recorded fixture
+    """
+    handler = DataHandler()
+    links = handler.get_geo_ids_from_pmids(pmids)
+    links = {pmid: [] if geo_ids == [NO_GEO_IDS] else geo_ids for pmid, geo_ids in links.items()}
+
+    geo_ids = list(dict.fromkeys(
+        geo_id for geo_ids in links.values() for geo_id in geo_ids if geo_id not in LINK_SENTINELS
+    ))
+    summaries = {}
+    for batch_summaries in handler.client.map(handler._get_summaries_batch, _batches(geo_ids, 200)):
+        summaries.update(batch_summaries)
+
+    accessions = list(dict.fromkeys(s.get("bioproject") for s in summaries.values() if s.get("bioproject")))
+    bioprojects = {}
+    for batch in _batches(accessions, 200):
+        response = handler.client.post("efetch.fcgi", {"db": "bioproject", "id": ",".join(batch), "retmode": "xml"})
+        for record in ET.fromstring(response.content).iter("DocumentSummary"):
+            archive = record.find(".//ArchiveID")
+            if archive is not None:
+                bioprojects[archive.get("accession")] = record.findtext(".//ProjectDescr/Description") or ""
+
+    fixture = {"links": links, "summaries": summaries, "bioprojects": bioprojects}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f)
+    return fixture
+
+
+def _batches(items: List[str], size: int) -> List[List[str]]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
@@ -0,0 +1,206 @@
+"""
+Offline benchmarks of the PMID to visualization pipeline.
+
+Every stage runs against a local E-utilities stand-in, so results do not depend on
+the live NCBI service. Example:
+
+    python -m benchmarks.run_benchmarks --sizes 100 1000 10000 100000 --latency 0.05 \
+        --rate-limit 10 --output bench.json --baseline baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+import config
+from app.data_handler import DataHandler
+from app.data_processor import DataProcessor
+from app.data_visualizer import DataVisualizer
+from benchmarks.eutils_stub import EUtilsStub
+from benchmarks.fixtures import load_fixture
+from benchmarks.synthetic import generate_corpus
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = (
+    "link_resolution",
+    "metadata_fetch",
+    "preprocess_dataFrame",
+    "tf_idf_vectorizer",
+    "compute_pca",
+    "compute_clusters",
+    "render"
+)
+
+
+@contextmanager
+def isolated_config(base_url: str, rate_limit: Optional[float]) -> Iterator[str]:
+    """Point caches and outputs to a temporary directory and the E-utilities to the stand-in."""
+    saved = {
+        name: dict(getattr(config, name))
+        for name in ("PATHS", "CACHE", "RESULT_CACHE", "SIMILARITY", "EUTILS")
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config.PATHS.update(RUNS_DIR=os.path.join(tmp_dir, "runs"), CACHE_DIR=os.path.join(tmp_dir, "cache"))
+        config.CACHE.update(
+            DB_FILE=os.path.join(tmp_dir, "cache", "cache.db"),
+            LEGACY_JSON_FILE=os.path.join(tmp_dir, "cache", "geo_cache.json")
+        )
+        config.RESULT_CACHE.update(DIR=os.path.join(tmp_dir, "cache", "results"))
+        config.SIMILARITY.update(DB_FILE=os.path.join(tmp_dir, "cache", "similarity.db"))
+        # Without an emulated limit the client should not throttle itself either
+        config.EUTILS.update(BASE_URL=base_url, RATE_LIMIT=rate_limit or 1000)
+        try:
+            yield tmp_dir
+        finally:
+            for name, values in saved.items():
+                getattr(config, name).clear()
+                getattr(config, name).update(values)
+
+
+def run_size(corpus: Dict, latency: float, rate_limit: Optional[float],
+             n_clusters: Optional[int]) -> Dict:
+    """Run every stage once on a corpus and return the timings."""
+    timings = {}
+
+    @contextmanager
+    def timed(stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        yield
+        timings[stage] = time.perf_counter() - start
+
+    with EUtilsStub(corpus, latency=latency, rate_limit=rate_limit) as stub:
+        with isolated_config(stub.base_url, rate_limit):
+            handler = DataHandler()
+            pmids = list(corpus["links"])
+
+            with timed("link_resolution"):
+                geo_links = handler.get_geo_ids_from_pmids(pmids)
+            with timed("metadata_fetch"):
+                df = handler.process_pmid_geo_data(geo_links)
+
+            processor = DataProcessor()
+            with timed("preprocess_dataFrame"):
+                p_df = processor.preprocess_dataFrame(df)
+            with timed("tf_idf_vectorizer"):
+                X_tfidf = processor.tf_idf_vectorizer(p_df)
+            with timed("compute_pca"):
+                X_pca = processor.compute_pca(X_tfidf)
+            with timed("compute_clusters"):
+                _, labels = processor.compute_clusters(X_tfidf, n_clusters)
+
+            df_pca = pd.DataFrame(X_pca, columns=["PC1", "PC2", "PC3"])
+            df_pca["Cluster"] = labels
+            df_pca["Cluster_Label"] = "Cluster " + df_pca["Cluster"].astype(str)
+            df_pca["GEO ID"] = p_df["GEO ID"].values
+            df_pca["PMID"] = p_df["PMIDs"].str.join(", ").values
+            with timed("render"):
+                html = DataVisualizer().render(df_pca)
+
+            stats = dict(stub.stats)
+
+    return {
+        "pmids": len(corpus["links"]),
+        "datasets": len(corpus["summaries"]),
+        "rows": len(df),
+        "features": X_tfidf.shape[1],
+        "clusters": processor.cluster_report["k"],
+        "html_bytes": len(html),
+        "requests": stats["requests"],
+        "throttled": stats["throttled"],
+        "requests_by_endpoint": stats["by_endpoint"],
+        "stages": timings,
+        "total": sum(timings.values())
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float, min_seconds: float) -> List[str]:
+    """Return the stages that got slower than the baseline by more than tolerance."""
+    baseline_runs = {run["size"]: run for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        base = baseline_runs.get(run["size"])
+        if base is None:
+            continue
+        for stage, seconds in run["stages"].items():
+            base_seconds = base["stages"].get(stage)
+            if base_seconds is None:
+                continue
+            ratio = seconds / base_seconds if base_seconds else float("inf")
+            run.setdefault("baseline_ratio", {})[stage] = ratio
+            if ratio > 1 + tolerance and seconds - base_seconds > min_seconds:
+                regressions.append(f"size {run['size']}: {stage} {base_seconds:.3f}s -> {seconds:.3f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PMID to visualization pipeline offline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="Numbers of GEO datasets of the synthetic corpora")
+    parser.add_argument("--fixture", help="Recorded fixture JSON to replay instead of synthetic corpora")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every stand-in response")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="Requests per second of the stand-in and the client, default unlimited")
+    parser.add_argument("--n-clusters", type=int, default=None, help="Fixed k, default selects k automatically")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora")
+    parser.add_argument("--output", default="bench_results.json", help="Machine-readable results")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Slowdowns below this many seconds are never reported")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline log")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    if args.fixture:
+        fixture = load_fixture(args.fixture)
+        corpora = [(len(fixture["summaries"]), fixture)]
+    else:
+        corpora = ((size, generate_corpus(size, seed=args.seed)) for size in args.sizes)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "latency": args.latency,
+            "rate_limit": args.rate_limit,
+            "fixture": args.fixture,
+            "seed": args.seed
+        },
+        "runs": []
+    }
+    for size, corpus in corpora:
+        run = {"size": size, **run_size(corpus, args.latency, args.rate_limit, args.n_clusters)}
+        results["runs"].append(run)
+        stages = ", ".join(f"{stage} {run['stages'][stage]:.3f}s" for stage in STAGES)
+        print(f"{size} datasets: {run['total']:.2f}s ({stages}), {run['requests']} requests")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        results["regressions"] = regressions
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
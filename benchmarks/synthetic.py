@@ -0,0 +1,75 @@
+"""Synthetic E-utilities corpora of configurable size for the benchmarks."""
+import random
+from typing import Dict
+
+
+VOCABULARY = (
+    "rna seq single cell transcriptome chromatin accessibility atac chip methylation bisulfite "
+    "tumor cancer breast lung liver kidney brain heart muscle skin blood immune t b macrophage "
+    "stem progenitor differentiation development embryo mouse human zebrafish drosophila yeast "
+    "knockout knockdown crispr mutation treatment drug inhibitor response infection virus bacteria "
+    "inflammation metabolism hypoxia aging circadian sex tissue organoid culture patient cohort"
+).split()
+
+EXPERIMENT_TYPES = [
+    "Expression profiling by high throughput sequencing",
+    "Expression profiling by array",
+    "Methylation profiling by high throughput sequencing",
+    "Genome binding/occupancy profiling by high throughput sequencing",
+    "Non-coding RNA profiling by high throughput sequencing"
+]
+
+ORGANISMS = ["Homo sapiens", "Mus musculus", "Rattus norvegicus", "Danio rerio", "Drosophila melanogaster"]
+
+
+def _sentence(rnd: random.Random, n_words: int) -> str:
+    return " ".join(rnd.choices(VOCABULARY, k=n_words)).capitalize() + "."
+
+
+def generate_corpus(n_datasets: int, seed: int = 0, datasets_per_pmid: float = 2.0,
+                    empty_pmid_ratio: float = 0.1) -> Dict:
+    """
+    Generate a corpus in the fixture format used by the E-utilities stand-in.
+
+    Args:
+        n_datasets (int): Number of GEO datasets
+        seed (int): Random seed, the same seed always gives the same corpus
+        datasets_per_pmid (float): Average number of datasets linked to a PMID
+        empty_pmid_ratio (float): Share of extra PMIDs without any GEO datasets
+
+    Returns:
+        Dict: 'links' (PMID -> GEO IDs), 'summaries' (GEO ID -> esummary record)
+        and 'bioprojects' (accession -> description)
+    """
+    rnd = random.Random(seed)
+    geo_ids = [str(200000000 + i) for i in range(n_datasets)]
+    summaries = {}
+    bioprojects = {}
+    for i, geo_id in enumerate(geo_ids):
+        accession = f"PRJNA{100000 + i}"
+        summaries[geo_id] = {
+            "uid": geo_id,
+            "accession": f"GSE{100000 + i}",
+            "title": _sentence(rnd, rnd.randint(6, 14)),
+            "gdstype": rnd.choice(EXPERIMENT_TYPES),
+            "summary": " ".join(_sentence(rnd, rnd.randint(10, 25)) for _ in range(rnd.randint(2, 6))),
+            "taxon": rnd.choice(ORGANISMS),
+            "bioproject": accession
+        }
+        bioprojects[accession] = (
+            f"{_sentence(rnd, 20)} Overall design: {_sentence(rnd, rnd.randint(8, 20))}"
+        )
+
+    links = {}
+    n_pmids = max(1, int(n_datasets / datasets_per_pmid))
+    for i in range(n_pmids):
+        links[str(30000000 + i)] = []
+    pmids = list(links)
+    for geo_id in geo_ids:
+        # Most datasets belong to one paper, some are cited by several
+        for pmid in rnd.sample(pmids, k=min(len(pmids), 1 if rnd.random() < 0.9 else 2)):
+            links[pmid].append(geo_id)
+    for i in range(int(n_pmids * empty_pmid_ratio)):
+        links[str(39000000 + i)] = []
+
+    return {"links": links, "summaries": summaries, "bioprojects": bioprojects}
@@ -5,14 +5,164 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # File paths are now relative to BASE_DIR
 PATHS = {
-    "PMID_TO_GEO_FILE": os.path.join(BASE_DIR, "data", "PMID_to_GEO_results.txt"),
-    "GEO_DATA_FILE": os.path.join(BASE_DIR, "data", "PMID_to_GEO_data.txt"),
-    "CSV_FILE": os.path.join(BASE_DIR, "data", "geo_data.csv"),
-    "P_CSV_FILE": os.path.join(BASE_DIR, "data", "p_geo_data.csv"),
-    "TFIDF_FILE": os.path.join(BASE_DIR, "data", "tfidf_matrix.csv"),
+    "DATA_DIR": os.path.join(BASE_DIR, "data"),
+    "RUNS_DIR": os.path.join(BASE_DIR, "data", "runs"),  # One subdirectory per analysis run
     "CACHE_DIR": os.path.join(BASE_DIR, "cache")  # Directory for cache files
 }
 
+# Files written to the directory of every run, and their retention
+ARTIFACTS = {
+    "PMID_TO_GEO_FILE": "PMID_to_GEO_results.txt",
+    "GEO_DATA_FILE": "PMID_to_GEO_data.txt",
+    "GEO_TABLE": "geo_data",  # Extension depends on the export format
+    "P_GEO_TABLE": "p_geo_data",
+    "TFIDF_MATRIX": "tfidf_matrix",
+    "FIGURE_FILE": "figure.html",  # Standalone figure written by run_batch.py
+    "CHECKPOINT_FILE": "checkpoint.json",  # Progress of a run_batch.py run
+    "LOCK_FILE": ".running",  # Present while a run is in progress
+    "RETENTION_SECONDS": 7 * 24 * 3600,  # Older runs are removed, except unfinished run_batch.py runs
+    "MAX_RUNS": 200  # Only the newest runs are kept, None keeps all
+}
+
+# NCBI E-utilities settings
+EUTILS = {
+    "BASE_URL": "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/",
+    "ELINK_BATCH_SIZE": 200,  # PMIDs sent per elink.fcgi request
+    "ESUMMARY_BATCH_SIZE": 200,  # GEO IDs sent per esummary.fcgi request
+    "EFETCH_BATCH_SIZE": 200,  # BioProject IDs sent per efetch.fcgi request
+    "API_KEY": os.environ.get("NCBI_API_KEY", ""),  # Raises the NCBI limit from 3 to 10 requests/s
+    "TOOL": "geo-cluster-visualizer",
+    "EMAIL": os.environ.get("NCBI_EMAIL", ""),
+    "RATE_LIMIT": None,  # Requests per second, None picks 3 or 10 depending on API_KEY
+    "MAX_WORKERS": 8,  # Concurrent requests and pooled keep-alive connections
+    "MAX_RETRIES": 3,  # Retries for 429/5xx responses and connection errors
+    "BACKOFF_FACTOR": 0.5,  # Retry delay is BACKOFF_FACTOR * 2 ** attempt seconds
+    "TIMEOUT": 30  # Seconds per request
+}
+
+# Persistent metadata cache (SQLite in WAL mode)
+CACHE = {
+    "DB_FILE": os.path.join(PATHS["CACHE_DIR"], "cache.db"),
+    "LEGACY_JSON_FILE": os.path.join(PATHS["CACHE_DIR"], "geo_cache.json"),  # Migrated once, then renamed
+    "GEO_TTL": None,  # Seconds until cached GEO metadata expires, None keeps it forever
+    "LINK_TTL": 30 * 24 * 3600,  # Seconds until cached PMID to GEO links expire
+    "EMPTY_LINK_TTL": 7 * 24 * 3600,  # Shorter TTL for PMIDs without GEO IDs, links may be added later
+    "MAX_ENTRIES": 1000000,  # Oldest entries are evicted above this count per namespace
+    # Entries written to a namespace between two checks of MAX_ENTRIES. Counted per
+    # CacheStore and process, so N worker processes can exceed MAX_ENTRIES by up to
+    # N * EVICT_EVERY entries between checks
+    "EVICT_EVERY": 10000,
+    "BUSY_TIMEOUT": 30  # Seconds to wait for another process holding the write lock
+}
+
+# Text preprocessing
+PREPROCESSING = {
+    "LEMMA_CACHE_SIZE": 100000,  # Unique words kept in the lemmatization cache
+    "PARALLEL_MIN_TEXTS": 20000,  # Unique texts needed before a process pool is used
+    "CHUNK_SIZE": 2000,  # Texts sent to a worker process at once
+    "MAX_WORKERS": None  # Worker processes, None uses all CPU cores
+}
+
+# NLTK resources, loaded lazily on first use
+NLTK = {
+    "DATA_DIR": os.environ.get("NLTK_DATA") or None,  # Extra NLTK data directory, also used for downloads
+    "AUTO_DOWNLOAD": True  # Download missing resources on first use, disable for offline images
+}
+
+# Dimensionality reduction of the sparse TF-IDF matrix
+REDUCTION = {
+    "N_COMPONENTS": 3,
+    "COVARIANCE_MAX_FEATURES": 1000  # Up to this many features the covariance solver is used, above it ARPACK
+}
+
+# Export formats of the run artifacts
+EXPORT = {
+    "TABLE_FORMATS": ["parquet"],  # GEO metadata tables: "parquet", "feather" and/or the legacy "csv"
+    "TFIDF_FORMATS": ["npz"],  # TF-IDF matrix: sparse "npz" with vocabulary and/or the legacy dense "csv"
+    "CATEGORICAL_COLUMNS": ["Organism", "Experiment type"],  # Stored as categories in parquet/feather
+    "CSV_CHUNK_SIZE": 1000,  # TF-IDF rows densified at a time for the csv export
+    "WRITE_BUFFER_SIZE": 1024 * 1024  # Bytes buffered by the text report writer
+}
+
+# Clustering of the TF-IDF vectors
+CLUSTERING = {
+    "N_CLUSTERS": 3,  # Fixed number of clusters, None selects it automatically between K_MIN and K_MAX
+    "K_MIN": 2,  # Smallest k tried by the automatic selection
+    "K_MAX": 10,  # Largest k tried by the automatic selection
+    "SILHOUETTE_SAMPLE_SIZE": 2000,  # Rows sampled to score each k
+    "MINIBATCH_MIN_ROWS": 10000,  # MiniBatchKMeans is used from this many rows on
+    "N_JOBS": -1,  # Parallel workers for the k sweep, -1 uses all CPU cores
+    "RANDOM_STATE": 42
+}
+
+# Out-of-core mode for corpora that do not fit in memory
+STREAMING = {
+    "MIN_DATASETS": 50000,  # Use the streaming mode from this many GEO datasets on, None disables it
+    "CHUNK_SIZE": 2000,  # GEO datasets fetched, preprocessed and vectorized at a time
+    "N_FEATURES": 2 ** 12,  # Width of the hashed TF-IDF vectors
+    "PCA_BATCH_ROWS": 256,  # Rows densified at a time for IncrementalPCA, 8 MB at 4096 features
+    "N_CLUSTERS": 8  # k when CLUSTERING['N_CLUSTERS'] is not set, the automatic selection needs all rows at once
+}
+
+# Figure payload sent to the browser
+VISUALIZATION = {
+    "MAX_POINTS": 20000,  # Larger projections are sampled down to about this many points
+    "MIN_POINTS_PER_CLUSTER": 200,  # Sampling keeps at least this many points of every cluster
+    "COORDINATE_DTYPE": "float32",  # Coordinates are sent as binary arrays of this type
+    "COMPRESS_MIN_BYTES": 1024,  # Responses from this size on are sent gzip or brotli compressed
+    "ASSET_MAX_AGE": 365 * 24 * 3600  # Seconds browsers may cache the versioned plotly.js bundle
+}
+
+# Cache of complete analysis results (fitted vectors, projection, labels and figure)
+RESULT_CACHE = {
+    "DIR": os.path.join(PATHS["CACHE_DIR"], "results"),
+    "MAX_BYTES": 2 * 1024 ** 3  # Least recently used results are removed above this size
+}
+
+# Fitted models of named cohorts, updated incrementally when a cohort grows
+COHORTS = {
+    "DIR": os.path.join(PATHS["CACHE_DIR"], "cohorts"),
+    "MAX_CHANGED_RATIO": 0.25,  # Refit once datasets added or removed since the last fit exceed this share of the fitted ones
+    "MAX_DISTANCE_RATIO": 1.5  # Refit once added datasets are this much farther from their centroids than the fitted ones
+}
+
+# Persistent index of cached GEO datasets for the /similar endpoint
+SIMILARITY = {
+    "ENABLED": True,  # Index GEO metadata as it is cached
+    "DB_FILE": os.path.join(PATHS["CACHE_DIR"], "similarity.db"),
+    "QUERY_TERMS": 30,  # Most distinctive terms of a dataset used to find its neighbors
+    "MAX_DF_RATIO": 0.5,  # Terms in more than this share of datasets are ignored in queries
+    "DEFAULT_K": 10,
+    "MAX_K": 100
+}
+
+# Headless batch runs, see run_batch.py
+BATCH = {
+    "CHUNK_SIZE": 5000  # PMIDs resolved and fetched between two checkpoints
+}
+
+# Cache warm-up from local metadata dumps, see warm_cache.py
+WARMUP = {
+    "BATCH_SIZE": 50000,  # Cache entries written per transaction
+    "MAX_WORKERS": None  # Processes parsing dump files, None uses all CPU cores
+}
+
+# Background analysis jobs
+JOBS = {
+    "MAX_WORKERS": 2,  # Analyses running at the same time
+    "RESULT_TTL": 3600,  # Seconds a finished job and its result are kept
+    "HEARTBEAT_INTERVAL": 15,  # Seconds between state writes of a running job
+    "STALE_AFTER": 120,  # Seconds without a heartbeat after which a running job is reported as failed
+    "POLL_INTERVAL": 1000  # Milliseconds between status requests of the progress page
+}
+
+# Submitted PMID sets, stored server-side so the session only holds their key
+PMID_SETS = {
+    "DIR": os.path.join(PATHS["CACHE_DIR"], "pmid_sets"),
+    "MAX_PMIDS": 2000000,  # Larger submissions are rejected
+    "RETENTION_SECONDS": 7 * 24 * 3600  # Sets not submitted again within this time are removed
+}
+
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 ALLOWED_EXTENSIONS = {'txt'}
 
@@ -0,0 +1,173 @@
+"""
+Headless analysis of a PMID file, without the web server.
+
+PMIDs are read from the file in chunks; the links and GEO metadata of every chunk
+are fetched into the cache and the progress is checkpointed, so an interrupted run
+continues with the next chunk when started again. Afterwards the same artifacts as
+for /visualize are written to data/runs/<run_id>, plus a standalone figure.html:
+
+    python run_batch.py PMIDs_list.txt
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+from plotly.offline import get_plotlyjs
+from app.artifacts import RunArtifacts, atomic_open
+from app.pipeline import AnalysisPipeline
+from config import BATCH
+
+
+logger = logging.getLogger(__name__)
+
+
+def iter_pmid_chunks(pmid_file: str, chunk_size: int) -> Iterator[List[str]]:
+    """Read a PMID file line by line and yield chunks of unique, non-empty PMIDs."""
+    seen = set()
+    chunk = []
+    with open(pmid_file, "r", encoding="utf-8") as f:
+        for line in f:
+            pmid = line.strip()
+            if not pmid or pmid in seen:
+                continue
+            seen.add(pmid)
+            chunk.append(pmid)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: Dict) -> None:
+    with atomic_open(path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+
+
+def write_figure(path: str, graph_html: str) -> None:
+    """Write the figure as a standalone page that works offline."""
+    with atomic_open(path, "w", encoding="utf-8") as f:
+        f.write("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n")
+        f.write("<title>GEO Dataset Clusters Visualization</title>\n<script type=\"text/javascript\">")
+        f.write(get_plotlyjs())
+        f.write("</script>\n</head>\n<body>\n<div style=\"height: 800px\">")
+        f.write(graph_html)
+        f.write("</div>\n</body>\n</html>\n")
+
+
+def run_batch(pmid_file: str, run_id: Optional[str] = None, chunk_size: Optional[int] = None,
+              restart: bool = False, cohort: Optional[str] = None) -> Dict:
+    """
+    Analyze all PMIDs of a file, resuming an interrupted run of the same file.
+
+    The links resolved chunk by chunk are passed on to the final analysis, so it does
+    not look them up again; links of chunks done before an interruption are read back
+    from the cache. Only the links are kept for the whole file, the GEO metadata is
+    read from the cache by the analysis, out of core from STREAMING['MIN_DATASETS'] on.
+
+    Args:
+        pmid_file (str): Text file with one PMID per line
+        run_id (str, optional): Run directory name, defaults to one derived from the file content
+        chunk_size (int, optional): PMIDs per checkpoint, defaults to BATCH['CHUNK_SIZE']
+        restart (bool): Ignore an existing checkpoint
+        cohort (str, optional): Name of a cohort whose fitted model is reused and updated
+
+    Returns:
+        Dict: The pipeline result, see AnalysisPipeline.run
+
+    Raises:
+        ValueError: If the run was started with another file or another chunk size
+    """
+    digest = file_digest(pmid_file)
+    artifacts = RunArtifacts(run_id or f"batch-{digest[:12]}")
+    checkpoint_file = artifacts.path('CHECKPOINT_FILE')
+    checkpoint = None if restart else load_checkpoint(checkpoint_file)
+    if checkpoint is not None and checkpoint["file_sha256"] != digest:
+        raise ValueError(f"Run {artifacts.run_id} belongs to a different PMID file, use --restart or another --run-id")
+    if checkpoint is not None and chunk_size is not None and chunk_size != checkpoint["chunk_size"]:
+        # The completed chunks are counted in chunks of the original size
+        raise ValueError(f"Run {artifacts.run_id} was started with --chunk-size {checkpoint['chunk_size']}, "
+                         "resume it with the same size or use --restart")
+    if checkpoint is None:
+        checkpoint = {
+            "pmid_file": os.path.abspath(pmid_file),
+            "file_sha256": digest,
+            "chunk_size": chunk_size or BATCH['CHUNK_SIZE'],
+            "chunks_done": 0,
+            "pmids_done": 0,
+            "finished": False
+        }
+        save_checkpoint(checkpoint_file, checkpoint)
+    elif checkpoint["chunks_done"]:
+        logger.info(f"Resuming run {artifacts.run_id} after {checkpoint['pmids_done']} PMIDs")
+
+    pipeline = AnalysisPipeline()
+    data_handler = pipeline.data_handler
+    links = {}
+    start = time.perf_counter()
+    for i, chunk in enumerate(iter_pmid_chunks(pmid_file, checkpoint["chunk_size"])):
+        chunk_links = data_handler.get_geo_ids_from_pmids(chunk)
+        links.update(chunk_links)
+        if i < checkpoint["chunks_done"]:
+            continue
+        # Fill the metadata cache; the final analysis reads it back from there
+        data_handler.fetch_geo_data(list(data_handler.group_pmids_by_geo(chunk_links)))
+        checkpoint["chunks_done"] = i + 1
+        checkpoint["pmids_done"] = len(links)
+        save_checkpoint(checkpoint_file, checkpoint)
+        logger.info(f"Fetched chunk {i + 1}: {len(links)} PMIDs done after {time.perf_counter() - start:.1f}s")
+
+    logger.info(f"Analyzing {len(links)} PMIDs")
+    result = pipeline.run(list(links), run_id=artifacts.run_id, cohort=cohort, links=links)
+    write_figure(artifacts.path('FIGURE_FILE'), result["graph_html"])
+    checkpoint["finished"] = True
+    checkpoint["timings"] = result["timings"]
+    save_checkpoint(checkpoint_file, checkpoint)
+    logger.info(f"Run {artifacts.run_id} finished, artifacts in {artifacts.run_dir}")
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze a PMID file without the web server.")
+    parser.add_argument("pmid_file", help="Text file with one PMID per line")
+    parser.add_argument("--run-id", help="Run directory name, defaults to one derived from the file content")
+    parser.add_argument("--chunk-size", type=int, help="PMIDs fetched between two checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Start over instead of resuming")
+    parser.add_argument("--cohort", help="Reuse and update the fitted model of this cohort")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
+    try:
+        run_batch(args.pmid_file, args.run_id, args.chunk_size, args.restart, args.cohort)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import nltk
+import pytest
+from nltk.stem import WordNetLemmatizer
+import app.text_preprocessor
+
+# Small stand-ins for the NLTK corpora, which are not downloaded in the test environment
+STOP_WORDS = ["the", "a", "an", "of", "and", "in", "is", "to", "with", "for", "on", "by"]
+
+
+class FakeStopwords:
+    def words(self, language: str):
+        return STOP_WORDS
+
+
+def fake_lemmatize(self, word: str, pos: str = "n") -> str:
+    return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+@pytest.fixture
+def fake_nltk(monkeypatch):
+    """Replace the NLTK stopwords and WordNet lemmatizer with local stand-ins."""
+    monkeypatch.setattr(nltk.data, "find", lambda resource: resource)
+    monkeypatch.setattr(app.text_preprocessor, "stopwords", FakeStopwords())
+    monkeypatch.setattr(WordNetLemmatizer, "lemmatize", fake_lemmatize)
@@ -0,0 +1,53 @@
+import json
+import os
+import time
+import pytest
+from app.artifacts import RunArtifacts, cleanup_runs
+from config import ARTIFACTS, PATHS
+
+
+@pytest.fixture
+def runs_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(PATHS, 'RUNS_DIR', str(tmp_path / "runs"))
+    return tmp_path / "runs"
+
+
+def make_run(run_id: str, age: float = 0, checkpoint: dict = None) -> RunArtifacts:
+    artifacts = RunArtifacts(run_id)
+    if checkpoint is not None:
+        with open(artifacts.path('CHECKPOINT_FILE'), "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+    mtime = time.time() - age
+    os.utime(artifacts.run_dir, (mtime, mtime))
+    return artifacts
+
+
+def test_expired_and_excess_runs_are_removed(runs_dir, monkeypatch):
+    monkeypatch.setitem(ARTIFACTS, 'MAX_RUNS', 3)
+    make_run("expired", age=ARTIFACTS['RETENTION_SECONDS'] + 60)
+    for age, run_id in enumerate(["new", "older", "oldest"]):
+        make_run(run_id, age=age * 60)
+
+    cleanup_runs(keep="current")
+
+    assert sorted(os.listdir(runs_dir)) == ["new", "older"]
+
+
+def test_runs_in_progress_and_resumable_batches_are_kept(runs_dir, monkeypatch):
+    monkeypatch.setitem(ARTIFACTS, 'MAX_RUNS', 1)
+    expired = ARTIFACTS['RETENTION_SECONDS'] + 60
+    make_run("batch-unfinished", age=expired, checkpoint={"finished": False})
+    make_run("batch-finished", age=expired, checkpoint={"finished": True})
+    running = make_run("running", age=expired)
+    crashed = make_run("crashed", age=expired)
+    with open(crashed.path('LOCK_FILE'), "w") as f:
+        f.write("1")
+    for path in (crashed.path('LOCK_FILE'), crashed.run_dir):
+        os.utime(path, (time.time() - expired, time.time() - expired))
+
+    with running.running():
+        os.utime(running.run_dir, (time.time() - expired, time.time() - expired))
+        cleanup_runs()
+        assert sorted(os.listdir(runs_dir)) == ["batch-unfinished", "running"]
+
+    assert not os.path.exists(running.path('LOCK_FILE'))
@@ -0,0 +1,35 @@
+from app.cache_store import CacheStore
+from config import CACHE
+
+
+def test_size_limit_is_checked_every_evict_every_entries(tmp_path, monkeypatch):
+    monkeypatch.setitem(CACHE, 'MAX_ENTRIES', 5)
+    monkeypatch.setitem(CACHE, 'EVICT_EVERY', 10)
+    cache = CacheStore(str(tmp_path / "cache.db"))
+
+    for i in range(9):
+        cache.put("geo", str(i), i)
+    assert cache.count("geo") == 9
+
+    cache.put("geo", "9", 9)
+    assert cache.count("geo") == 5
+    assert cache.get_many("geo", [str(i) for i in range(10)]) == {str(i): i for i in range(5, 10)}
+
+
+def test_expired_entries_are_not_returned_before_eviction(tmp_path):
+    cache = CacheStore(str(tmp_path / "cache.db"))
+    cache.put("geo", "old", 1, ttl=-1)
+
+    assert cache.get("geo", "old") is None
+    assert cache.get_many("geo", ["old"]) == {}
+
+
+def test_legacy_json_cache_is_imported_once(tmp_path):
+    legacy = tmp_path / "geo_cache.json"
+    legacy.write_text('{"200001": ["Title", "Type", "Summary", "Organism", "Design"]}')
+    cache = CacheStore(str(tmp_path / "cache.db"))
+
+    assert cache.migrate_json(str(legacy), "geo") == 1
+    assert cache.migrate_json(str(legacy), "geo") == 0
+    assert cache.get("geo", "200001") == ["Title", "Type", "Summary", "Organism", "Design"]
+    assert (tmp_path / "geo_cache.json.migrated").exists()
@@ -0,0 +1,94 @@
+import fcntl
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from app.data_visualizer import DataVisualizer
+from config import COHORTS, PATHS, RESULT_CACHE
+
+TOPICS = ["Liver steatosis hepatocyte", "Cortex neuron synapse", "Tumor immune infiltration"]
+
+
+def geo_frame(n_rows: int) -> pd.DataFrame:
+    """GEO datasets about three topics, the same rows for the same n_rows prefix."""
+    return pd.DataFrame({
+        "GEO ID": [str(200000 + i) for i in range(n_rows)],
+        "PMIDs": [[str(1000 + i)] for i in range(n_rows)],
+        "Title": [TOPICS[i % 3] for i in range(n_rows)],
+        "Experiment type": ["Expression profiling"] * n_rows,
+        "Summary": [f"{TOPICS[i % 3]} study {i}" for i in range(n_rows)],
+        "Organism": ["Homo sapiens"] * n_rows,
+        "Overall design": ["Control and treated"] * n_rows
+    })
+
+
+@pytest.fixture
+def visualizer(tmp_path, monkeypatch, fake_nltk):
+    monkeypatch.setitem(RESULT_CACHE, 'DIR', str(tmp_path / "results"))
+    monkeypatch.setitem(PATHS, 'RUNS_DIR', str(tmp_path / "runs"))
+    monkeypatch.setitem(COHORTS, 'DIR', str(tmp_path / "cohorts"))
+    # Only the share of added datasets decides about a refit here
+    monkeypatch.setitem(COHORTS, 'MAX_DISTANCE_RATIO', float("inf"))
+    return DataVisualizer()
+
+
+def test_growing_cohort_keeps_existing_points(visualizer):
+    visualizer.visualize_cohort(geo_frame(12), "liver")
+    fitted = visualizer.cohort_models.get("liver")
+
+    visualizer.visualize_cohort(geo_frame(14), "liver")
+    updated = visualizer.cohort_models.get("liver")
+
+    assert updated["fit_id"] == fitted["fit_id"]
+    assert updated["added"] == 2
+    assert np.array_equal(updated["projection"][:12], fitted["projection"])
+    assert np.array_equal(updated["labels"][:12], fitted["labels"])
+    # New datasets join the cluster of their topic
+    assert updated["labels"][12] == fitted["labels"][0]
+    assert updated["labels"][13] == fitted["labels"][1]
+
+
+def test_cohort_is_refitted_above_the_changed_ratio(visualizer):
+    visualizer.visualize_cohort(geo_frame(12), "liver")
+    fitted = visualizer.cohort_models.get("liver")
+    allowed = int(12 * COHORTS['MAX_CHANGED_RATIO'])
+
+    visualizer.visualize_cohort(geo_frame(12 + allowed), "liver")
+    assert visualizer.cohort_models.get("liver")["fit_id"] == fitted["fit_id"]
+    visualizer.visualize_cohort(geo_frame(12 + allowed + 1), "liver")
+    refitted = visualizer.cohort_models.get("liver")
+
+    assert refitted["fit_id"] != fitted["fit_id"]
+    assert refitted["fit_rows"] == 12 + allowed + 1
+    assert refitted["added"] == 0
+
+
+def test_updates_are_stored_apart_from_the_fit(visualizer):
+    store = visualizer.cohort_models
+    visualizer.visualize_cohort(geo_frame(12), "liver")
+    fit_mtime = os.stat(store._path("liver")).st_mtime_ns
+
+    # One dataset dropped, two added
+    visualizer.visualize_cohort(geo_frame(14).drop(index=4), "liver")
+    model = store.get("liver")
+
+    assert os.stat(store._path("liver")).st_mtime_ns == fit_mtime
+    assert joblib.load(store._path("liver", ".delta.joblib"))["rows"]["GEO ID"].tolist() == ["200012", "200013"]
+    assert model["rows"]["GEO ID"].tolist() == geo_frame(14).drop(index=4)["GEO ID"].tolist()
+    assert model["tfidf"].shape[0] == len(model["projection"]) == len(model["labels"]) == 13
+    assert model["fit_index"].tolist() == [0, 1, 2, 3] + list(range(5, 12)) + [-1, -1]
+    assert (model["added"], model["removed"]) == (2, 1)
+
+
+def test_cohort_lock_holds_off_other_processes(visualizer):
+    store = visualizer.cohort_models
+
+    with store.lock("liver"):
+        # flock conflicts between open file descriptions, as between two processes
+        with open(store._path("liver", ".lock"), "a") as lock_file:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    with open(store._path("liver", ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
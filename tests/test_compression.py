@@ -0,0 +1,79 @@
+import gzip
+import numpy as np
+import pandas as pd
+from flask import Response, request
+from app import app as flask_app
+from app.compression import PLOTLY_VERSION, compress_response
+from app.data_visualizer import DataVisualizer
+from config import VISUALIZATION
+
+
+def projection(cluster_sizes) -> pd.DataFrame:
+    labels = np.repeat(np.arange(len(cluster_sizes)), cluster_sizes)
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "PC1": rng.random(len(labels)),
+        "PC2": rng.random(len(labels)),
+        "PC3": rng.random(len(labels)),
+        "Cluster": labels
+    })
+
+
+def test_large_projections_are_sampled_per_cluster(monkeypatch):
+    monkeypatch.setitem(VISUALIZATION, 'MAX_POINTS', 100)
+    monkeypatch.setitem(VISUALIZATION, 'MIN_POINTS_PER_CLUSTER', 5)
+    df_pca = projection([900, 95, 5])
+
+    sampled = DataVisualizer.decimate(df_pca)
+
+    assert sampled["Cluster"].value_counts().to_dict() == {0: 90, 1: 10, 2: 5}
+    assert sampled.index.is_monotonic_increasing
+    assert sampled.equals(df_pca.loc[sampled.index])
+
+
+def test_small_projections_are_kept(monkeypatch):
+    monkeypatch.setitem(VISUALIZATION, 'MAX_POINTS', 100)
+    df_pca = projection([60, 40])
+
+    assert DataVisualizer.decimate(df_pca) is df_pca
+
+
+def compressed(body: bytes, accept_encoding: str, mimetype: str = "text/html") -> Response:
+    response = Response(body, mimetype=mimetype)
+    response.set_etag("abc")
+    with flask_app.test_request_context(headers={"Accept-Encoding": accept_encoding}):
+        return compress_response(response, request)
+
+
+def test_responses_are_gzipped_with_a_weak_etag():
+    body = b"<div>" + b"x" * VISUALIZATION['COMPRESS_MIN_BYTES'] + b"</div>"
+
+    response = compressed(body, "gzip")
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()) == body
+    assert response.get_etag() == ("abc", True)
+    assert "Accept-Encoding" in response.vary
+
+
+def test_small_binary_or_unaccepted_responses_are_left_alone():
+    body = b"x" * VISUALIZATION['COMPRESS_MIN_BYTES']
+
+    for response in (compressed(b"<div></div>", "gzip"), compressed(body, "gzip", "image/png"),
+                     compressed(body, "identity")):
+        assert "Content-Encoding" not in response.headers
+        assert response.get_etag() == ("abc", False)
+
+
+def test_plotly_bundle_is_served_once_per_version():
+    client = flask_app.test_client()
+
+    response = client.get(f"/assets/plotly-{PLOTLY_VERSION}.min.js", headers={"Accept-Encoding": "gzip"})
+    outdated = client.get("/assets/plotly-0.0.0.min.js")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert gzip.decompress(response.get_data()).startswith(b"/**")
+    assert outdated.status_code == 302
+    assert outdated.headers["Location"].endswith(f"/assets/plotly-{PLOTLY_VERSION}.min.js")
@@ -0,0 +1,253 @@
+import io
+import json
+import threading
+import time
+import pandas as pd
+import pytest
+import requests
+from app.data_handler import DataHandler, GEO_NAMESPACE, LINK_NAMESPACE, NO_GEO_IDS, REQUEST_ERROR
+from config import CACHE, SIMILARITY
+
+
+class FakeResponse:
+    """E-utilities response with a fixed body."""
+
+    def __init__(self, body: bytes, status_code: int = 200):
+        self.content = body
+        self.status_code = status_code
+        self.raw = io.BytesIO(body)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error")
+
+    def close(self) -> None:
+        pass
+
+
+def elink_body(links: dict) -> bytes:
+    """elink XML with one LinkSet per PMID, as returned for repeated id= parameters."""
+    linksets = "".join(
+        f"<LinkSet><IdList><Id>{pmid}</Id></IdList>"
+        + (f"<LinkSetDb><LinkName>pubmed_gds</LinkName>"
+           + "".join(f"<Link><Id>{geo_id}</Id></Link>" for geo_id in geo_ids)
+           + "</LinkSetDb>" if geo_ids else "")
+        + "</LinkSet>"
+        for pmid, geo_ids in links.items()
+    )
+    return f"<eLinkResult>{linksets}</eLinkResult>".encode("utf-8")
+
+
+@pytest.fixture
+def data_handler(tmp_path, monkeypatch):
+    monkeypatch.setitem(CACHE, 'DB_FILE', str(tmp_path / "cache.db"))
+    monkeypatch.setitem(CACHE, 'LEGACY_JSON_FILE', str(tmp_path / "geo_cache.json"))
+    monkeypatch.setitem(SIMILARITY, 'DB_FILE', str(tmp_path / "similarity.db"))
+    return DataHandler()
+
+
+def test_links_are_resolved_in_batches(data_handler, monkeypatch):
+    links = {"1": ["200", "201"], "2": [], "3": ["300"], "4": [], "5": ["500"]}
+    requested = []
+
+    def post(endpoint, params, **kwargs):
+        requested.append(list(params["id"]))
+        return FakeResponse(elink_body({pmid: links[pmid] for pmid in params["id"]}))
+    monkeypatch.setattr(data_handler.client, "post", post)
+
+    geo_ids = data_handler.get_geo_ids_from_pmids(["1", "2", "3", "1", "4", "5"], batch_size=2)
+
+    assert requested == [["1", "2"], ["3", "4"], ["5"]]
+    assert geo_ids == {"1": ["200", "201"], "2": [NO_GEO_IDS], "3": ["300"], "4": [NO_GEO_IDS], "5": ["500"]}
+
+
+def test_failed_batch_marks_only_its_pmids(data_handler, monkeypatch):
+    def post(endpoint, params, **kwargs):
+        if "3" in params["id"]:
+            raise requests.exceptions.ConnectionError("down")
+        return FakeResponse(elink_body({pmid: ["100"] for pmid in params["id"]}))
+    monkeypatch.setattr(data_handler.client, "post", post)
+
+    geo_ids = data_handler.get_geo_ids_from_pmids(["1", "2", "3"], batch_size=2)
+
+    assert geo_ids == {"1": ["100"], "2": ["100"], "3": [REQUEST_ERROR]}
+
+
+def test_links_are_cached_except_errors(data_handler, monkeypatch):
+    requested = []
+
+    def post(endpoint, params, **kwargs):
+        requested.extend(params["id"])
+        if "3" in params["id"]:
+            raise requests.exceptions.ConnectionError("down")
+        return FakeResponse(elink_body({"1": ["100"], "2": []}))
+    monkeypatch.setattr(data_handler.client, "post", post)
+
+    data_handler.get_geo_ids_from_pmids(["1", "2"])
+    data_handler.get_geo_ids_from_pmids(["3"])
+    requested.clear()
+    geo_ids = data_handler.get_geo_ids_from_pmids(["1", "2", "3"])
+
+    # Only the PMID whose request failed is resolved again
+    assert requested == ["3"]
+    assert geo_ids == {"1": ["100"], "2": [NO_GEO_IDS], "3": [REQUEST_ERROR]}
+
+
+def test_error_body_is_not_cached_as_empty(data_handler, monkeypatch):
+    body = b"<eLinkResult><ERROR>Backend failed</ERROR></eLinkResult>"
+    monkeypatch.setattr(data_handler.client, "post", lambda *args, **kwargs: FakeResponse(body))
+
+    links = data_handler.get_geo_ids_from_pmids(["1", "2"])
+
+    assert links == {"1": [REQUEST_ERROR], "2": [REQUEST_ERROR]}
+    assert data_handler.cache.get_many(LINK_NAMESPACE, ["1", "2"]) == {}
+
+
+def test_only_returned_linksets_count_as_empty(data_handler, monkeypatch, caplog):
+    body = (b"<eLinkResult>"
+            b"<LinkSet><IdList><Id>1</Id></IdList><LinkSetDb><Link><Id>200</Id></Link></LinkSetDb></LinkSet>"
+            b"<LinkSet><IdList><Id>2</Id></IdList></LinkSet>"
+            b"<LinkSet><IdList><Id>4</Id></IdList><ERROR>Failed</ERROR></LinkSet>"
+            b"</eLinkResult>")
+    monkeypatch.setattr(data_handler.client, "post", lambda *args, **kwargs: FakeResponse(body))
+
+    links = data_handler.get_geo_ids_from_pmids(["1", "2", "3", "4"])
+
+    assert links == {"1": ["200"], "2": [NO_GEO_IDS], "3": [REQUEST_ERROR], "4": [REQUEST_ERROR]}
+    assert data_handler.cache.get_many(LINK_NAMESPACE, ["1", "2", "3", "4"]) == {"1": ["200"], "2": [NO_GEO_IDS]}
+    # The error inside a LinkSet belongs to that PMID, not to the whole response
+    assert "no result for 2 of 4 PMIDs" in caplog.text
+    assert "Failed" not in caplog.text
+
+
+def test_overlapping_link_lookups_share_one_request(data_handler, monkeypatch):
+    requested, results = [], []
+    started, release = threading.Event(), threading.Event()
+
+    def post(endpoint, params, **kwargs):
+        requested.append(list(params["id"]))
+        started.set()
+        release.wait(5)
+        return FakeResponse(elink_body({pmid: ["100"] for pmid in params["id"]}))
+    monkeypatch.setattr(data_handler.client, "post", post)
+
+    def lookup():
+        results.append(data_handler.get_geo_ids_from_pmids(["1", "2"]))
+
+    def release_later():
+        started.wait(5)
+        time.sleep(0.05)
+        release.set()
+
+    threads = [threading.Thread(target=target) for target in (lookup, lookup, release_later)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert requested == [["1", "2"]]
+    assert results == [{"1": ["100"], "2": ["100"]}] * 2
+
+
+def esummary_body(summaries: dict) -> bytes:
+    return json.dumps({"result": {"uids": list(summaries), **summaries}}).encode("utf-8")
+
+
+def bioproject_body(designs: dict) -> bytes:
+    """BioProject efetch XML with one DocumentSummary per accession."""
+    records = "".join(
+        f'<DocumentSummary><Project><ProjectID><ArchiveID accession="{accession}" id="{number}"/></ProjectID>'
+        f"<ProjectDescr><Description>Study. Overall design: {design}</Description></ProjectDescr></Project>"
+        f"</DocumentSummary>"
+        for number, (accession, design) in enumerate(designs.items(), start=1)
+    )
+    return f"<RecordSet>{records}</RecordSet>".encode("utf-8")
+
+
+def test_geo_data_is_fetched_in_bulk(data_handler, monkeypatch):
+    summaries = {str(200000 + i): {"title": f"Dataset {i}", "gdstype": "Expression profiling", "summary": "Text",
+                                   "taxon": "Homo sapiens", "bioproject": f"PRJNA{i % 2}"} for i in range(5)}
+    requested = []
+
+    def post(endpoint, params, **kwargs):
+        requested.append((endpoint, params["id"]))
+        if endpoint == "esummary.fcgi":
+            return FakeResponse(esummary_body({geo_id: summaries[geo_id] for geo_id in params["id"].split(",")}))
+        return FakeResponse(bioproject_body({"PRJNA0": "Design 0", "PRJNA1": "Design 1"}))
+    monkeypatch.setattr(data_handler.client, "post", post)
+    monkeypatch.setattr(data_handler.client, "get", lambda *args, **kwargs: pytest.fail("unexpected single request"))
+
+    df = data_handler.process_pmid_geo_data({"1": list(summaries)})
+
+    assert [name for name, _ in requested] == ["esummary.fcgi", "efetch.fcgi"]
+    assert requested[0][1] == ",".join(summaries)
+    assert list(df["Overall design"]) == ["Design 0", "Design 1", "Design 0", "Design 1", "Design 0"]
+    assert data_handler.cache.get(GEO_NAMESPACE, "200001") == [
+        "Dataset 1", "Expression profiling", "Text", "Homo sapiens", "Design 1"
+    ]
+
+
+def test_failed_bioproject_fetch_is_not_cached(data_handler, monkeypatch):
+    summaries = {str(200000 + i): {"title": f"Dataset {i}", "bioproject": "PRJNA1"} for i in range(10)}
+    summaries["300000"] = {"title": "No project"}
+
+    def post(endpoint, params, **kwargs):
+        if endpoint == "esummary.fcgi":
+            return FakeResponse(esummary_body({geo_id: summaries[geo_id] for geo_id in params["id"].split(",")}))
+        raise requests.exceptions.ConnectionError("down")
+    monkeypatch.setattr(data_handler.client, "post", post)
+
+    data_handler.fetch_geo_data(list(summaries))
+
+    assert data_handler.cache.get_many(GEO_NAMESPACE, list(summaries)) == {
+        "300000": ["No project", "N/A", "N/A", "N/A", "N/A"]
+    }
+    assert data_handler.get_overall_designs(["PRJNA1"]) == {}
+
+
+def test_one_row_per_geo_dataset(data_handler, monkeypatch):
+    summaries = {"200001": {"title": "Shared"}, "200002": {"title": "Single"}}
+    monkeypatch.setattr(
+        data_handler.client, "post",
+        lambda endpoint, params, **kwargs: FakeResponse(esummary_body(
+            {geo_id: summaries[geo_id] for geo_id in params["id"].split(",")}
+        ))
+    )
+
+    df = data_handler.process_pmid_geo_data({
+        "1": ["200001", "200002"],
+        "2": ["200001", "200001"],
+        "3": [NO_GEO_IDS],
+        "4": [REQUEST_ERROR]
+    })
+
+    assert list(df["GEO ID"]) == ["200001", "200002"]
+    assert list(df["PMIDs"]) == [["1", "2"], ["1"]]
+    assert list(df["Title"]) == ["Shared", "Single"]
+
+
+def test_geo_data_is_yielded_in_chunks(data_handler, monkeypatch):
+    requested = []
+
+    def post(endpoint, params, **kwargs):
+        requested.append(params["id"])
+        return FakeResponse(esummary_body({geo_id: {"title": f"Dataset {geo_id}"} for geo_id in params["id"].split(",")}))
+    monkeypatch.setattr(data_handler.client, "post", post)
+    links = {"1": ["200001", "200002"], "2": ["200002", "200003"], "3": [NO_GEO_IDS]}
+
+    chunks = data_handler.iter_pmid_geo_data(links, chunk_size=2)
+    assert requested == []
+    first = next(chunks)
+
+    # Metadata is fetched chunk by chunk as the generator is consumed
+    assert requested == ["200001,200002"]
+    rest = list(chunks)
+    assert requested == ["200001,200002", "200003"]
+    assert pd.concat([first, *rest], ignore_index=True).equals(data_handler.process_pmid_geo_data(links))
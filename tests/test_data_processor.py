@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import IncrementalPCA
+from app.data_processor import DataProcessor
+from config import CLUSTERING, REDUCTION, STREAMING
+
+
+def blobs(n_per_cluster: int, n_clusters: int) -> csr_matrix:
+    """Sparse rows around n_clusters well separated centers."""
+    rng = np.random.default_rng(0)
+    centers = np.eye(n_clusters, 8) * 5
+    rows = np.vstack([center + rng.normal(scale=0.1, size=(n_per_cluster, 8)) for center in centers])
+    return csr_matrix(np.abs(rows))
+
+
+@pytest.mark.parametrize("n_rows", [1, 2])
+def test_compute_pca_small_inputs(n_rows):
+    processor = DataProcessor()
+    tfidf_matrix = csr_matrix(np.random.default_rng(0).random((n_rows, 5)))
+
+    projection = processor.compute_pca(tfidf_matrix)
+
+    assert projection.shape == (n_rows, REDUCTION['N_COMPONENTS'])
+    assert np.isfinite(projection).all()
+
+
+def test_compute_pca_matches_dense_pca():
+    tfidf_matrix = csr_matrix(np.random.default_rng(0).random((20, 12)))
+
+    projection = DataProcessor().compute_pca(tfidf_matrix)
+
+    dense = tfidf_matrix.toarray() - tfidf_matrix.toarray().mean(axis=0)
+    _, _, components = np.linalg.svd(dense, full_matrices=False)
+    expected = dense @ components[:REDUCTION['N_COMPONENTS']].T
+    # Components are only defined up to their sign
+    assert np.allclose(np.abs(projection), np.abs(expected))
+
+
+def test_fixed_number_of_clusters_is_the_default():
+    processor = DataProcessor()
+
+    _, labels = processor.compute_clusters(blobs(5, 4), CLUSTERING['N_CLUSTERS'])
+
+    assert CLUSTERING['N_CLUSTERS'] == 3
+    assert len(set(labels)) == 3
+    assert processor.cluster_report["scores"] == {3: None}
+
+
+def test_number_of_clusters_is_selected_automatically(monkeypatch):
+    monkeypatch.setitem(CLUSTERING, 'N_JOBS', 1)
+    processor = DataProcessor()
+
+    _, labels = processor.compute_clusters(blobs(5, 4))
+
+    assert processor.cluster_report["k"] == 4
+    assert len(set(labels)) == 4
+    assert set(processor.cluster_report["scores"]) == set(range(CLUSTERING['K_MIN'], CLUSTERING['K_MAX'] + 1))
+
+
+@pytest.mark.parametrize("n_rows", [1, 2])
+def test_automatic_selection_keeps_tiny_inputs_in_one_cluster(n_rows):
+    processor = DataProcessor()
+
+    _, labels = processor.compute_clusters(csr_matrix(np.random.default_rng(0).random((n_rows, 5))))
+
+    assert DataProcessor._candidate_ks(n_rows) == [1]
+    assert list(labels) == [0] * n_rows
+
+
+def preprocessed_frame(n_rows: int) -> pd.DataFrame:
+    """Rows as returned by DataProcessor.preprocess_dataFrame."""
+    words = ["rna", "seq", "liver", "tumor", "mouse", "brain", "methylation", "cell"]
+    return pd.DataFrame({
+        "GEO ID": [str(200000 + i) for i in range(n_rows)],
+        "PMIDs": [[str(1000 + i)] for i in range(n_rows)],
+        "Title": [f"{words[i % 8]} {words[(i + 3) % 8]} profiling" for i in range(n_rows)],
+        "Experiment type": ["expression profiling high throughput sequencing"] * n_rows,
+        "Summary": [f"{words[(i + 1) % 8]} {words[(i + 5) % 8]} study" for i in range(n_rows)],
+        "Organism": ["homo sapiens"] * n_rows,
+        "Overall design": [f"{words[(i + 2) % 8]} sample" for i in range(n_rows)]
+    })
+
+
+@pytest.mark.parametrize("n_rows", [1, 2])
+def test_fit_model_small_inputs(n_rows):
+    processor = DataProcessor()
+
+    model = processor.fit_model(preprocessed_frame(n_rows))
+
+    assert model["projection"].shape == (n_rows, REDUCTION['N_COMPONENTS'])
+    assert len(model["labels"]) == n_rows
+
+
+@pytest.mark.parametrize("n_rows", [1, 2])
+def test_extend_small_model(n_rows):
+    processor = DataProcessor()
+    rows = preprocessed_frame(n_rows + 2)
+    model = processor.fit_model(rows.iloc[:n_rows].reset_index(drop=True))
+
+    processor.extend_model(model, rows.iloc[n_rows:].reset_index(drop=True))
+
+    assert model["projection"].shape == (n_rows + 2, REDUCTION['N_COMPONENTS'])
+    assert len(model["labels"]) == n_rows + 2
+
+
+def topic_chunks(n_chunks: int, rows_per_chunk: int):
+    """Preprocessed chunks about two unrelated topics, alternating row by row."""
+    topics = ["liver hepatocyte steatosis insulin", "neuron cortex synapse axon"]
+    for chunk in range(n_chunks):
+        rows = range(chunk * rows_per_chunk, (chunk + 1) * rows_per_chunk)
+        yield pd.DataFrame({
+            "GEO ID": [str(200000 + i) for i in rows],
+            "PMIDs": [[str(1000 + i)] for i in rows],
+            "Title": [topics[i % 2] for i in rows],
+            "Experiment type": ["expression profiling"] * rows_per_chunk,
+            "Summary": [f"{topics[i % 2]} sample{i}" for i in rows],
+            "Organism": ["homo sapiens"] * rows_per_chunk,
+            "Overall design": ["control treated"] * rows_per_chunk
+        })
+
+
+def test_streaming_consumes_a_generator_once(monkeypatch):
+    monkeypatch.setitem(STREAMING, 'N_FEATURES', 2 ** 10)
+
+    df_pca = DataProcessor().compute_streaming(topic_chunks(5, 4), n_clusters=2)
+
+    assert list(df_pca.columns) == ["PC1", "PC2", "PC3", "Cluster", "GEO ID", "PMIDs"]
+    assert list(df_pca["GEO ID"]) == [str(200000 + i) for i in range(20)]
+    assert df_pca["PMIDs"][3] == ["1003"]
+    assert np.isfinite(df_pca[["PC1", "PC2", "PC3"]].to_numpy()).all()
+    # Rows of the same topic end up in the same cluster
+    assert df_pca.groupby(df_pca.index % 2)["Cluster"].nunique().tolist() == [1, 1]
+    assert df_pca["Cluster"].nunique() == 2
+
+
+def test_streaming_needs_enough_rows():
+    with pytest.raises(ValueError):
+        DataProcessor().compute_streaming(topic_chunks(1, 2), n_clusters=2)
+
+
+def test_streaming_densifies_few_rows_at_a_time(monkeypatch):
+    monkeypatch.setitem(STREAMING, 'N_FEATURES', 2 ** 10)
+    monkeypatch.setitem(STREAMING, 'PCA_BATCH_ROWS', 4)
+    batch_rows = []
+    partial_fit = IncrementalPCA.partial_fit
+
+    def recording_partial_fit(self, X, *args, **kwargs):
+        batch_rows.append(X.shape[0])
+        return partial_fit(self, X, *args, **kwargs)
+
+    monkeypatch.setattr(IncrementalPCA, "partial_fit", recording_partial_fit)
+
+    df_pca = DataProcessor().compute_streaming(topic_chunks(3, 10), n_clusters=2)
+
+    # Chunks of 10 rows are fed as 4 + 6, the short last slice joins the one before
+    assert batch_rows == [4, 6] * 3
+    assert df_pca["Cluster"].nunique() == 2
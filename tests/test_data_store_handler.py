@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix, load_npz
+from app.artifacts import RunArtifacts
+from app.data_store_handler import DataStoreHandler
+from config import EXPORT, PATHS
+
+
+@pytest.fixture
+def handler(tmp_path, monkeypatch):
+    monkeypatch.setitem(PATHS, 'RUNS_DIR', str(tmp_path / "runs"))
+    return DataStoreHandler(RunArtifacts("run"))
+
+
+def geo_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "GEO ID": ["200001", "200002", "200003"],
+        "PMIDs": [["2"], ["1", "2"], ["2"]],
+        "Title": ["Liver", "Brain", "Kidney"],
+        "Experiment type": ["Expression profiling", "Methylation profiling", "Expression profiling"],
+        "Summary": ["Liver samples", "Brain samples", "Kidney samples"],
+        "Organism": ["Homo sapiens", "Mus musculus", "Homo sapiens"],
+        "Overall design": ["Two groups", "N/A", "Three groups"]
+    })
+
+
+def test_table_is_saved_as_parquet_with_categories(handler):
+    df = geo_frame()
+
+    written = handler.save_table(df, 'GEO_TABLE')
+
+    assert written == [handler.artifacts.path('GEO_TABLE', ".parquet")]
+    stored = pd.read_parquet(written[0])
+    assert stored["Organism"].dtype == "category"
+    assert stored["PMIDs"].map(list).tolist() == df["PMIDs"].tolist()
+    assert stored.drop(columns="PMIDs").astype(str).equals(df.drop(columns="PMIDs"))
+
+
+def test_legacy_csv_table_is_available(handler, monkeypatch):
+    monkeypatch.setitem(EXPORT, 'TABLE_FORMATS', ["csv"])
+    df = geo_frame()
+
+    written = handler.save_table(df, 'GEO_TABLE')
+
+    assert written == [handler.artifacts.path('GEO_TABLE', ".csv")]
+    stored = pd.read_csv(written[0], dtype=str, keep_default_na=False)
+    assert stored["PMIDs"].tolist() == ["2", "1;2", "2"]
+    assert stored.drop(columns="PMIDs").equals(df.drop(columns="PMIDs"))
+
+
+def test_tfidf_matrix_is_saved_as_sparse_npz(handler, monkeypatch):
+    monkeypatch.setitem(EXPORT, 'TFIDF_FORMATS', ["npz", "csv"])
+    monkeypatch.setitem(EXPORT, 'CSV_CHUNK_SIZE', 2)
+    matrix = csr_matrix(np.array([[0.0, 0.5, 0.0], [0.25, 0.0, 0.0], [0.0, 0.0, 1.0], [0.1, 0.2, 0.3], [0.0, 0.0, 0.0]]))
+    vocabulary = ["brain", "liver", "tumor"]
+
+    npz_path, csv_path = handler.save_tfidf_matrix(matrix, vocabulary)
+
+    assert (load_npz(npz_path) != matrix).nnz == 0
+    assert list(np.load(npz_path)["vocabulary"]) == vocabulary
+    # The dense csv is written in chunks of two rows with a single header
+    dense = pd.read_csv(csv_path)
+    assert list(dense.columns) == vocabulary
+    assert np.array_equal(dense.to_numpy(), matrix.toarray())
+
+
+def test_geo_report_lists_datasets_under_every_pmid(handler):
+    output_file = handler.artifacts.path('GEO_DATA_FILE')
+
+    handler.save_geo_data(geo_frame(), output_file)
+
+    with open(output_file, encoding='utf-8') as f:
+        report = f.read()
+    assert report.startswith("PMID: 1\n\tGEO ID: 200002\n\t\tTitle: Brain\n")
+    pmid_2 = report[report.index("\n\nPMID: 2\n"):]
+    # A dataset cited by both PMIDs is listed under each, in row order
+    assert [line for line in pmid_2.splitlines() if "GEO ID" in line] == [
+        "\tGEO ID: 200001", "\tGEO ID: 200002", "\tGEO ID: 200003"
+    ]
+    assert report.endswith("\t\tOverall design: Three groups\n\n")
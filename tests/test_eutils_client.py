@@ -0,0 +1,149 @@
+import io
+import time
+import xml.etree.ElementTree as ET
+import pytest
+import requests
+from app.eutils_client import EUtilsClient, RateLimiter, iter_elements
+from app.metrics import metrics
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error")
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeSession:
+    """Returns the queued outcomes in order, raising the exceptions among them."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def _next(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def get(self, url, **kwargs):
+        return self._next("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._next("POST", url, **kwargs)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    client = EUtilsClient("https://eutils.test/", api_key="secret")
+    client.limiter = RateLimiter(1000, capacity=1000)
+    return client
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # The first token is available at once, the other five wait 1/50 s each
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_throttled_and_failed_requests_are_retried(client):
+    throttled = FakeResponse(429, {"Retry-After": "1"})
+    client.session = FakeSession([throttled, FakeResponse(503), requests.exceptions.ConnectionError("reset"),
+                                  FakeResponse(200)])
+
+    response = client.post("elink.fcgi", {"id": ["1", "2"]})
+
+    assert response.status_code == 200
+    assert throttled.closed
+    assert len(client.session.calls) == 4
+    method, url, kwargs = client.session.calls[-1]
+    assert (method, url) == ("POST", "https://eutils.test/elink.fcgi")
+    assert kwargs["data"]["id"] == ["1", "2"]
+    assert kwargs["data"]["api_key"] == "secret"
+
+
+def test_retries_are_bounded(client):
+    client.session = FakeSession([FakeResponse(503)] * (client.max_retries + 1))
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("esummary.fcgi", {"id": "1"})
+    assert len(client.session.calls) == client.max_retries + 1
+
+
+def test_client_errors_are_not_retried(client):
+    client.session = FakeSession([FakeResponse(400)])
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get("esummary.fcgi", {"id": "1"})
+    assert len(client.session.calls) == 1
+
+
+def test_map_keeps_input_order(client):
+    assert client.map(lambda n: n * n, range(20)) == [n * n for n in range(20)]
+
+
+def test_iter_elements_yields_top_level_records_and_closes():
+    response = FakeResponse()
+    response.raw = io.BytesIO(b"<Result><ERROR>Busy</ERROR><Set><Id>1</Id><ERROR>Bad id</ERROR></Set>"
+                              b"<Other/><Set><Id>2</Id></Set></Result>")
+
+    records = [(element.tag, element.findtext("Id") or element.text)
+               for element in iter_elements(response, "Set", "ERROR")]
+
+    # The ERROR nested in the first Set is only reachable through its record
+    assert records == [("ERROR", "Busy"), ("Set", "1"), ("Set", "2")]
+    assert response.closed
+
+
+def test_streamed_latency_is_recorded_when_the_body_is_read(client):
+    def observed():
+        series = metrics.histograms.get("eutils_request_seconds", {})
+        return series.get((("endpoint", "efetch.fcgi"),), [0])[-1]
+
+    streamed = FakeResponse()
+    streamed.raw = io.BytesIO(b"<Set><DocumentSummary/><DocumentSummary/></Set>")
+    client.session = FakeSession([streamed])
+    before = observed()
+
+    response = client.post("efetch.fcgi", {"id": "1"}, stream=True)
+    assert observed() == before
+    assert len(list(iter_elements(response, "DocumentSummary"))) == 2
+    response.close()
+
+    assert observed() == before + 1
+    assert streamed.closed
+
+
+def test_iter_elements_detaches_processed_records(monkeypatch):
+    roots = []
+    iterparse = ET.iterparse
+
+    def recording_iterparse(source, events):
+        for event, element in iterparse(source, events):
+            if not roots:
+                roots.append(element)
+            yield event, element
+
+    monkeypatch.setattr(ET, "iterparse", recording_iterparse)
+    response = FakeResponse()
+    response.raw = io.BytesIO(b"<Result>" + b"<Set><Id>1</Id></Set><Other/>" * 10000 + b"</Result>")
+
+    attached = [len(roots[0]) for _ in iter_elements(response, "Set")]
+
+    # The root only holds the records parsed ahead of the caller, not all records seen so far
+    assert len(attached) == 10000
+    assert max(attached) < 2000
+    assert len(roots[0]) == 0
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+import app.jobs
+import app.routes
+from app import app as flask_app
+from app.cache_store import CacheStore
+from app.jobs import JOB_NAMESPACE, JobManager
+from config import JOBS
+
+
+class FakePipeline:
+    """Finishes at once with a result identified by the submitted PMIDs."""
+
+    def run(self, pmids, progress=None, run_id=None, cohort=None):
+        for stage in app.jobs.STAGES:
+            progress(stage)
+        return {
+            "graph_html": f"<div>{','.join(pmids)}</div>",
+            "etag": "etag-" + "-".join(pmids),
+            "run_id": run_id,
+            "timings": {"fetch": 0.1}
+        }
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.jobs, "AnalysisPipeline", FakePipeline)
+    return str(tmp_path / "cache.db")
+
+
+def run_job(manager, pmids):
+    job = manager.submit(pmids)
+    manager.executor.shutdown(wait=True)
+    return job
+
+
+def test_job_state_is_shared_between_processes(db_file):
+    job = run_job(JobManager(store=CacheStore(db_file)), ["1", "2"])
+
+    # Another worker process opens its own manager on the same database
+    other = JobManager(store=CacheStore(db_file))
+    finished = other.get(job.id)
+
+    assert finished.status == "done"
+    assert finished.result == {"etag": "etag-1-2", "run_id": job.id, "timings": {"fetch": 0.1}}
+    assert other.get_result("etag-1-2") == "<div>1,2</div>"
+    assert other.status(finished)["completed_stages"] == len(app.jobs.STAGES)
+    assert other.get("unknown") is None
+
+
+def test_finished_jobs_redirect_to_revalidated_result(db_file, monkeypatch):
+    first = run_job(JobManager(store=CacheStore(db_file)), ["1", "2"])
+    second = run_job(JobManager(store=CacheStore(db_file)), ["1", "2"])
+    monkeypatch.setattr(app.routes, "job_manager", JobManager(store=CacheStore(db_file)))
+    client = flask_app.test_client()
+
+    first_location = client.get(f"/visualize?job={first.id}").headers["Location"]
+    second_location = client.get(f"/visualize?job={second.id}").headers["Location"]
+    assert first_location == second_location == "/results/etag-1-2"
+
+    response = client.get(first_location)
+    assert response.status_code == 200
+    assert "<div>1,2</div>" in response.get_data(as_text=True)
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    revalidated = client.get(second_location, headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert client.get("/results/unknown").status_code == 404
+
+
+def test_running_jobs_write_a_heartbeat(db_file, monkeypatch):
+    monkeypatch.setitem(JOBS, 'HEARTBEAT_INTERVAL', 0.01)
+    release = threading.Event()
+
+    class SlowPipeline(FakePipeline):
+        def run(self, pmids, progress=None, run_id=None, cohort=None):
+            release.wait(5)
+            return super().run(pmids, progress, run_id)
+    monkeypatch.setattr(app.jobs, "AnalysisPipeline", SlowPipeline)
+    manager = JobManager(store=CacheStore(db_file))
+
+    job = manager.submit(["1"])
+    first = manager.store.get(JOB_NAMESPACE, job.id)["heartbeat"]
+    time.sleep(0.1)
+    running = manager.get(job.id)
+    release.set()
+    manager.executor.shutdown(wait=True)
+
+    assert running.status == "running"
+    assert running.heartbeat > first
+    assert manager.get(job.id).status == "done"
+
+
+def test_jobs_without_heartbeat_are_reported_as_failed(db_file):
+    manager = JobManager(store=CacheStore(db_file))
+    job = app.jobs.Job(["1"])
+    job.status = "running"
+    job.heartbeat = time.time() - JOBS['STALE_AFTER'] - 1
+    # Written by a process that died without finishing the job
+    manager.store.put(JOB_NAMESPACE, job.id, job.to_dict())
+
+    stale = manager.get(job.id)
+
+    assert stale.status == "failed"
+    assert "stopped responding" in stale.error
+    assert manager.status(stale)["eta"] == 0.0
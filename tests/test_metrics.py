@@ -0,0 +1,67 @@
+from app import app as flask_app
+from app.metrics import DEFAULT_BUCKETS, Metrics
+
+
+def test_counters_and_gauges_are_rendered_with_labels():
+    registry = Metrics()
+    registry.inc("requests_total", "Requests", endpoint="esummary.fcgi", status="200")
+    registry.inc("requests_total", "Requests", 2, status="200", endpoint="esummary.fcgi")
+    registry.set("queue_size", "Queued jobs", 3)
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        "# HELP queue_size Queued jobs",
+        "# TYPE queue_size gauge",
+        "queue_size 3",
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="esummary.fcgi",status="200"} 3',
+    ]
+
+
+def test_histograms_are_cumulative():
+    registry = Metrics()
+    for seconds in (0.003, 0.2, 100.0):
+        registry.observe("stage_seconds", "Stage durations", seconds, stage="fetch")
+
+    lines = registry.render().splitlines()
+
+    assert lines[1] == "# TYPE stage_seconds histogram"
+    assert 'stage_seconds_bucket{stage="fetch",le="0.005"} 1' in lines
+    assert 'stage_seconds_bucket{stage="fetch",le="0.25"} 2' in lines
+    assert f'stage_seconds_bucket{{stage="fetch",le="{DEFAULT_BUCKETS[-1]!r}"}} 2' in lines
+    assert 'stage_seconds_bucket{stage="fetch",le="+Inf"} 3' in lines
+    assert 'stage_seconds_sum{stage="fetch"} 100.203' in lines
+    assert 'stage_seconds_count{stage="fetch"} 3' in lines
+
+
+def test_label_values_are_escaped():
+    registry = Metrics()
+    registry.inc("errors_total", "Errors", reason='bad "id"\n')
+
+    assert 'errors_total{reason="bad \\"id\\"\\n"} 1' in registry.render()
+
+
+def test_stage_timings_are_collected_per_run():
+    registry = Metrics()
+
+    with registry.track_run() as timings:
+        with registry.timed("fetch"):
+            pass
+        with registry.timed("fetch"):
+            pass
+    with registry.timed("render"):
+        pass
+
+    assert list(timings) == ["fetch"]
+    assert 'pipeline_stage_seconds_count{stage="fetch"} 2' in registry.render()
+    assert 'pipeline_stage_seconds_count{stage="render"} 1' in registry.render()
+
+
+def test_metrics_endpoint():
+    response = flask_app.test_client().get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert response.get_data(as_text=True).endswith("\n")
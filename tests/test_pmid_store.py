@@ -0,0 +1,73 @@
+import io
+import os
+import time
+import pytest
+import app.routes
+from app import app as flask_app
+from app.pmid_store import PmidStore, parse_pmids
+from config import PMID_SETS
+
+
+def test_entries_are_validated_and_deduplicated():
+    lines = io.BytesIO(b"\xef\xbb\xbf123\n\n456\r\n123\n  789 \n")
+
+    assert parse_pmids(lines) == ["123", "456", "789"]
+    assert parse_pmids([" 1", "2 ", "1"]) == ["1", "2"]
+
+
+@pytest.mark.parametrize("entries, message", [
+    (["1", "12a"], "Entry 2 is not a PMID"),
+    (["1", "1234567890"], "Entry 2 is not a PMID"),
+    ([b"1", b"\xff"], "Entry 2 is not valid UTF-8"),
+    (["1", "2", "2", "3"], "More than 2 PMIDs"),
+])
+def test_invalid_entries_are_rejected(entries, message):
+    with pytest.raises(ValueError, match=message):
+        parse_pmids(entries, max_pmids=2)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PmidStore(str(tmp_path))
+
+
+def test_sets_are_addressed_by_content(store, tmp_path):
+    key = store.put(["1", "2"])
+
+    assert store.put(["1", "2"]) == key
+    assert store.put(["2", "1"]) != key
+    assert store.get(key) == ["1", "2"]
+    assert len(os.listdir(tmp_path)) == 2
+    assert store.get("0" * 64) is None
+    assert store.get("../" + key) is None
+    assert store.get(None) is None
+
+
+def test_unused_sets_expire(store):
+    old = store.put(["1"])
+    reused = store.put(["2"])
+    expired = time.time() - PMID_SETS['RETENTION_SECONDS'] - 1
+    for key in (old, reused):
+        os.utime(store._path(key), (expired, expired))
+
+    # Resubmitting a set refreshes it, storing a new one removes the expired sets
+    store.put(["2"])
+    store.put(["3"])
+
+    assert store.get(old) is None
+    assert store.get(reused) == ["2"]
+
+
+def test_session_only_holds_the_key(store, monkeypatch):
+    monkeypatch.setattr(app.routes, "pmid_store", store)
+    client = flask_app.test_client()
+
+    response = client.post("/process_manual", data={"pmids": "1, 2,2"})
+    invalid = client.post("/process_manual", data={"pmids": "1, x"})
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert "pmids" not in session
+        assert store.get(session["pmid_set"]) == ["1", "2"]
+    assert invalid.status_code == 400
+    assert "Entry 2" in invalid.get_json()["error"]
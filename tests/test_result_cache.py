@@ -0,0 +1,126 @@
+import os
+import pandas as pd
+import pytest
+import app.data_visualizer
+from app.data_handler import DataHandler
+from app.data_visualizer import DataVisualizer
+from app.pipeline import AnalysisPipeline
+from app.result_cache import ResultCache
+from config import COHORTS, PATHS, RESULT_CACHE, STREAMING, VISUALIZATION
+
+
+def geo_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "GEO ID": ["200001", "200002", "200003", "200004"],
+        "PMIDs": [["1"], ["1", "2"], ["2"], ["3"]],
+        "Title": ["Liver RNA-seq", "Liver tumors", "Brain methylation", "Mouse brain cells"],
+        "Experiment type": ["Expression profiling"] * 4,
+        "Summary": ["Liver samples", "Tumor samples", "Methylation of neurons", "Single cells"],
+        "Organism": ["Homo sapiens", "Homo sapiens", "Mus musculus", "Mus musculus"],
+        "Overall design": ["Two groups", "Three groups", "Cortex", "Hippocampus"]
+    })
+
+
+def test_key_ignores_pmid_order_and_duplicates():
+    df = geo_frame()
+    params = {"n_clusters": 3}
+
+    key = ResultCache.make_key(["1", "2", "3"], df, params)
+
+    assert ResultCache.make_key([" 3", "1", "2", "1"], df, params) == key
+    assert ResultCache.make_key(["1", "2"], df, params) != key
+    assert ResultCache.make_key(["1", "2", "3"], df, {"n_clusters": 4}) != key
+    changed = df.copy()
+    changed.loc[0, "Summary"] = "Kidney samples"
+    assert ResultCache.make_key(["1", "2", "3"], changed, params) != key
+    changed = df.copy()
+    changed.at[3, "PMIDs"] = ["3", "4"]
+    assert ResultCache.make_key(["1", "2", "3"], changed, params) != key
+
+
+def test_put_and_get(tmp_path):
+    cache = ResultCache(str(tmp_path))
+
+    cache.put("abc", {"graph_html": "<div></div>"})
+
+    assert cache.get("abc") == {"graph_html": "<div></div>"}
+    assert cache.get("missing") is None
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 ** 9)
+    for number, key in enumerate(["old", "used", "new"]):
+        cache.put(key, {"graph_html": "x" * 10000})
+        os.utime(cache._path(key), (number, number))
+    # Reading refreshes the modification time
+    cache.get("used")
+
+    cache.max_bytes = 2 * os.path.getsize(cache._path("new"))
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == ["new.joblib", "used.joblib"]
+
+
+@pytest.fixture
+def visualizer(tmp_path, monkeypatch, fake_nltk):
+    monkeypatch.setitem(RESULT_CACHE, 'DIR', str(tmp_path / "results"))
+    monkeypatch.setitem(PATHS, 'RUNS_DIR', str(tmp_path / "runs"))
+    monkeypatch.setitem(COHORTS, 'DIR', str(tmp_path / "cohorts"))
+    return DataVisualizer()
+
+
+def test_repeated_analysis_uses_cached_result(visualizer, monkeypatch):
+    df = geo_frame()
+    graph_html = visualizer.visualize(df)
+    monkeypatch.setattr(visualizer.data_processor, "compute_pca", lambda *args: pytest.fail("recomputed"))
+
+    assert visualizer.visualize(df, ["3", "2", "1", "1"]) == graph_html
+
+
+def test_figure_settings_are_part_of_the_key(visualizer, monkeypatch):
+    df = geo_frame()
+    key = visualizer.cache_key(df)
+    visualizer.visualize(df)
+
+    monkeypatch.setitem(VISUALIZATION, 'MAX_POINTS', 2)
+    monkeypatch.setitem(VISUALIZATION, 'MIN_POINTS_PER_CLUSTER', 1)
+    sampled = visualizer.visualize(df)
+
+    assert visualizer.cache_key(df) != key
+    # Rendered again instead of served from the cache
+    assert "of 4 datasets shown" in sampled
+    sampled_key = visualizer.cache_key(df)
+    monkeypatch.setattr(app.data_visualizer, "RENDER_VERSION", app.data_visualizer.RENDER_VERSION + 1)
+    assert visualizer.cache_key(df) not in (key, sampled_key)
+
+
+class StreamingDataHandler:
+    """Serves geo_frame in chunks of two datasets."""
+
+    def __init__(self, df):
+        self.df = df
+
+    def get_geo_ids_from_pmids(self, pmids):
+        return {pmid: [geo_id for geo_id, geo_pmids in zip(self.df["GEO ID"], self.df["PMIDs"]) if pmid in geo_pmids]
+                for pmid in pmids}
+
+    def group_pmids_by_geo(self, links):
+        return DataHandler.group_pmids_by_geo(links)
+
+    def iter_pmid_geo_data(self, links):
+        for start in range(0, len(self.df), 2):
+            yield self.df.iloc[start:start + 2].reset_index(drop=True)
+
+
+def test_streaming_etag_covers_the_metadata(visualizer, monkeypatch):
+    monkeypatch.setitem(STREAMING, 'MIN_DATASETS', 1)
+    monkeypatch.setitem(STREAMING, 'N_FEATURES', 2 ** 10)
+    df = geo_frame()
+    changed = df.copy()
+    changed.loc[0, "Summary"] = "Kidney samples"
+
+    etags = [AnalysisPipeline(StreamingDataHandler(frame), visualizer).run(["1", "2", "3"])["etag"]
+             for frame in (df, df, changed)]
+
+    assert etags[0] == etags[1]
+    assert etags[2] != etags[0]
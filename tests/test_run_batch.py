@@ -0,0 +1,90 @@
+import json
+import pytest
+import run_batch
+from app.artifacts import RunArtifacts
+from config import PATHS
+
+
+class FakeDataHandler:
+    """Records the GEO IDs fetched per chunk and stops once the PMID fail_on is reached."""
+
+    def __init__(self, fetched, fail_on=None):
+        self.fetched = fetched
+        self.fail_on = fail_on
+
+    def get_geo_ids_from_pmids(self, pmids):
+        if self.fail_on in pmids:
+            raise KeyboardInterrupt
+        return {pmid: [f"2{pmid}"] for pmid in pmids}
+
+    def group_pmids_by_geo(self, links):
+        return {geo_id: [pmid] for pmid, geo_ids in links.items() for geo_id in geo_ids}
+
+    def fetch_geo_data(self, geo_ids):
+        self.fetched.append(list(geo_ids))
+        return {}
+
+
+@pytest.fixture
+def pmid_file(tmp_path, monkeypatch):
+    monkeypatch.setitem(PATHS, 'RUNS_DIR', str(tmp_path / "runs"))
+    path = tmp_path / "pmids.txt"
+    path.write_text("1\n2\n\n3\n2\n4\n5\n")
+    return str(path)
+
+
+def fake_pipeline(monkeypatch, fetched, fail_on=None):
+    class FakePipeline:
+        def __init__(self):
+            self.data_handler = FakeDataHandler(fetched, fail_on)
+
+        def run(self, pmids, run_id=None, cohort=None, links=None):
+            # The links resolved by run_batch are handed over instead of being looked up again
+            assert list(links) == pmids
+            return {"graph_html": f"<div>{','.join(pmids)}</div>", "run_id": run_id, "timings": {"fetch": 0.1}}
+
+    monkeypatch.setattr(run_batch, "AnalysisPipeline", FakePipeline)
+
+
+def test_pmid_file_is_read_in_unique_chunks(pmid_file):
+    assert list(run_batch.iter_pmid_chunks(pmid_file, 2)) == [["1", "2"], ["3", "4"], ["5"]]
+
+
+def test_interrupted_run_resumes_after_the_last_checkpoint(pmid_file, monkeypatch):
+    fetched = []
+    fake_pipeline(monkeypatch, fetched, fail_on="3")
+    with pytest.raises(KeyboardInterrupt):
+        run_batch.run_batch(pmid_file, run_id="batch", chunk_size=2)
+    fake_pipeline(monkeypatch, fetched)
+
+    result = run_batch.run_batch(pmid_file, run_id="batch", chunk_size=2)
+
+    # The first chunk was checkpointed before the interruption and is not fetched again
+    assert fetched == [["21", "22"], ["23", "24"], ["25"]]
+    assert result["graph_html"] == "<div>1,2,3,4,5</div>"
+    artifacts = RunArtifacts("batch")
+    with open(artifacts.path('CHECKPOINT_FILE'), encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    assert checkpoint["finished"] and checkpoint["chunks_done"] == 3 and checkpoint["pmids_done"] == 5
+    with open(artifacts.path('FIGURE_FILE'), encoding="utf-8") as f:
+        assert "<div>1,2,3,4,5</div>" in f.read()
+
+
+def test_checkpoint_of_another_file_is_refused(pmid_file, tmp_path, monkeypatch):
+    fake_pipeline(monkeypatch, [])
+    run_batch.run_batch(pmid_file, run_id="batch", chunk_size=2)
+    other = tmp_path / "other.txt"
+    other.write_text("7\n8\n")
+
+    with pytest.raises(ValueError):
+        run_batch.run_batch(str(other), run_id="batch")
+
+
+def test_resuming_with_another_chunk_size_is_refused(pmid_file, monkeypatch):
+    fake_pipeline(monkeypatch, [], fail_on="3")
+    with pytest.raises(KeyboardInterrupt):
+        run_batch.run_batch(pmid_file, run_id="batch", chunk_size=2)
+
+    with pytest.raises(ValueError, match="--chunk-size 2"):
+        run_batch.run_batch(pmid_file, run_id="batch", chunk_size=3)
+    assert run_batch.main([pmid_file, "--run-id", "batch", "--chunk-size", "3"]) == 2
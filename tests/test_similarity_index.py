@@ -0,0 +1,127 @@
+import threading
+import time
+import pytest
+import app.routes
+from app import app as flask_app
+from app.cache_store import CacheStore
+from app.data_handler import GEO_NAMESPACE, DataHandler
+from app.similarity_index import SimilarityIndex
+from config import CACHE, SIMILARITY
+
+# Cached metadata: title, experiment type, summary, organism, overall design
+DATASETS = {
+    "200001": ["Liver steatosis in obese mice", "Expression profiling", "Hepatocyte lipid accumulation",
+               "Mus musculus", "Liver of obese and lean mice"],
+    "200002": ["Hepatocyte lipid droplets", "Expression profiling", "Liver steatosis and insulin resistance",
+               "Mus musculus", "Obese liver samples"],
+    "200003": ["Cortical neuron development", "Methylation profiling", "Synapse formation in cortex",
+               "Homo sapiens", "Neurons at four stages"],
+    "200004": ["Liver regeneration", "Expression profiling", "Hepatocyte proliferation after injury",
+               "Rattus norvegicus", "Time course"],
+}
+
+
+@pytest.fixture
+def index(tmp_path, fake_nltk):
+    index = SimilarityIndex(str(tmp_path / "similarity.db"))
+    index.add_many(DATASETS)
+    return index
+
+
+def test_neighbors_are_ranked_by_shared_terms(index, monkeypatch):
+    # "liver" and "hepatocyte" are in 3 of 4 datasets, too common to be looked up by default
+    assert [neighbor["geo_id"] for neighbor in index.similar("200001", k=2)] == ["200002"]
+    monkeypatch.setitem(SIMILARITY, 'MAX_DF_RATIO', 1.0)
+
+    neighbors = index.similar("200001", k=2)
+
+    assert [neighbor["geo_id"] for neighbor in neighbors] == ["200002", "200004"]
+    assert neighbors[0]["title"] == "Hepatocyte lipid droplets"
+    assert neighbors[0]["score"] > neighbors[1]["score"] > 0
+    assert index.similar("999999", k=2) is None
+
+
+def test_reindexing_replaces_a_dataset(index):
+    index.add_many({"200003": ["Liver steatosis", "Expression profiling", "Obese mice hepatocyte lipid",
+                               "Mus musculus", "Liver samples"]})
+
+    assert index.count() == len(DATASETS)
+    assert index.similar("200001", k=1)[0]["geo_id"] in ("200002", "200003")
+    assert "200001" not in [neighbor["geo_id"] for neighbor in index.similar("200001", k=10)]
+
+
+class FakeDataHandler:
+    def __init__(self, index, cache):
+        self.similarity_index = index
+        self.cache = cache
+
+
+def test_similar_endpoint(index, tmp_path, monkeypatch):
+    cache = CacheStore(str(tmp_path / "cache.db"))
+    cache.put(GEO_NAMESPACE, "200005", ["Obese liver", "Expression profiling", "Steatosis", "Mus musculus", "N/A"])
+    monkeypatch.setattr(app.routes, "get_data_handler", lambda: FakeDataHandler(index, cache))
+    client = flask_app.test_client()
+
+    response = client.get("/similar/200001?k=1")
+    # Cached before the index existed, indexed on the first query
+    late = client.get("/similar/200005?k=2")
+
+    assert response.status_code == 200
+    assert response.get_json()["neighbors"][0]["geo_id"] == "200002"
+    assert late.status_code == 200
+    assert index.contains("200005")
+    assert client.get("/similar/999999").status_code == 404
+    assert client.get(f"/similar/200001?k={SIMILARITY['MAX_K'] + 1}").status_code == 400
+
+
+def test_expired_datasets_are_dropped(index, monkeypatch):
+    monkeypatch.setitem(SIMILARITY, 'MAX_DF_RATIO', 1.0)
+    index.add_many({"200005": DATASETS["200002"]}, ttl=60)
+    assert index.similar("200001", k=1)[0]["geo_id"] in ("200002", "200005")
+
+    later = time.time() + 120
+    monkeypatch.setattr("app.similarity_index.time.time", lambda: later)
+
+    assert not index.contains("200005")
+    assert index.similar("200005", k=1) is None
+    assert "200005" not in [neighbor["geo_id"] for neighbor in index.similar("200001", k=10)]
+    index.add_many({"200001": DATASETS["200001"]})
+    assert index.indexed_ids() == set(DATASETS)
+
+
+@pytest.fixture
+def data_handler(tmp_path, monkeypatch, fake_nltk):
+    monkeypatch.setitem(CACHE, 'DB_FILE', str(tmp_path / "cache.db"))
+    monkeypatch.setitem(CACHE, 'LEGACY_JSON_FILE', str(tmp_path / "geo_cache.json"))
+    monkeypatch.setitem(SIMILARITY, 'DB_FILE', str(tmp_path / "similarity.db"))
+    return DataHandler()
+
+
+def test_datasets_are_indexed_off_the_fetch_path(data_handler, monkeypatch):
+    release = threading.Event()
+    add_many = data_handler.similarity_index.add_many
+
+    def slow_add_many(datasets, ttl=None):
+        release.wait(5)
+        add_many(datasets, ttl)
+
+    monkeypatch.setattr(data_handler.similarity_index, "add_many", slow_add_many)
+
+    pending = data_handler._index({"200001": DATASETS["200001"]})
+    assert not pending.done()
+    release.set()
+    pending.result(5)
+
+    assert data_handler.similarity_index.contains("200001")
+
+
+def test_index_follows_the_cache(data_handler):
+    data_handler.cache.put_many(GEO_NAMESPACE, DATASETS)
+    assert data_handler.sync_similarity_index() == len(DATASETS)
+
+    data_handler.cache.delete_many(GEO_NAMESPACE, ["200004"])
+    assert data_handler.sync_similarity_index() == 0
+    assert data_handler.similarity_index.indexed_ids() == {"200001", "200002", "200003"}
+
+    data_handler.clear_cache()
+    assert data_handler.similarity_index.count() == 0
@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+from app.singleflight import SingleFlight
+
+
+def run_threads(*targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_concurrent_lookups_of_a_key_are_coalesced():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    fetched, results = [], {}
+
+    def slow_fetch(keys):
+        fetched.append(sorted(keys))
+        started.set()
+        release.wait(5)
+        return {key: key.upper() for key in keys}
+
+    def first():
+        results["first"] = flight.do_many(["a", "b"], slow_fetch)
+
+    def second():
+        started.wait(5)
+        # "a" is in flight, only "c" is fetched by this thread
+        results["second"] = flight.do_many(["a", "c"], lambda keys: fetched.append(sorted(keys)) or {"c": "C"})
+
+    def release_later():
+        started.wait(5)
+        time.sleep(0.05)
+        release.set()
+
+    run_threads(first, second, release_later)
+
+    assert fetched == [["a", "b"], ["c"]]
+    assert results == {"first": {"a": "A", "b": "B"}, "second": {"a": "A", "c": "C"}}
+    assert flight.calls == {}
+
+
+def test_missing_values_and_errors_are_shared():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    outcomes = {}
+
+    def failing_fetch(keys):
+        started.set()
+        release.wait(5)
+        raise ValueError("down")
+
+    def owner():
+        with pytest.raises(ValueError):
+            flight.do_many(["a"], failing_fetch)
+        outcomes["owner"] = "raised"
+
+    def waiter():
+        started.wait(5)
+        try:
+            flight.do_many(["a"], lambda keys: pytest.fail("fetched twice"))
+        except ValueError as e:
+            outcomes["waiter"] = str(e)
+        release.set()
+
+    threading.Timer(0.05, release.set).start()
+    run_threads(owner, waiter)
+
+    assert outcomes == {"owner": "raised", "waiter": "down"}
+    # Keys are released after a failure, the next lookup fetches again
+    assert flight.do_many(["a"], lambda keys: {}) == {}
+
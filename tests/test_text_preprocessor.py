@@ -0,0 +1,68 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from nltk.stem import WordNetLemmatizer
+import app.text_preprocessor
+from app.text_preprocessor import TextPreprocessor
+from config import PREPROCESSING
+
+TEXTS = [
+    "RNA-seq of 12 mouse livers, 3' UTR & p53-null cells",
+    "  Double  spaces\tand\nnewlines ",
+    "Numbers 2020 and a1b2 tokens in 1990s",
+    "The cells of the brains",
+    "",
+    None,
+    "RNA-seq of 12 mouse livers, 3' UTR & p53-null cells",
+]
+
+
+def reference_preprocess(text):
+    """The previous DataProcessor.preprocess_text, which the engine must reproduce."""
+    if text is None:
+        return ""
+    text = re.sub(r'[^a-zA-Z0-9]', ' ', text)
+    text = re.sub(r'(?<!\w)\d+(?!\w)', ' ', text)
+    text = text.lower()
+    text = [word for word in text.split(' ') if word not in app.text_preprocessor.stopwords.words('english')]
+    lemmatizer = WordNetLemmatizer()
+    text = [lemmatizer.lemmatize(word) for word in text]
+    text = [word for word in text if len(word) != 0]
+    return " ".join(text)
+
+
+def test_output_matches_previous_implementation(fake_nltk):
+    preprocessor = TextPreprocessor()
+
+    assert [preprocessor.preprocess(text) for text in TEXTS] == [reference_preprocess(text) for text in TEXTS]
+
+
+def test_preprocess_many_keeps_order_and_duplicates(fake_nltk):
+    assert TextPreprocessor().preprocess_many(TEXTS) == [reference_preprocess(text) for text in TEXTS]
+
+
+def test_parallel_preprocessing_gives_the_same_output(fake_nltk, monkeypatch):
+    monkeypatch.setitem(PREPROCESSING, 'PARALLEL_MIN_TEXTS', 1)
+    monkeypatch.setitem(PREPROCESSING, 'CHUNK_SIZE', 2)
+    monkeypatch.setitem(PREPROCESSING, 'MAX_WORKERS', 2)
+
+    assert TextPreprocessor().preprocess_many(TEXTS) == [reference_preprocess(text) for text in TEXTS]
+
+
+def test_stopwords_are_loaded_once_by_concurrent_threads(fake_nltk, monkeypatch):
+    calls = []
+    words = app.text_preprocessor.stopwords.words
+
+    def slow_words(language):
+        calls.append(language)
+        time.sleep(0.05)
+        return words(language)
+
+    monkeypatch.setattr(app.text_preprocessor.stopwords, "words", slow_words)
+    preprocessor = TextPreprocessor()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda text: preprocessor.preprocess(text), TEXTS[:4]))
+
+    assert calls == ["english"]
+    assert results == [reference_preprocess(text) for text in TEXTS[:4]]
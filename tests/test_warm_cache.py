@@ -0,0 +1,68 @@
+import gzip
+import json
+import pytest
+from app.cache_store import CacheStore
+from app.data_handler import GEO_NAMESPACE, LINK_NAMESPACE, NO_GEO_IDS, REQUEST_ERROR
+from config import CACHE, SIMILARITY
+from warm_cache import warm_cache
+
+
+def summary(title: str, bioproject: str) -> dict:
+    return {"title": title, "gdstype": "Expression profiling", "summary": f"{title} samples",
+            "taxon": "Homo sapiens", "bioproject": bioproject, "n_samples": 12}
+
+
+@pytest.fixture
+def dumps(tmp_path, monkeypatch, fake_nltk):
+    monkeypatch.setitem(CACHE, 'DB_FILE', str(tmp_path / "cache.db"))
+    monkeypatch.setitem(CACHE, 'LEGACY_JSON_FILE', str(tmp_path / "geo_cache.json"))
+    monkeypatch.setitem(SIMILARITY, 'DB_FILE', str(tmp_path / "similarity.db"))
+    directory = tmp_path / "dumps"
+    directory.mkdir()
+    # Recorded bundle; the lookup of PMID 3 failed while recording
+    (directory / "bundle.json").write_text(json.dumps({
+        "links": {"1": ["200001"], "2": [], "3": [REQUEST_ERROR]},
+        "summaries": {"200001": summary("Liver", "PRJNA1")},
+        "bioprojects": {"PRJNA1": "Liver study. Overall design: Two groups"}
+    }))
+    # esummary responses, the BioProject of 200002 is in the XML dump, that of 200003 nowhere
+    with gzip.open(directory / "esummary.json.gz", "wt", encoding="utf-8") as f:
+        json.dump({"result": {"uids": ["200002", "200003", "200004"],
+                              "200002": summary("Brain", "PRJNA2"),
+                              "200003": summary("Kidney", "PRJNA3"),
+                              "200004": {"error": "cannot get document summary"}}}, f)
+    (directory / "bioproject.xml").write_text(
+        '<RecordSet><DocumentSummary><Project><ProjectID><ArchiveID accession="PRJNA2" id="2"/></ProjectID>'
+        "<ProjectDescr><Description>Brain study. Overall design: Cortex</Description></ProjectDescr>"
+        "</Project></DocumentSummary></RecordSet>"
+    )
+    return str(directory)
+
+
+def test_dumps_are_loaded_into_the_cache(dumps):
+    counts = warm_cache([dumps], max_workers=1)
+
+    assert counts == {"files": 3, "datasets": 2, "links": 2, "skipped": 1}
+    cache = CacheStore()
+    assert cache.get_many(GEO_NAMESPACE, ["200001", "200002", "200003", "200004"]) == {
+        "200001": ["Liver", "Expression profiling", "Liver samples", "Homo sapiens", "Two groups"],
+        "200002": ["Brain", "Expression profiling", "Brain samples", "Homo sapiens", "Cortex"]
+    }
+    # The failed lookup is not cached, so it is resolved again on the next analysis
+    assert cache.get_many(LINK_NAMESPACE, ["1", "2", "3"]) == {"1": ["200001"], "2": [NO_GEO_IDS]}
+
+
+def test_missing_bioprojects_can_be_fetched(dumps, monkeypatch):
+    requested = []
+
+    def get_overall_designs(self, bioproject_ids):
+        requested.extend(bioproject_ids)
+        return {"PRJNA3": "Nephrons"}
+
+    monkeypatch.setattr("app.data_handler.DataHandler.get_overall_designs", get_overall_designs)
+
+    counts = warm_cache([dumps], fetch_missing=True, max_workers=1)
+
+    assert requested == ["PRJNA3"]
+    assert counts["skipped"] == 0
+    assert CacheStore().get(GEO_NAMESPACE, "200003")[4] == "Nephrons"
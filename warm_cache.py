@@ -0,0 +1,174 @@
+"""
+Fill the cache of a new node from local metadata dumps instead of crawling NCBI.
+
+Accepted files, also gzip compressed (.gz), and directories containing them:
+
+- esummary JSON responses of db=gds (retmode=json), one response or a list of responses
+- BioProject efetch XML responses (retmode=xml)
+- recorded bundles with 'links', 'summaries' and 'bioprojects', as written by
+  benchmarks/fixtures.py
+
+Files are parsed in parallel processes and loaded in large transactions:
+
+    python warm_cache.py dumps/
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, IO, Iterator, List, Optional
+from app.data_handler import DataHandler, GEO_NAMESPACE, LINK_SENTINELS, NO_GEO_IDS
+from config import CACHE, WARMUP
+
+
+logger = logging.getLogger(__name__)
+
+DUMP_SUFFIXES = (".json", ".json.gz", ".xml", ".xml.gz")
+
+# esummary fields used by DataHandler.geo_record, the rest is dropped in the workers
+SUMMARY_FIELDS = ("title", "gdstype", "summary", "taxon", "bioproject")
+
+
+def iter_dump_files(paths: List[str]) -> Iterator[str]:
+    """Expand directories into the dump files they contain, in name order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    if name.endswith(DUMP_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _open(path: str) -> IO:
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def parse_dump(path: str) -> Dict:
+    """
+    Parse one dump file; runs in a worker process.
+
+    Returns:
+        Dict: 'summaries' (esummary fields by GEO ID), 'designs' (overall design by
+        BioProject accession and id) and 'links' (GEO IDs by PMID)
+    """
+    parsed = {"summaries": {}, "designs": {}, "links": {}}
+    with _open(path) as f:
+        if path.endswith((".xml", ".xml.gz")):
+            for _, element in ET.iterparse(f, events=("end",)):
+                if element.tag == "DocumentSummary":
+                    parsed["designs"].update(DataHandler.record_designs(element))
+                    element.clear()
+            return parsed
+        data = json.load(f)
+
+    if isinstance(data, dict) and "summaries" in data:
+        # Recorded bundle
+        summaries = data["summaries"]
+        parsed["designs"] = {
+            accession: DataHandler._parse_overall_design(description)
+            for accession, description in data.get("bioprojects", {}).items()
+        }
+        # PMIDs whose lookup failed while recording are left out, like DataHandler.cache_links does
+        parsed["links"] = {
+            pmid: geo_ids or [NO_GEO_IDS] for pmid, geo_ids in data.get("links", {}).items()
+            if not any(geo_id in LINK_SENTINELS for geo_id in geo_ids)
+        }
+    else:
+        summaries = {}
+        for response in data if isinstance(data, list) else [data]:
+            result = response.get("result", {})
+            summaries.update((geo_id, record) for geo_id, record in result.items() if geo_id != "uids")
+    parsed["summaries"] = {
+        geo_id: {field: record[field] for field in SUMMARY_FIELDS if field in record}
+        for geo_id, record in summaries.items() if isinstance(record, dict) and "error" not in record
+    }
+    return parsed
+
+
+def warm_cache(paths: List[str], fetch_missing: bool = False, max_workers: Optional[int] = None) -> Dict[str, int]:
+    """
+    Load GEO metadata and PMID links from dump files into the cache.
+
+    A GEO dataset is only cached together with the overall design of its BioProject.
+    Datasets whose BioProject is in none of the files are skipped, so they are fetched
+    normally later, unless fetch_missing is set; then the designs are requested with
+    batched efetch calls.
+
+    Args:
+        paths (List[str]): Dump files or directories
+        fetch_missing (bool): Fetch BioProjects missing from the dumps from NCBI
+        max_workers (int, optional): Parsing processes, defaults to WARMUP['MAX_WORKERS']
+
+    Returns:
+        Dict[str, int]: Number of files, cached datasets, cached links and skipped datasets
+    """
+    files = list(iter_dump_files(paths))
+    data_handler = DataHandler()
+    summaries, designs, links = {}, {}, {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers or WARMUP['MAX_WORKERS']) as executor:
+        for path, parsed in zip(files, executor.map(parse_dump, files)):
+            summaries.update(parsed["summaries"])
+            designs.update(parsed["designs"])
+            links.update(parsed["links"])
+            logger.info(f"Parsed {path}: {len(parsed['summaries'])} datasets, "
+                        f"{len(parsed['designs'])} BioProject keys, {len(parsed['links'])} PMIDs")
+    logger.info(f"Parsed {len(files)} files in {time.perf_counter() - start:.1f}s")
+
+    missing = {dataset.get("bioproject") for dataset in summaries.values()
+               if dataset.get("bioproject") and dataset.get("bioproject") not in designs}
+    if missing and fetch_missing:
+        designs.update(data_handler.get_overall_designs(sorted(missing)))
+        # BioProjects whose request failed stay missing
+        missing -= designs.keys()
+    records = {
+        geo_id: DataHandler.geo_record(dataset, designs)
+        for geo_id, dataset in summaries.items() if dataset.get("bioproject") not in missing
+    }
+
+    batch_size = WARMUP['BATCH_SIZE']
+    geo_ids = list(records)
+    for offset in range(0, len(geo_ids), batch_size):
+        batch = {geo_id: records[geo_id] for geo_id in geo_ids[offset:offset + batch_size]}
+        data_handler.cache.put_many(GEO_NAMESPACE, batch, CACHE['GEO_TTL'])
+    pmids = list(links)
+    for offset in range(0, len(pmids), batch_size):
+        data_handler.cache_links({pmid: links[pmid] for pmid in pmids[offset:offset + batch_size]})
+    data_handler.sync_similarity_index()
+
+    counts = {
+        "files": len(files),
+        "datasets": len(records),
+        "links": len(links),
+        "skipped": len(summaries) - len(records)
+    }
+    if counts["skipped"]:
+        logger.warning(f"Skipped {counts['skipped']} datasets whose BioProject is not in the dumps, "
+                       "use --fetch-missing to fetch them")
+    logger.info(f"Cached {counts['datasets']} datasets and {counts['links']} PMID links "
+                f"in {time.perf_counter() - start:.1f}s")
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fill the cache from local GEO and BioProject metadata dumps.")
+    parser.add_argument("paths", nargs="+", help="Dump files or directories")
+    parser.add_argument("--fetch-missing", action="store_true",
+                        help="Fetch BioProjects that are not in the dumps instead of skipping their datasets")
+    parser.add_argument("--workers", type=int, help="Parsing processes, defaults to the number of CPU cores")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(name)s - %(levelname)s - %(message)s')
+    warm_cache(args.paths, args.fetch_missing, args.workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())